@@ -0,0 +1,179 @@
+"""
+Load benchmark of the proxy of the wake listener against a local echo server:
+
+    python -m benchmarks.proxy --connections 200 --megabytes 8
+
+Reports the throughput and the round trip latency of small messages, once directly to the echo server
+and once through the proxy, so the overhead of the proxy shows up in numbers.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import time
+from multiprocessing.connection import Connection
+from unittest.mock import patch
+
+from somnus.config import Config
+from somnus.logic import wake_listener
+from somnus.logic.wake_listener import WakeListener, encode_packet, encode_string, encode_varint
+
+_CHUNK_BYTES = 64 * 1024
+_PING_BYTES = 64
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the throughput and latency of the wake listener proxy")
+    parser.add_argument("--connections", type=int, default=100, help="concurrent connections")
+    parser.add_argument("--megabytes", type=float, default=4, help="megabytes echoed per connection")
+    parser.add_argument("--pings", type=int, default=200, help="small round trips per connection")
+    parser.add_argument(
+        "--buffer-kb", type=int, default=wake_listener.PROXY_BUFFER_BYTES // 1024, help="proxy buffer per direction"
+    )
+    args = parser.parse_args()
+
+    # The proxy gets its own process like the bot, so the clients and the echo server don't slow it down
+    echo_port = _get_free_port()
+    parent_connection, child_connection = multiprocessing.Pipe()
+    proxy_process = multiprocessing.Process(
+        target=_run_proxy, args=(echo_port, args.buffer_kb * 1024, child_connection), daemon=True
+    )
+    proxy_process.start()
+    proxy_port = parent_connection.recv()
+
+    results = asyncio.run(_run(args, echo_port, proxy_port))
+    max_rss_mb = _get_max_rss_mb(proxy_process.pid)  # type: ignore
+    proxy_process.terminate()
+    print("target | MB/s    | p50 latency us | p99 latency us")  # noqa: T201
+    for name, (throughput, p50, p99) in results.items():
+        print(f"{name.ljust(6)} | {throughput:7.1f} | {p50:14.0f} | {p99:14.0f}")  # noqa: T201
+    print(f"proxy buffer: {args.buffer_kb} KB per direction")  # noqa: T201
+    print(f"max RSS of the proxy: {max_rss_mb:.0f} MB")  # noqa: T201
+
+
+async def _run(args: argparse.Namespace, echo_port: int, proxy_port: int) -> dict[str, tuple[float, float, float]]:
+    # The echo connections are awaited before the end, asyncio.run would cancel them and log every one
+    echo_tasks: list[asyncio.Task] = []
+
+    async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if task := asyncio.current_task():
+            echo_tasks.append(task)
+        await _echo(reader, writer)
+
+    echo_server = await asyncio.start_server(echo, "127.0.0.1", echo_port)
+
+    results = {}
+    for name, port in (("direct", echo_port), ("proxy", proxy_port)):
+        connections = await asyncio.gather(*(_connect(port) for _ in range(args.connections)))
+        start_time = time.monotonic()
+        await asyncio.gather(
+            *(_echo_bytes(*connection, int(args.megabytes * 1024 * 1024)) for connection in connections)
+        )
+        throughput = args.connections * args.megabytes / (time.monotonic() - start_time)
+
+        latencies = []
+        for latency in await asyncio.gather(*(_ping(*connection, args.pings) for connection in connections)):
+            latencies += latency
+        latencies.sort()
+        results[name] = (throughput, statistics.median(latencies) * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6)
+
+        for _, writer in connections:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for _, writer in connections), return_exceptions=True)
+
+    echo_server.close()
+    await echo_server.wait_closed()
+    await asyncio.gather(*echo_tasks)
+    return results
+
+
+def _run_proxy(echo_port: int, buffer_bytes: int, connection: Connection) -> None:
+    config = Config(
+        DISCORD_TOKEN="benchmark",  # noqa: S106
+        HOST_SERVER_HOST="127.0.0.1",
+        HOST_SERVER_USER="somnus",
+        HOST_SERVER_PASSWORD="benchmark",  # noqa: S106
+        MC_SERVER_START_CMD="./run.sh",
+        MC_SERVER_ADDRESS=f"127.0.0.1:{echo_port}",
+    )
+
+    async def on_login(config: Config, player_name: str) -> None:
+        pass
+
+    async def run() -> None:
+        listener = WakeListener(config, lambda config: "running", on_login, proxy=True)
+        await listener.start("127.0.0.1", 0)
+        connection.send(listener.get_port())
+        await asyncio.Event().wait()
+
+    with patch.object(wake_listener, "PROXY_BUFFER_BYTES", buffer_bytes):
+        asyncio.run(run())
+
+
+def _get_max_rss_mb(pid: int) -> float:
+    # Linux only, the peak is lost once the process is terminated
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _connect(port: int) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    # A login, so that the proxy forwards the connection, the echo server sends it back
+    handshake = encode_varint(767) + encode_string("localhost") + port.to_bytes(2, "big") + encode_varint(2)
+    login = encode_packet(0x00, handshake) + encode_packet(0x00, encode_string("Player") + bytes(16))
+    writer.write(login)
+    await reader.readexactly(len(login))
+    return reader, writer
+
+
+async def _echo_bytes(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, total_bytes: int) -> None:
+    chunk = bytes(_CHUNK_BYTES)
+
+    async def send() -> None:
+        for _ in range(0, total_bytes, _CHUNK_BYTES):
+            writer.write(chunk)
+            await writer.drain()
+
+    async def receive() -> None:
+        remaining = total_bytes - total_bytes % _CHUNK_BYTES + (_CHUNK_BYTES if total_bytes % _CHUNK_BYTES else 0)
+        while remaining:
+            remaining -= len(await reader.read(min(remaining, 1024 * 1024)))
+
+    await asyncio.gather(send(), receive())
+
+
+async def _ping(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, count: int) -> list[float]:
+    message = bytes(_PING_BYTES)
+    latencies = []
+    for _ in range(count):
+        start_time = time.perf_counter()
+        writer.write(message)
+        await reader.readexactly(_PING_BYTES)
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+async def _echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while data := await reader.read(_CHUNK_BYTES):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
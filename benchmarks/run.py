@@ -0,0 +1,129 @@
+"""
+Benchmarks somnus against local stand-ins for the host server and the Minecraft server:
+
+    python -m benchmarks.run --iterations 5 --ssh-backend all
+
+Every scenario reports its wall time, the event loop lag, the peak number of threads
+and the number of round trips to the stand-ins, so that regressions show up in numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.stand_ins import MinecraftServerOptions
+
+DATA_DIR = Path("data") / "benchmark"
+SSH_BACKENDS = ("asyncssh", "pexpect")
+_COLUMNS = (
+    ("wall_seconds", "wall s", "{:.3f}"),
+    ("max_loop_lag_ms", "max lag ms", "{:.1f}"),
+    ("mean_loop_lag_ms", "mean lag ms", "{:.2f}"),
+    ("peak_threads", "extra threads", "{:.0f}"),
+    ("ssh_connections", "ssh conns", "{:.0f}"),
+    ("ssh_commands", "ssh cmds", "{:.0f}"),
+    ("mc_connections", "mc conns", "{:.0f}"),
+    ("mc_requests", "mc reqs", "{:.0f}"),
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark somnus against local SSH and Minecraft stand-ins")
+    parser.add_argument("--iterations", type=int, default=3, help="start/stop cycles per SSH backend")
+    parser.add_argument("--ssh-backend", choices=[*SSH_BACKENDS, "all"], default="all")
+    parser.add_argument("--line-delay", type=float, default=0.05, help="seconds between two console lines")
+    parser.add_argument("--startup-log", type=Path, help="file with the console lines printed while starting")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    # Prints the results of a single backend as JSON for the "all" run
+    parser.add_argument("--print-json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ssh_backend == "all":
+        # somnus reads its config on import, so every backend needs its own process
+        results = {}
+        for backend in SSH_BACKENDS:
+            command = [
+                sys.executable,
+                "-m",
+                "benchmarks.run",
+                *_forward_args(args),
+                "--ssh-backend",
+                backend,
+                "--print-json",
+            ]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout  # noqa: S603
+            results[backend] = json.loads(output.splitlines()[-1])
+    else:
+        results = {args.ssh_backend: _run_backend(args)}
+        if args.print_json:
+            print(json.dumps(results[args.ssh_backend]))  # noqa: T201
+            return
+
+    for backend, summaries in results.items():
+        _print_table(backend, summaries)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+def _run_backend(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    ssh_port, mc_port = _get_free_port(), _get_free_port()
+    os.environ.update(
+        {
+            "DISCORD_TOKEN": "benchmark",
+            "HOST_SERVER_HOST": "127.0.0.1",
+            "HOST_SERVER_SSH_PORT": str(ssh_port),
+            "HOST_SERVER_USER": "somnus",
+            "HOST_SERVER_PASSWORD": "benchmark",
+            "HOST_SERVER_NAME": "default",
+            "HOST_SERVERS": "[]",
+            "MC_SERVER_START_CMD": "./run.sh",
+            "MC_SERVER_ADDRESS": f"127.0.0.1:{mc_port}",
+            "MC_SERVER_QUERY_ENABLED": "false",
+            "SSH_BACKEND": args.ssh_backend,
+            "INACTIVITY_SHUTDOWN_MINUTES": "60",
+            "DEBUG": "0",
+        }
+    )
+    os.environ.pop("METRICS_PORT", None)
+
+    from benchmarks.scenarios import run_scenarios  # noqa: PLC0415
+
+    options = MinecraftServerOptions(line_delay_seconds=args.line_delay)
+    if args.startup_log:
+        options.startup_log = args.startup_log.read_text().splitlines()
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    (DATA_DIR / "world_selector_data.json").unlink(missing_ok=True)
+    results = asyncio.run(run_scenarios(DATA_DIR, args.iterations, options))
+    return {result.name: result.summary() for result in results}
+
+
+def _forward_args(args: argparse.Namespace) -> list[str]:
+    forwarded = ["--iterations", str(args.iterations), "--line-delay", str(args.line_delay)]
+    if args.startup_log:
+        forwarded += ["--startup-log", str(args.startup_log)]
+    return forwarded
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _print_table(backend: str, summaries: dict[str, dict[str, float]]) -> None:
+    name_width = max(len(name) for name in summaries)
+    print(f"\nSSH backend: {backend}")  # noqa: T201
+    print(" | ".join([" " * name_width] + [header for _, header, _ in _COLUMNS]))  # noqa: T201
+    for name, summary in summaries.items():
+        cells = [fmt.format(summary[key]).rjust(len(header)) for key, header, fmt in _COLUMNS]
+        print(" | ".join([name.ljust(name_width), *cells]))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
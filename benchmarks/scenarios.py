@@ -0,0 +1,182 @@
+"""
+The benchmarked scenarios. Import this module only after the environment of the stand-ins is set,
+because somnus reads its config on import.
+"""
+
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncGenerator, Awaitable, Callable, Self
+from unittest.mock import patch
+
+from benchmarks.stand_ins import FakeHostServer, MinecraftServerOptions, RoundTrips
+from somnus.actions.ssh import ssh_pool
+from somnus.actions.stats import get_server_state
+from somnus.config import CONFIG, Config
+from somnus.discord_provider import bot as bot_module
+from somnus.discord_provider.heartbeat import create_heartbeat
+from somnus.logger import log
+from somnus.logic import player_activity, start, stop, world_selector
+
+_LAG_SAMPLE_INTERVAL_SECONDS = 0.005
+
+
+@dataclass
+class Measurement:
+    wall_seconds: float
+    max_loop_lag_seconds: float
+    mean_loop_lag_seconds: float
+    peak_threads: int
+    round_trips: RoundTrips
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    measurements: list[Measurement] = field(default_factory=list)
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "wall_seconds": statistics.median(m.wall_seconds for m in self.measurements),
+            "max_loop_lag_ms": max(m.max_loop_lag_seconds for m in self.measurements) * 1000,
+            "mean_loop_lag_ms": statistics.mean(m.mean_loop_lag_seconds for m in self.measurements) * 1000,
+            "peak_threads": max(m.peak_threads for m in self.measurements),
+            "ssh_connections": statistics.median(m.round_trips.ssh_connections for m in self.measurements),
+            "ssh_commands": statistics.median(m.round_trips.ssh_commands for m in self.measurements),
+            "mc_connections": statistics.median(m.round_trips.mc_connections for m in self.measurements),
+            "mc_requests": statistics.median(m.round_trips.mc_requests for m in self.measurements),
+        }
+
+
+class _StandInThread:
+    """
+    Runs the stand-ins on their own event loop, so that their work does not count as lag of the benchmarked loop.
+    """
+
+    def __init__(self, host: FakeHostServer) -> None:
+        self.host = host
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="stand-ins", daemon=True)
+
+    async def start(self) -> None:
+        self._thread.start()
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.host.start(), self._loop))
+
+    async def close(self) -> None:
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.host.close(), self._loop))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class _LoopMonitor:
+    """
+    Measures how late a short sleep wakes up, which is how long the event loop was blocked, and samples the threads.
+    """
+
+    def __init__(self) -> None:
+        self.lags: list[float] = []
+        self.peak_threads = threading.active_count()
+        self._task: asyncio.Task | None = None
+
+    def __enter__(self) -> Self:
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            start_time = time.perf_counter()
+            await asyncio.sleep(_LAG_SAMPLE_INTERVAL_SECONDS)
+            self.lags.append(max(0, time.perf_counter() - start_time - _LAG_SAMPLE_INTERVAL_SECONDS))
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+async def _measure(host: FakeHostServer, func: Callable[[], Awaitable[object]], baseline_threads: int) -> Measurement:
+    round_trips_start = host.round_trips.copy()
+    with _LoopMonitor() as monitor:
+        start_time = time.perf_counter()
+        await func()
+        wall_seconds = time.perf_counter() - start_time
+        # Let the monitor see the end of the scenario
+        await asyncio.sleep(_LAG_SAMPLE_INTERVAL_SECONDS * 2)
+
+    return Measurement(
+        wall_seconds=wall_seconds,
+        max_loop_lag_seconds=max(monitor.lags, default=0),
+        mean_loop_lag_seconds=statistics.mean(monitor.lags) if monitor.lags else 0,
+        peak_threads=monitor.peak_threads - baseline_threads,
+        round_trips=host.round_trips.since(round_trips_start),
+    )
+
+
+async def _exhaust(generator: AsyncGenerator) -> None:
+    async for _ in generator:
+        pass
+
+
+async def _no_presence(*args: object, **kwargs: object) -> None:
+    pass
+
+
+async def run_scenarios(
+    data_dir: Path, iterations: int, minecraft_options: MinecraftServerOptions
+) -> list[ScenarioResult]:
+    """
+    Runs a full cycle per iteration: probing the stopped server, starting it, probing the running server,
+    a heartbeat tick and stopping it again. The SSH session pool stays warm between the scenarios, like in the bot.
+    """
+
+    log.setLevel(logging.WARNING)
+    # The data files of somnus are kept in the data directory of the benchmarks
+    with (
+        patch.object(world_selector, "WORLD_SELECTOR_CONFIG_FILE_PATH", str(data_dir / "world_selector_data.json")),
+        patch.object(player_activity, "PLAYER_ACTIVITY_FILE_PATH", str(data_dir / "player_activity.json")),
+    ):
+        return await _run_scenarios(data_dir, iterations, minecraft_options)
+
+
+async def _run_scenarios(
+    data_dir: Path, iterations: int, minecraft_options: MinecraftServerOptions
+) -> list[ScenarioResult]:
+    # The stand-in for Discord, the presence is not sent anywhere
+    bot_module.bot.change_presence = _no_presence  # type: ignore
+
+    config: Config = CONFIG.for_host(CONFIG.HOST_SERVER_NAME)
+    host = FakeHostServer(
+        ssh_port=config.HOST_SERVER_SSH_PORT,
+        mc_port=int(config.MC_SERVER_ADDRESS.rsplit(":", 1)[1]),
+        user=config.HOST_SERVER_USER,
+        password=config.HOST_SERVER_PASSWORD,
+        start_cmd=config.MC_SERVER_START_CMD,
+        host_key_path=data_dir / "host_key",
+        minecraft_options=minecraft_options,
+    )
+    scenarios: list[tuple[str, Callable[[], Awaitable[object]]]] = [
+        ("get_server_state (offline)", lambda: get_server_state(config)),
+        ("start.start_server", lambda: _exhaust(start.start_server(config))),
+        ("get_server_state (online)", lambda: get_server_state(config)),
+        ("heartbeat tick", create_heartbeat().run_once),
+        ("stop.stop_server", lambda: _exhaust(stop.stop_server(False, config))),
+    ]
+    results = [ScenarioResult(name) for name, _ in scenarios]
+
+    stand_ins = _StandInThread(host)
+    await stand_ins.start()
+    # Threads of the event loop and the stand-ins, the scenarios report the threads they use in addition
+    baseline_threads = threading.active_count()
+    try:
+        for _ in range(iterations):
+            for result, (_, func) in zip(results, scenarios):
+                result.measurements.append(await _measure(host, func, baseline_threads))
+    finally:
+        await ssh_pool.close_all()
+        await stand_ins.close()
+
+    return results
@@ -0,0 +1,461 @@
+"""
+Local stand-ins for a host server and a Minecraft server. They only implement what somnus uses,
+but count every request, so that the benchmarks can report the number of remote round trips.
+"""
+
+import asyncio
+import json
+import re
+import shlex
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import asyncssh
+
+SCREEN_NAME = "mc-server-control"
+ConsoleWriter = Callable[[str], None]
+DEFAULT_STARTUP_LOG = [
+    "[main/INFO] [cpw.mods.modlauncher.Launcher/MODLAUNCHER]: ModLauncher running",
+    "[main/INFO] [net.minecraftforge.fml.loading.ImmediateWindowHandler/]: Loading ImmediateWindowProvider",
+    "[modloading-worker-0/INFO] [net.minecraftforge.common.ForgeMod/FORGEMOD]: Forge mod loading, version 47.3.0",
+    "[Server thread/INFO] [minecraft/DedicatedServer]: Starting minecraft server version 1.20.1",
+    "[Server thread/INFO] [minecraft/DedicatedServer]: Loading properties",
+    "[Server thread/INFO] [minecraft/DedicatedServer]: Default game type: SURVIVAL",
+    '[Server thread/INFO] [minecraft/DedicatedServer]: Preparing level "world"',
+    "[Server thread/INFO] [minecraft/MinecraftServer]: Preparing start region for dimension minecraft:overworld",
+    "[Worker-Main-1/INFO] [minecraft/LoggerChunkProgressListener]: Preparing spawn area: 0%",
+    "[Worker-Main-1/INFO] [minecraft/LoggerChunkProgressListener]: Preparing spawn area: 51%",
+    "[Server thread/INFO] [minecraft/LoggerChunkProgressListener]: Time elapsed: 1337 ms",
+    '[Server thread/INFO] [minecraft/DedicatedServer]: Done (4.200s)! For help, type "help"',
+]
+DEFAULT_STOP_LOG = [
+    "[Server thread/INFO] [minecraft/MinecraftServer]: Stopping server",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: Saving players",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: Saving worlds",
+    "[Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:overworld",
+    "[Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:the_nether",
+    "[Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:the_end",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: ThreadedAnvilChunkStorage: All dimensions are saved",
+]
+
+
+@dataclass
+class RoundTrips:
+    ssh_connections: int = 0
+    ssh_commands: int = 0
+    mc_connections: int = 0
+    mc_requests: int = 0
+
+    def copy(self) -> "RoundTrips":
+        return RoundTrips(**self.__dict__)
+
+    def since(self, start: "RoundTrips") -> "RoundTrips":
+        return RoundTrips(**{name: value - getattr(start, name) for name, value in self.__dict__.items()})
+
+
+@dataclass
+class MinecraftServerOptions:
+    startup_log: list[str] = field(default_factory=lambda: list(DEFAULT_STARTUP_LOG))
+    stop_log: list[str] = field(default_factory=lambda: list(DEFAULT_STOP_LOG))
+    line_delay_seconds: float = 0.05
+    players: list[str] = field(default_factory=lambda: ["Steve", "Alex"])
+    max_players: int = 20
+
+
+class FakeMinecraftServer:
+    """
+    Prints the configured console log and answers Server List Pings while it is running.
+    """
+
+    def __init__(self, port: int, options: MinecraftServerOptions, round_trips: RoundTrips) -> None:
+        self.port = port
+        self.options = options
+        self.round_trips = round_trips
+        self.running = False
+        self._server: asyncio.Server | None = None
+
+    async def start(self, write: ConsoleWriter) -> None:
+        for line in self.options.startup_log:
+            await asyncio.sleep(self.options.line_delay_seconds)
+            if "Done (" in line:
+                # Like a real server, the port is open once "Done" is printed
+                self._server = await asyncio.start_server(self._handle_connection, "127.0.0.1", self.port)
+                self.running = True
+            write(line)
+
+    async def stop(self, write: ConsoleWriter) -> None:
+        for line in self.options.stop_log:
+            await asyncio.sleep(self.options.line_delay_seconds)
+            write(line)
+        await self.kill()
+
+    async def kill(self) -> None:
+        self.running = False
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def get_status(self) -> dict:
+        return {
+            "version": {"name": "1.20.1", "protocol": 763},
+            "players": {
+                "online": len(self.options.players),
+                "max": self.options.max_players,
+                "sample": [
+                    {"name": name, "id": f"00000000-0000-0000-0000-{i:012d}"}
+                    for i, name in enumerate(self.options.players)
+                ],
+            },
+            "description": {"text": "somnus benchmark"},
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.round_trips.mc_connections += 1
+        try:
+            while True:
+                packet = await _read_packet(reader)
+                packet_id, offset = _unpack_varint(packet, 0)
+                # The handshake (id 0 with a payload) has no answer, the status request (id 0) and the ping (id 1) do
+                if packet_id == 0 and len(packet) > offset:
+                    continue
+                self.round_trips.mc_requests += 1
+                if packet_id == 0:
+                    writer.write(_pack_packet(0, _pack_string(json.dumps(self.get_status()))))
+                elif packet_id == 1:
+                    writer.write(_pack_packet(1, packet[offset:]))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+class _ScreenSession:
+    def __init__(self, host: "FakeHostServer") -> None:
+        self.host = host
+        self.minecraft_task: asyncio.Task | None = None
+        self.attached_shell: _ScriptedShell | None = None
+        # Shells that print the log of the session with `tail`
+        self.log_followers: list[_ScriptedShell] = []
+
+    def write(self, text: str) -> None:
+        # Output printed while detached is lost, somnus never reads the scrollback
+        if self.attached_shell:
+            self.attached_shell.write(text)
+        for shell in self.log_followers:
+            shell.write(text)
+
+    def write_line(self, line: str) -> None:
+        self.write(line + "\r\n")
+
+    def run(self, command: str) -> None:
+        # The session runs the command without a shell, like `screen -S <name> sh -c <command>`
+        if command == self.host.start_cmd:
+            self.minecraft_task = asyncio.create_task(self._run_minecraft(self.host.minecraft.start))
+        else:
+            self.write_line(f"sh: 1: {command.split(maxsplit=1)[0]}: not found")
+            self._terminate()
+
+    async def handle_line(self, line: str) -> None:
+        if not self.host.minecraft.running:
+            return
+        if line.strip() == "stop":
+            self.minecraft_task = asyncio.create_task(self._run_minecraft(self.host.minecraft.stop))
+        elif line.strip() == "list":
+            players = self.host.minecraft.options.players
+            max_players = self.host.minecraft.options.max_players
+            self.write_line(
+                f"[Server thread/INFO]: There are {len(players)} of a max of {max_players} players online: "
+                + ", ".join(players)
+            )
+
+    async def kill(self) -> None:
+        if self.minecraft_task:
+            self.minecraft_task.cancel()
+        await self.host.minecraft.kill()
+
+    async def _run_minecraft(self, run: Callable[[ConsoleWriter], Awaitable[None]]) -> None:
+        await run(self.write_line)
+        if not self.host.minecraft.running:
+            self._terminate()
+
+    def _terminate(self) -> None:
+        # The session ends with its command, an attached terminal is back in its shell
+        if self.host.screens.get(SCREEN_NAME) is self:
+            del self.host.screens[SCREEN_NAME]
+        if shell := self.attached_shell:
+            self.attached_shell = None
+            shell.screen = None
+            shell.write("[screen is terminating]\r\n" + shell.prompt)
+
+
+class _ScriptedShell:
+    """
+    Emulates an interactive bash on a terminal, with echo, `PS1` and the `screen` commands somnus sends.
+    """
+
+    def __init__(self, host: "FakeHostServer", process: asyncssh.SSHServerProcess) -> None:
+        self.host = host
+        self.process = process
+        self.prompt = host.user_prompt
+        self.screen: _ScreenSession | None = None
+        self._screen_escape = False
+        self._sudo_command: str | None = None
+        self._line = ""
+        self._previous_char = ""
+
+    def write(self, text: str) -> None:
+        try:
+            self.process.stdout.write(text)
+        except (asyncssh.Error, OSError, BrokenPipeError):
+            pass
+
+    async def run(self) -> None:
+        self.write(self.prompt)
+        try:
+            while data := await self.process.stdin.read(1024):
+                for char in data:
+                    await self._handle_char(char)
+        except (asyncssh.Error, OSError):
+            pass
+        finally:
+            if self.screen:
+                self.screen.attached_shell = None
+            for screen in self.host.screens.values():
+                if self in screen.log_followers:
+                    screen.log_followers.remove(self)
+            self.process.exit(0)
+
+    async def _handle_char(self, char: str) -> None:
+        previous_char, self._previous_char = self._previous_char, char
+        if self.screen and char == "\x01":
+            self._screen_escape = True
+        elif self._screen_escape:
+            self._screen_escape = False
+            if char in ("d", "\x04"):
+                self.host.round_trips.ssh_commands += 1
+                self._detach()
+        elif char in "\r\n":
+            # The terminal sends either of them or both for a new line
+            if not (char == "\n" and previous_char == "\r"):
+                line, self._line = self._line, ""
+                self.write("\r\n")
+                await self._handle_line(line)
+        else:
+            self._line += char
+            # Passwords are not echoed
+            if self._sudo_command is None:
+                self.write(char)
+
+    async def _handle_line(self, line: str) -> None:
+        self.host.round_trips.ssh_commands += 1
+        if self.screen:
+            await self.screen.handle_line(line)
+        elif self._sudo_command is not None:
+            command, self._sudo_command = self._sudo_command, None
+            if line == self.host.password:
+                await self._run_command(command)
+            else:
+                self.write("Sorry, try again.\r\n" + self.prompt)
+        else:
+            for command in line.split(";"):
+                await self._run_command(command.strip())
+
+    async def _run_command(self, command: str) -> None:
+        command = re.sub(r"\$\(\((\d+) ([+-]) (\d+)\)\)", _evaluate_arithmetic, command)
+
+        if command.startswith("screen ") and " tail -n +1 -F " in command:
+            await self._follow_screen_log()
+            return
+        if command.startswith("screen "):
+            if await self._run_screen_command(command):
+                return
+        elif command.startswith("sudo "):
+            self._sudo_command = command.removeprefix("sudo ")
+            self.write(f"[sudo] password for {self.host.user}: ")
+            return
+        elif command == "exit" or command.startswith("shutdown"):
+            self.host.shutdowns += command.startswith("shutdown")
+            self.process.exit(0)
+            return
+        elif match := re.fullmatch(r"PS1='(.*)'", command):
+            self.prompt = match.group(1).replace("\\$", "#")
+        elif command.startswith("command -v screen"):
+            self.write("screen-2\r\n")
+        elif command.startswith("echo "):
+            self.write(command.removeprefix("echo ") + "\r\n")
+        elif command and not command.startswith("unset "):
+            self.write(f"bash: {command.split(maxsplit=1)[0]}: command not found\r\n")
+        self.write(self.prompt)
+
+    async def _run_screen_command(self, command: str) -> bool:
+        """
+        Returns whether the shell is attached to the screen session now.
+        """
+
+        if command.startswith(f"screen -S {SCREEN_NAME} sh -c "):
+            screen = self.host.screens.setdefault(SCREEN_NAME, _ScreenSession(self.host))
+            self._attach()
+            # A session that ended right away printed the prompt already
+            screen.run(shlex.split(command)[-1])
+            return True
+        if command == f"screen -r {SCREEN_NAME}":
+            if SCREEN_NAME in self.host.screens:
+                self._attach()
+                return True
+            self.write(f"There is no screen to be resumed matching {SCREEN_NAME}.\r\n")
+        elif command == f"screen -X -S {SCREEN_NAME} quit":
+            if screen := self.host.screens.pop(SCREEN_NAME, None):
+                await screen.kill()
+            else:
+                self.write("No screen session found.\r\n")
+        return False
+
+    async def _follow_screen_log(self) -> None:
+        # The shell stays busy with `tail` until the connection is closed
+        screen = self.host.screens.get(SCREEN_NAME)
+        if not screen:
+            self.write(f"No screen session found.\r\nfollowing-0\r\n{self.prompt}")
+            return
+        self.write("following-2\r\n")
+        screen.log_followers.append(self)
+        # The `list` stuffed into the window
+        await screen.handle_line("list")
+
+    def _attach(self) -> None:
+        self.screen = self.host.screens[SCREEN_NAME]
+        self.screen.attached_shell = self
+        # Screen clears the terminal and redraws the window
+        self.write("\x1b[H\x1b[J")
+
+    def _detach(self) -> None:
+        if not self.screen:
+            return
+        self.screen.attached_shell = None
+        self.screen = None
+        self.write(f"\x1b[H\x1b[J[detached from 1337.{SCREEN_NAME}]\r\n" + self.prompt)
+
+
+class _SSHServer(asyncssh.SSHServer):
+    def __init__(self, host: "FakeHostServer") -> None:
+        self._host = host
+
+    def connection_made(self, conn: asyncssh.SSHServerConnection) -> None:
+        self._host.round_trips.ssh_connections += 1
+
+    def begin_auth(self, username: str) -> bool:
+        return True
+
+    def password_auth_supported(self) -> bool:
+        return True
+
+    def validate_password(self, username: str, password: str) -> bool:
+        return username == self._host.user and password == self._host.password
+
+
+class FakeHostServer:
+    """
+    SSH server with a scripted shell instead of a real one. The Minecraft server runs in its `screen` session.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        ssh_port: int,
+        mc_port: int,
+        user: str,
+        password: str,
+        start_cmd: str,
+        host_key_path: Path,
+        minecraft_options: MinecraftServerOptions | None = None,
+    ) -> None:
+        self.ssh_port = ssh_port
+        self.user = user
+        self.password = password
+        self.start_cmd = start_cmd
+        self.user_prompt = f"{user}@somnus-bench:~# "
+        self.round_trips = RoundTrips()
+        self.minecraft = FakeMinecraftServer(mc_port, minecraft_options or MinecraftServerOptions(), self.round_trips)
+        self.screens: dict[str, _ScreenSession] = {}
+        self.shutdowns = 0
+        self._host_key_path = host_key_path
+        self._server: asyncssh.SSHAcceptor | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncssh.create_server(
+            lambda: _SSHServer(self),
+            "127.0.0.1",
+            self.ssh_port,
+            server_host_keys=[_load_host_key(self._host_key_path)],
+            process_factory=self._handle_process,
+            line_editor=False,
+            encoding="utf-8",
+        )
+
+    async def close(self) -> None:
+        for screen in self.screens.values():
+            await screen.kill()
+        self.screens = {}
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_process(self, process: asyncssh.SSHServerProcess) -> None:
+        await _ScriptedShell(self, process).run()
+
+
+def _load_host_key(path: Path) -> asyncssh.SSHKey:
+    # A stable host key keeps the known hosts of the `ssh` binary, used by the pexpect backend, valid between runs
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        asyncssh.generate_private_key("ssh-ed25519").write_private_key(path)
+    return asyncssh.read_private_key(path)
+
+
+def _evaluate_arithmetic(match: re.Match) -> str:
+    a, operator, b = int(match.group(1)), match.group(2), int(match.group(3))
+    return str(a + b if operator == "+" else a - b)
+
+
+async def _read_packet(reader: asyncio.StreamReader) -> bytes:
+    length = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return await reader.readexactly(length)
+    raise ValueError("VarInt is too big")
+
+
+def _unpack_varint(data: bytes, offset: int) -> tuple[int, int]:
+    value = 0
+    for i in range(5):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, offset
+    raise ValueError("VarInt is too big")
+
+
+def _pack_varint(value: int) -> bytes:
+    data = b""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += struct.pack("B", byte | 0x80)
+        else:
+            return data + struct.pack("B", byte)
+
+
+def _pack_string(text: str) -> bytes:
+    data = text.encode()
+    return _pack_varint(len(data)) + data
+
+
+def _pack_packet(packet_id: int, payload: bytes) -> bytes:
+    data = _pack_varint(packet_id) + payload
+    return _pack_varint(len(data)) + data
@@ -0,0 +1,155 @@
+import re
+from typing import AsyncGenerator
+
+from pydantic import BaseModel
+
+from somnus.actions.rcon import parse_list_answer
+from somnus.actions.ssh import SCREEN_TERMINATING_PATTERN
+from somnus.actions.ssh_transport import SSHTransport
+
+STARTUP_STAGES = ["starting", "loading", "preparing_level", "preparing_spawn"]
+
+_ANSI_ESCAPE_PATTERN = re.compile(r"\x1b(\[[0-?]*[ -/]*[@-~]|[()][0-9A-Za-z]|[=>78M])")
+_STAGE_PATTERNS = [
+    ("starting", re.compile(r"Starting (minecraft )?server", re.IGNORECASE)),
+    ("loading", re.compile(r"Loading (libraries|properties)|ModLauncher running", re.IGNORECASE)),
+    ("preparing_level", re.compile(r"Preparing level")),
+    ("preparing_spawn", re.compile(r"Preparing start region")),
+]
+_SPAWN_PROGRESS_PATTERN = re.compile(r"Preparing spawn area: (\d+)%")
+_DONE_PATTERN = re.compile(r"Done \((\d+(?:[.,]\d+)?)s\)!")
+_CRASH_PATTERN = re.compile(
+    r"Minecraft Crash Report|Failed to start the minecraft server|Encountered an unexpected exception"
+    r"|Exception in server tick loop|Unable to access jarfile|Could not find or load main class"
+    r"|Error occurred during initialization of VM|command not found"
+)
+# Only the bracketed time, thread and level in front of a line logged by the server itself, like
+# "[12:00:00] [Server thread/INFO]: " or "[12:00:00 INFO]: ", so a chat message can't pretend to be a join
+_LOG_PREFIX = r"^(?:\[[^\]]*\]\s*)+:\s"
+# Bedrock players joining over Geyser get a prefix like "." or "*"
+_PLAYER_NAME = r"[.*]?\w{1,16}"
+_JOINED_PATTERN = re.compile(
+    _LOG_PREFIX + rf"({_PLAYER_NAME})(?: \(formerly known as {_PLAYER_NAME}\))? joined the game$"
+)
+_LEFT_PATTERN = re.compile(_LOG_PREFIX + rf"({_PLAYER_NAME}) left the game$")
+_CHAT_PATTERN = re.compile(_LOG_PREFIX + rf"(?:\[Not Secure\] )?<({_PLAYER_NAME})> (.*)$")
+_LIST_PATTERN = re.compile(_LOG_PREFIX + r"(There are .*)$")
+_STOPPING_PATTERN = re.compile(_LOG_PREFIX + r"Stopping (the )?server")
+_SCREEN_TERMINATING_PATTERN = re.compile(rf"^{SCREEN_TERMINATING_PATTERN}$")
+
+
+class StageReached(BaseModel):
+    stage: str
+
+
+class SpawnProgress(BaseModel):
+    percent: int
+
+
+class ServerDone(BaseModel):
+    startup_seconds: float
+
+
+class ServerCrashed(BaseModel):
+    line: str
+
+
+class PlayerJoined(BaseModel):
+    player_name: str
+
+
+class PlayerLeft(BaseModel):
+    player_name: str
+
+
+class ChatMessage(BaseModel):
+    player_name: str
+    message: str
+
+
+class PlayerList(BaseModel):
+    """
+    The answer to `list`.
+    """
+
+    online: int
+    max: int
+    names: list[str]
+
+
+class ServerStopping(BaseModel):
+    pass
+
+
+class ScreenTerminated(BaseModel):
+    """
+    The screen session ended, the terminal is back in the shell it was started from.
+    """
+
+
+ConsoleEvent = (
+    StageReached
+    | SpawnProgress
+    | ServerDone
+    | ServerCrashed
+    | PlayerJoined
+    | PlayerLeft
+    | ChatMessage
+    | PlayerList
+    | ServerStopping
+    | ScreenTerminated
+)
+
+
+def parse_console_line(line: str) -> ConsoleEvent | None:
+    line = _ANSI_ESCAPE_PATTERN.sub("", line).strip()
+
+    # First, so nothing a player writes is taken for a line of the server
+    if event := _parse_player_line(line):
+        return event
+    if _SCREEN_TERMINATING_PATTERN.search(line):
+        return ScreenTerminated()
+    return _parse_server_line(line)
+
+
+def _parse_server_line(line: str) -> ConsoleEvent | None:
+    if match := _DONE_PATTERN.search(line):
+        return ServerDone(startup_seconds=float(match.group(1).replace(",", ".")))
+    if match := _SPAWN_PROGRESS_PATTERN.search(line):
+        return SpawnProgress(percent=int(match.group(1)))
+    if _CRASH_PATTERN.search(line):
+        return ServerCrashed(line=line)
+    for stage, pattern in _STAGE_PATTERNS:
+        if pattern.search(line):
+            return StageReached(stage=stage)
+    return None
+
+
+def _parse_player_line(line: str) -> ConsoleEvent | None:
+    if match := _CHAT_PATTERN.search(line):
+        return ChatMessage(player_name=match.group(1), message=match.group(2))
+    if match := _JOINED_PATTERN.search(line):
+        return PlayerJoined(player_name=match.group(1))
+    if match := _LEFT_PATTERN.search(line):
+        return PlayerLeft(player_name=match.group(1))
+    if (match := _LIST_PATTERN.search(line)) and (answer := parse_list_answer(match.group(1))):
+        return PlayerList(online=answer[0], max=answer[1], names=answer[2])
+    if _STOPPING_PATTERN.search(line):
+        return ServerStopping()
+    return None
+
+
+async def read_console_events(ssh: SSHTransport, idle_timeout_seconds: float) -> AsyncGenerator[ConsoleEvent, None]:
+    """
+    Parses the console output line by line as it arrives.
+
+    Raises:
+        TimeoutError: If the console printed nothing for `idle_timeout_seconds`
+        EOFError: If the connection was closed
+    """
+
+    while True:
+        line = await ssh.readline(timeout=idle_timeout_seconds)
+        event = parse_console_line(line)
+        if event:
+            yield event
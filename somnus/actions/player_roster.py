@@ -0,0 +1,197 @@
+import asyncio
+import time
+from typing import Callable
+
+from somnus.actions.console_log import (
+    ChatMessage,
+    ConsoleEvent,
+    PlayerJoined,
+    PlayerLeft,
+    PlayerList,
+    ServerStopping,
+    read_console_events,
+)
+from somnus.actions.ssh import follow_screen_log, ssh_login, stop_following_screen_log
+from somnus.actions.ssh_transport import SSHTransport
+from somnus.actions.stats import PlayerStats
+from somnus.config import Config
+from somnus.logger import log
+from somnus.metrics import metrics
+
+# A quiet console is normal, nobody joins or leaves for hours
+FOLLOW_IDLE_SECONDS = 300
+# After the console could not be followed, e.g. because the MC server was not started by somnus
+FOLLOW_RETRY_SECONDS = 300
+
+RosterListener = Callable[[Config, PlayerJoined | PlayerLeft, PlayerStats], None]
+
+CONSOLE_EVENTS = metrics.counter(
+    "somnus_console_player_events_total", "Joins, leaves and chat messages read from the console", ("host", "event")
+)
+FOLLOWED_CONSOLES = metrics.gauge("somnus_followed_consoles", "MC server consoles that are followed", ("host",))
+
+
+class PlayerRoster:
+    """
+    Exact players on the MC server of every host server, kept from the join and leave lines of its console instead
+    of polled. The console is followed over one SSH session for as long as the MC server runs. The roster is known
+    once the answer to `list` was read from the console, until then the probes are used as before.
+    """
+
+    def __init__(self) -> None:
+        # Names in the order the players joined, as an ordered set
+        self._players: dict[str, dict[str, None]] = {}
+        self._max_players: dict[str, int] = {}
+        self._followers: dict[str, asyncio.Task] = {}
+        self._retry_after: dict[str, float] = {}
+        # Host servers whose MC server printed that it is stopping, it still runs until the worlds are saved
+        self._stopping: set[str] = set()
+        self._listeners: list[RosterListener] = []
+
+    def subscribe(self, listener: RosterListener) -> None:
+        """
+        Calls `listener` with the new players after every join and leave of a known roster.
+        """
+
+        self._listeners.append(listener)
+
+    def get_players(self, config: Config) -> PlayerStats | None:
+        """
+        The players of a followed console, None if the roster is not known.
+        """
+
+        host_name = config.HOST_SERVER_NAME
+        if host_name not in self._max_players:
+            return None
+        names = list(self._players[host_name])
+        return PlayerStats(online=len(names), max=self._max_players[host_name], names=names)
+
+    def observe(self, config: Config, mc_server_running: bool) -> None:
+        """
+        Follows the console of a running MC server and stops following a stopped one.
+        """
+
+        host_name = config.HOST_SERVER_NAME
+        follower = self._followers.get(host_name)
+        if not mc_server_running:
+            if follower:
+                follower.cancel()
+            self._retry_after.pop(host_name, None)
+            self._stopping.discard(host_name)
+            return
+
+        if follower or host_name in self._stopping or time.monotonic() < self._retry_after.get(host_name, 0):
+            return
+        self._followers[host_name] = asyncio.create_task(self._follow(config))
+
+    def apply(self, config: Config, event: ConsoleEvent) -> bool:
+        """
+        Updates the roster with an event of the console, returns False once the MC server stops.
+        """
+
+        host_name = config.HOST_SERVER_NAME
+        players = self._players.setdefault(host_name, {})
+        known = host_name in self._max_players
+
+        if isinstance(event, PlayerList):
+            # Hidden players, e.g. by a vanish plugin, would make the roster inexact
+            if event.online == len(event.names):
+                self._players[host_name] = dict.fromkeys(event.names)
+                self._max_players[host_name] = event.max
+                log.debug(f"Players on host server '{host_name}': {event.names}")
+        elif isinstance(event, PlayerJoined):
+            CONSOLE_EVENTS.inc(host=host_name, event="join")
+            players[event.player_name] = None
+            if known:
+                self._publish(config, event)
+        elif isinstance(event, PlayerLeft):
+            CONSOLE_EVENTS.inc(host=host_name, event="leave")
+            players.pop(event.player_name, None)
+            if known:
+                self._publish(config, event)
+        elif isinstance(event, ChatMessage):
+            CONSOLE_EVENTS.inc(host=host_name, event="chat")
+            # Only a player who is online can chat, so a missed join is made up for
+            if known and event.player_name not in players:
+                log.debug(f"Player '{event.player_name}' chatted without a join on host server '{host_name}'")
+                self.apply(config, PlayerJoined(player_name=event.player_name))
+        elif isinstance(event, ServerStopping):
+            return False
+        return True
+
+    async def follow(self, config: Config, ssh: SSHTransport) -> None:
+        """
+        Applies the events of a console until the MC server stops.
+
+        Raises:
+            EOFError: If the connection was closed
+        """
+
+        while True:
+            try:
+                async for event in read_console_events(ssh, FOLLOW_IDLE_SECONDS):
+                    if not self.apply(config, event):
+                        return
+            except TimeoutError:
+                continue
+
+    def _forget(self, host_name: str) -> None:
+        self._players.pop(host_name, None)
+        self._max_players.pop(host_name, None)
+
+    def _publish(self, config: Config, event: PlayerJoined | PlayerLeft) -> None:
+        players = self.get_players(config)
+        if players is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(config, event, players)
+            except Exception as e:
+                log.error(f"Roster listener failed for '{event.player_name}'", exc_info=e)
+
+    async def _follow(self, config: Config) -> None:
+        host_name = config.HOST_SERVER_NAME
+        ssh = None
+        following = False
+        FOLLOWED_CONSOLES.set(1, host=host_name)
+        try:
+            # The session is busy for as long as the MC server runs, so it does not come from the pool
+            ssh = await ssh_login(config, attempts=1)
+            if not await follow_screen_log(ssh):
+                log.info(f"No screen session on host server '{host_name}' to follow, polling the players instead")
+                self._retry_after[host_name] = time.monotonic() + FOLLOW_RETRY_SECONDS
+                return
+            following = True
+            log.debug(f"Following the console of host server '{host_name}'")
+            await self.follow(config, ssh)
+            # Following again now would ask the stopping MC server for its players
+            log.debug(f"MC server on host server '{host_name}' is stopping")
+            self._stopping.add(host_name)
+        except TimeoutError as e:
+            log.warning(f"Could not follow the console of host server '{host_name}' | {e}")
+            self._retry_after[host_name] = time.monotonic() + FOLLOW_RETRY_SECONDS
+        except EOFError:
+            # Followed again with the next probe of the running MC server
+            log.debug(f"Connection to the console of host server '{host_name}' closed")
+        except Exception as e:
+            log.error(f"Could not follow the console of host server '{host_name}'", exc_info=e)
+            self._retry_after[host_name] = time.monotonic() + FOLLOW_RETRY_SECONDS
+        finally:
+            FOLLOWED_CONSOLES.set(0, host=host_name)
+            if ssh:
+                if following and ssh.is_alive():
+                    await _stop_following(host_name, ssh)
+                ssh.close()
+            self._forget(host_name)
+            if self._followers.get(host_name) is asyncio.current_task():
+                del self._followers[host_name]
+
+
+async def _stop_following(host_name: str, ssh: SSHTransport) -> None:
+    try:
+        await stop_following_screen_log(ssh)
+    except (EOFError, OSError) as e:
+        log.debug(f"Could not stop following the console of host server '{host_name}' | {e}")
+
+
+player_roster = PlayerRoster()
@@ -0,0 +1,233 @@
+import asyncio
+import itertools
+import re
+import struct
+import time
+
+from somnus.config import Config
+from somnus.logger import log
+from somnus.metrics import metrics
+
+RCON_COMMAND_SECONDS = metrics.histogram(
+    "somnus_rcon_command_seconds", "Duration of successful RCON commands, including the login", ("command", "host")
+)
+RCON_FAILURES = metrics.counter("somnus_rcon_failures_total", "Failed RCON commands", ("command", "host"))
+
+_LOGIN_TYPE = 3
+_COMMAND_TYPE = 2
+# The server answers a request of an unknown type with a single packet, which marks the end of the previous answer
+_END_MARKER_TYPE = 0
+# Request ID, type and the two null bytes, the payload of an answer has at most 4096 bytes
+_MIN_PACKET_BYTES = 10
+_MAX_PACKET_BYTES = 4096 + _MIN_PACKET_BYTES
+
+_LIST_PATTERN = re.compile(
+    r"There are (\d+)(?: of a max of | out of maximum |/)(\d+) players online[.:]?(.*)", re.DOTALL
+)
+
+
+class RconError(Exception):
+    pass
+
+
+class RconConnection:
+    """
+    A logged in RCON connection to a Minecraft server. Commands are sent one after the other.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._request_ids = itertools.count(1)
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, host: str, port: int, password: str, timeout_seconds: float = 5) -> "RconConnection":
+        """
+        Raises:
+            RconError: If the password was rejected.
+            OSError: If the server could not be reached.
+            TimeoutError: If the server did not answer in time.
+        """
+
+        async with asyncio.timeout(timeout_seconds):
+            reader, writer = await asyncio.open_connection(host, port)
+            connection = cls(reader, writer)
+            try:
+                request_id = connection._send(_LOGIN_TYPE, password)
+                # A failed login is answered with the request ID -1
+                answer_id, _, _ = await connection._read_packet()
+                if answer_id != request_id:
+                    raise RconError("RCON login failed, check the RCON password")
+            except BaseException:
+                connection.close()
+                raise
+        return connection
+
+    async def command(self, command: str, timeout_seconds: float = 10) -> str:
+        """
+        Raises:
+            ConnectionError: If the server closed the connection.
+            TimeoutError: If the server did not answer in time.
+        """
+
+        async with self.lock, asyncio.timeout(timeout_seconds):
+            request_id = self._send(_COMMAND_TYPE, command)
+            end_marker_id = self._send(_END_MARKER_TYPE, "")
+
+            # Long answers are split into several packets
+            answer = []
+            while True:
+                answer_id, _, payload = await self._read_packet()
+                if answer_id == end_marker_id:
+                    return "".join(answer)
+                if answer_id == request_id:
+                    answer.append(payload)
+
+    async def wait_closed(self, timeout_seconds: float) -> None:
+        """
+        Waits until the server closes the connection, which it does when it stops after saving the worlds.
+
+        Raises:
+            TimeoutError: If the connection is still open after `timeout_seconds`.
+        """
+
+        async with asyncio.timeout(timeout_seconds):
+            while await self._reader.read(4096):
+                pass
+
+    def is_alive(self) -> bool:
+        return not self._writer.is_closing() and not self._reader.at_eof()
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def _send(self, packet_type: int, payload: str) -> int:
+        request_id = next(self._request_ids)
+        body = struct.pack("<ii", request_id, packet_type) + payload.encode("utf-8") + b"\x00\x00"
+        self._writer.write(struct.pack("<i", len(body)) + body)
+        return request_id
+
+    async def _read_packet(self) -> tuple[int, int, str]:
+        try:
+            (length,) = struct.unpack("<i", await self._reader.readexactly(4))
+            if not _MIN_PACKET_BYTES <= length <= _MAX_PACKET_BYTES:
+                raise ConnectionError(f"Invalid RCON packet length {length}")
+            body = await self._reader.readexactly(length)
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionError("RCON connection was closed") from e
+
+        request_id, packet_type = struct.unpack("<ii", body[:8])
+        return request_id, packet_type, body[8:-2].decode("utf-8", errors="replace")
+
+
+class RconPool:
+    """
+    Keeps one logged in RCON connection per Minecraft server, so commands and probes don't have to log in again.
+    """
+
+    def __init__(self) -> None:
+        self._connections: dict[tuple[str, int], RconConnection] = {}
+        self._connect_locks: dict[tuple[str, int], asyncio.Lock] = {}
+
+    async def command(self, config: Config, command: str, timeout_seconds: float = 10) -> str:
+        """
+        Sends a console command, e.g. `list` or `say Hello`, and returns the answer of the server.
+        A connection that broke while it was idle is replaced once.
+
+        Raises:
+            RconError: If RCON is not configured, the server could not be reached or did not answer.
+        """
+
+        key = _get_connection_key(config)
+        command_name = command.split(" ", 1)[0]
+        start_time = time.monotonic()
+        try:
+            reused = key in self._connections
+            try:
+                answer = await self._send_command(key, config, command, timeout_seconds)
+            except ConnectionError:
+                if not reused:
+                    raise
+                log.debug("Pooled RCON connection was closed, connecting again")
+                answer = await self._send_command(key, config, command, timeout_seconds)
+        except (OSError, TimeoutError, RconError) as e:
+            RCON_FAILURES.inc(command=command_name, host=config.HOST_SERVER_NAME)
+            raise RconError(f"RCON command '{command_name}' failed | {e}") from e
+
+        RCON_COMMAND_SECONDS.observe(time.monotonic() - start_time, command=command_name, host=config.HOST_SERVER_NAME)
+        return answer
+
+    def discard(self, config: Config) -> None:
+        connection = self._connections.pop(_get_connection_key(config), None)
+        if connection:
+            connection.close()
+
+    def close_all(self) -> None:
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    async def _send_command(self, key: tuple[str, int], config: Config, command: str, timeout_seconds: float) -> str:
+        try:
+            connection = await self._get_connection(key, config, timeout_seconds)
+            return await connection.command(command, timeout_seconds)
+        except BaseException:
+            # Also when cancelled while waiting, the answer would still arrive on this connection
+            self.discard(config)
+            raise
+
+    async def _get_connection(self, key: tuple[str, int], config: Config, timeout_seconds: float) -> RconConnection:
+        async with self._connect_locks.setdefault(key, asyncio.Lock()):
+            connection = self._connections.get(key)
+            if connection and connection.is_alive():
+                return connection
+            if connection:
+                connection.close()
+
+            connection = await connect_rcon(config, timeout_seconds)
+            self._connections[key] = connection
+            return connection
+
+
+async def connect_rcon(config: Config, timeout_seconds: float = 5) -> RconConnection:
+    """
+    Opens a new connection that is not pooled, e.g. for a command after which the server closes the connection.
+
+    Raises:
+        RconError: If RCON is not configured or the login failed.
+        OSError: If the server could not be reached.
+        TimeoutError: If the server did not answer in time.
+    """
+
+    if not rcon_is_configured(config):
+        raise RconError(f"RCON is not configured for host server '{config.HOST_SERVER_NAME}'")
+
+    log.debug(f"Connecting to RCON of host server '{config.HOST_SERVER_NAME}' ...")
+    host, port = _get_connection_key(config)
+    return await RconConnection.connect(host, port, config.MC_SERVER_RCON_PASSWORD, timeout_seconds)
+
+
+def rcon_is_configured(config: Config) -> bool:
+    return config.MC_SERVER_RCON_PORT is not None and config.MC_SERVER_RCON_PASSWORD != ""
+
+
+def parse_list_answer(answer: str) -> tuple[int, int, list[str]] | None:
+    """
+    The online and maximum player count and the player names from the answer to `list`.
+    """
+
+    match = _LIST_PATTERN.search(answer)
+    if not match:
+        return None
+    names = [name.strip() for name in match.group(3).split(",") if name.strip()]
+    return int(match.group(1)), int(match.group(2)), names
+
+
+def _get_connection_key(config: Config) -> tuple[str, int]:
+    # RCON listens on the same address as the Minecraft server
+    host = config.MC_SERVER_ADDRESS.rsplit(":", 1)[0] if ":" in config.MC_SERVER_ADDRESS else config.MC_SERVER_ADDRESS
+    return (host, config.MC_SERVER_RCON_PORT or 0)
+
+
+rcon_pool = RconPool()
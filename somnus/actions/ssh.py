@@ -1,83 +1,229 @@
 import asyncio
+import shlex
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from asyncer import asyncify
-from pexpect import pxssh
-
+from somnus.actions.ssh_transport import SSHTransport, connect
 from somnus.config import Config
 from somnus.logger import log
+from somnus.metrics import metrics
+
+# Written by the screen session of the MC server while its console is followed, emptied at every start of following
+SCREEN_LOG_PATH = "/tmp/somnus-mc-server-control.log"  # noqa: S108
+# Printed by screen to the attached terminal when the session ended
+SCREEN_TERMINATING_PATTERN = r"\[screen is terminating\]"
+# The MC server exits right after it saved the worlds
+SCREEN_EXIT_TIMEOUT_SECONDS = 30
+
+SSH_LOGIN_SECONDS = metrics.histogram(
+    "somnus_ssh_login_seconds", "Duration of successful SSH logins to the host server", ("host",)
+)
+SSH_LOGIN_FAILURES = metrics.counter(
+    "somnus_ssh_login_failures_total", "Failed SSH login attempts to the host server", ("host",)
+)
+
+
+class SSHSessionPool:
+    """
+    Keeps logged in SSH sessions to the host servers warm and leases them to the actions,
+    so that not every action and heartbeat has to pay for a new SSH handshake and login.
+    """
+
+    def __init__(
+        self, max_idle_sessions: int = 2, max_sessions_per_host: int = 4, max_idle_seconds: float = 300
+    ) -> None:
+        self._max_idle_sessions = max_idle_sessions
+        self._max_sessions_per_host = max_sessions_per_host
+        self._max_idle_seconds = max_idle_seconds
+        self._idle_sessions: dict[tuple[str, int, str], list[tuple[SSHTransport, float]]] = {}
+        self._host_semaphores: dict[tuple[str, int, str], asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def lease(self, config: Config, login_attempts: int | None = None) -> AsyncIterator[SSHTransport]:
+        """
+        Leases a health checked session. The session is returned to the pool if the block exits normally
+        and dropped if it raises, because the state of the remote shell is unknown then.
+
+        Raises:
+            TimeoutError: Could not establish a SSH connection to the server
+        """
+
+        key = _get_session_key(config)
+        semaphore = self._host_semaphores.setdefault(key, asyncio.Semaphore(self._max_sessions_per_host))
+
+        async with semaphore:
+            ssh = await self._acquire(key, config, login_attempts)
+            try:
+                yield ssh
+            except BaseException:
+                await _close_session(ssh)
+                raise
+            await self._release(key, ssh)
+
+    async def close_all(self) -> None:
+        for sessions in self._idle_sessions.values():
+            while sessions:
+                ssh, _ = sessions.pop()
+                await _close_session(ssh)
+
+    async def _acquire(self, key: tuple[str, int, str], config: Config, login_attempts: int | None) -> SSHTransport:
+        sessions = self._idle_sessions.get(key, [])
+        while sessions:
+            ssh, released_at = sessions.pop()
+            if time.monotonic() - released_at < self._max_idle_seconds and await _session_is_healthy(ssh):
+                log.debug("Reusing pooled SSH session")
+                return ssh
+            log.debug("Dropping stale pooled SSH session")
+            await _close_session(ssh)
+
+        return await ssh_login(config, login_attempts)
+
+    async def _release(self, key: tuple[str, int, str], ssh: SSHTransport) -> None:
+        sessions = self._idle_sessions.setdefault(key, [])
+        if not ssh.is_alive() or len(sessions) >= self._max_idle_sessions:
+            await _close_session(ssh)
+            return
+        sessions.append((ssh, time.monotonic()))
+
+
+def _get_session_key(config: Config) -> tuple[str, int, str]:
+    return (config.HOST_SERVER_HOST, config.HOST_SERVER_SSH_PORT, config.HOST_SERVER_USER)
+
+
+async def _session_is_healthy(ssh: SSHTransport) -> bool:
+    if not ssh.is_alive():
+        return False
+
+    # The marker is only printed after shell expansion, so this also skips everything still left in the buffer
+    try:
+        await ssh.sendline("echo somnus-$((40 + 2))")
+        await ssh.expect("somnus-42", timeout=5)
+        return await ssh.prompt(timeout=5)
+    except Exception:
+        return False
+
+
+async def _close_session(ssh: SSHTransport) -> None:
+    try:
+        if ssh.is_alive():
+            await ssh.logout()
+    except Exception:
+        pass
+    finally:
+        ssh.close()
+
+
+ssh_pool = SSHSessionPool()
 
 
-async def ssh_login(config: Config) -> pxssh.pxssh:
+async def ssh_login(config: Config, attempts: int | None = None) -> SSHTransport:
     """
     Raises:
         TimeoutError: Could not establish a SSH connection to the server
     """
 
-    attempts = 2 if config.DEBUG else 10
+    if attempts is None:
+        attempts = 2 if config.DEBUG else 10
     seconds_between_attempts = 1 if config.DEBUG else 5
-    ssh = pxssh.pxssh()
 
     for tries in range(attempts):
+        start_time = time.monotonic()
         try:
-            ssh = pxssh.pxssh()
-            await asyncify(ssh.login)(
-                config.HOST_SERVER_HOST,
-                config.HOST_SERVER_USER,
-                config.HOST_SERVER_PASSWORD,
-                port=config.HOST_SERVER_SSH_PORT,
-                login_timeout=5,
-            )
-            break
+            ssh = await connect(config)
         except Exception as e:
+            SSH_LOGIN_FAILURES.inc(host=config.HOST_SERVER_NAME)
             log.warning(f"Could not connect to host server | '{e}'")
+        else:
+            SSH_LOGIN_SECONDS.observe(time.monotonic() - start_time, host=config.HOST_SERVER_NAME)
+            return ssh
 
-        if tries == (attempts - 1):
-            raise TimeoutError("Could not establish SSH connection to host server")
-        await asyncio.sleep(seconds_between_attempts)
+        if tries < attempts - 1:
+            await asyncio.sleep(seconds_between_attempts)
 
-    return ssh
+    raise TimeoutError("Could not establish SSH connection to host server")
 
 
-async def send_sudo_command(ssh: pxssh.pxssh, config: Config, command: str) -> None:
-    ssh.sendline(f"sudo {command}")
-    choice = await asyncify(ssh.expect)(["sudo", "@"])
+async def send_sudo_command(ssh: SSHTransport, config: Config, command: str) -> None:
+    await ssh.sendline(f"sudo {command}")
+    choice = await ssh.expect(["sudo", "@"])
     if choice == 0:
-        ssh.sendline(config.HOST_SERVER_PASSWORD)
-    await asyncify(ssh.prompt)()
+        await ssh.sendline(config.HOST_SERVER_PASSWORD)
+    await ssh.prompt()
 
 
-async def detach_screen_session(ssh: pxssh.pxssh) -> None:
+async def detach_screen_session(ssh: SSHTransport) -> None:
     log.debug("Detaching screen session ...")
-    ssh.sendcontrol("a")
+    await ssh.sendcontrol("a")
     await asyncio.sleep(0.1)
-    ssh.sendcontrol("d")
-    await asyncify(ssh.prompt)()
+    await ssh.sendcontrol("d")
+    await ssh.prompt()
 
 
-async def kill_screen(ssh: pxssh.pxssh, config: Config) -> None:
+async def kill_screen(ssh: SSHTransport, config: Config) -> None:
     log.debug("Killing screen session ...")
-    ssh.sendline("screen -X -S mc-server-control quit")
-    await asyncify(ssh.prompt)()
+    await ssh.sendline("screen -X -S mc-server-control quit")
+    await ssh.prompt()
 
 
-async def create_screen(ssh: pxssh.pxssh, config: Config) -> None:
+async def create_screen(ssh: SSHTransport, config: Config, start_cmd: str) -> None:
     log.debug("Starting screen session ...")
-    ssh.sendline("screen -S mc-server-control")
+    # Without a shell in the session, it ends together with the MC server and nothing is left after a stop
+    await ssh.sendline(f"screen -S mc-server-control sh -c {shlex.quote(start_cmd)}")
 
 
-async def attach_screen(ssh: pxssh.pxssh, config: Config) -> None:
+async def leave_screen(ssh: SSHTransport, config: Config) -> None:
+    """
+    Waits until the attached screen session ended together with the MC server. A session that is still there,
+    because the MC server hangs or it was started with a shell in it by an older version, is detached and killed.
+    """
+
+    try:
+        await ssh.expect(SCREEN_TERMINATING_PATTERN, timeout=SCREEN_EXIT_TIMEOUT_SECONDS)
+    except TimeoutError:
+        log.debug("Screen session did not end")
+        await detach_screen_session(ssh)
+        await kill_screen(ssh, config)
+        return
+    await ssh.prompt()
+
+
+async def attach_screen(ssh: SSHTransport, config: Config) -> None:
     log.debug("Connecting to screen session ...")
-    ssh.sendline("screen -r mc-server-control")
+    await ssh.sendline("screen -r mc-server-control")
 
 
-async def screen_is_installed(ssh: pxssh.pxssh) -> bool:
-    ssh.sendline("command -v screen")
-    await asyncify(ssh.prompt)()
-    ssh.sendline("echo $?")
-    await asyncify(ssh.prompt)()
+async def screen_is_installed(ssh: SSHTransport) -> bool:
+    await ssh.sendline("command -v screen > /dev/null && echo screen-$((1 + 1)) || echo screen-$((1 - 1))")
+    found = await ssh.expect(["screen-2", "screen-0"])
+    await ssh.prompt()
+    return found == 0
 
-    before_output = ssh.before
-    if before_output is None:
-        return False
-    exit_status = int(before_output.splitlines()[-2])
-    return exit_status == 0
+
+async def follow_screen_log(ssh: SSHTransport) -> bool:
+    """
+    Logs the screen session to a file, flushed every second, asks the MC server for its players with `list` and
+    prints the log from then on. Returns False if there is no screen session. The shell is busy until
+    `stop_following_screen_log`, so it must not be returned to the pool.
+    """
+
+    log.debug("Following screen log ...")
+    screen = "screen -S mc-server-control -X"
+    await ssh.sendline(
+        f"{screen} logfile {SCREEN_LOG_PATH} && {screen} logfile flush 1 && {screen} log on && : > {SCREEN_LOG_PATH}"
+        f" && {screen} stuff \"list$(printf '\\r')\" && echo following-$((1 + 1)) && tail -n +1 -F {SCREEN_LOG_PATH}"
+        " || echo following-$((1 - 1))"
+    )
+    return await ssh.expect(["following-2", "following-0"]) == 0
+
+
+async def stop_following_screen_log(ssh: SSHTransport) -> None:
+    """
+    Ends the `tail` of `follow_screen_log`, turns the log of the screen session off and deletes the log file,
+    which would keep growing otherwise.
+    """
+
+    log.debug("Stopping to follow screen log ...")
+    await ssh.sendcontrol("c")
+    await ssh.sendline(f"screen -S mc-server-control -X log off; rm -f {SCREEN_LOG_PATH}")
+    await ssh.prompt(timeout=5)
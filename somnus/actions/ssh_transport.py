@@ -0,0 +1,248 @@
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+from somnus.config import Config
+
+# Only the selected backend is imported, when the first connection is made
+if TYPE_CHECKING:
+    import asyncssh
+    from pexpect import pxssh
+
+# Escaped, so that the echo of the command setting the prompt does not match the prompt pattern
+_SET_PROMPT_COMMAND = r"unset PROMPT_COMMAND; PS1='[SOMNUS]\$ '"
+_PROMPT_PATTERN = r"\[SOMNUS\][\$\#] "
+_MAX_BUFFER_SIZE = 256 * 1024
+
+
+class SSHTransport(ABC):
+    """
+    Interactive shell on the host server. `expect` works like in pexpect: the patterns are regular expressions,
+    the output before the match is stored in `before` and the index of the matched pattern is returned.
+    """
+
+    before: str | None = None
+
+    @abstractmethod
+    async def sendline(self, line: str = "") -> None: ...
+
+    @abstractmethod
+    async def sendcontrol(self, char: str) -> None: ...
+
+    @abstractmethod
+    async def expect(self, patterns: str | list[str], timeout: float = 30) -> int:  # noqa: ASYNC109
+        """
+        Raises:
+            TimeoutError: If none of the patterns was found in time
+            EOFError: If the connection was closed
+        """
+
+    @abstractmethod
+    async def prompt(self, timeout: float = 30) -> bool:  # noqa: ASYNC109
+        """
+        Waits for the shell prompt, returns False if it did not show up in time.
+        """
+
+    @abstractmethod
+    def is_alive(self) -> bool: ...
+
+    @abstractmethod
+    async def logout(self) -> None: ...
+
+    async def readline(self, timeout: float = 30) -> str:  # noqa: ASYNC109
+        """
+        Raises:
+            TimeoutError: If no complete line was received in time
+            EOFError: If the connection was closed
+        """
+
+        await self.expect(r"\r?\n", timeout=timeout)
+        return self.before or ""
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+
+class PexpectTransport(SSHTransport):
+    """
+    Uses the `ssh` binary through pexpect. Every blocking call occupies a worker thread.
+    """
+
+    def __init__(self, ssh: "pxssh.pxssh") -> None:
+        self._ssh = ssh
+
+    @classmethod
+    async def connect(cls, config: Config) -> "PexpectTransport":
+        from asyncer import asyncify  # noqa: PLC0415
+        from pexpect import pxssh  # noqa: PLC0415
+
+        ssh = pxssh.pxssh(encoding="utf-8", codec_errors="replace")
+        await asyncify(ssh.login)(
+            config.HOST_SERVER_HOST,
+            config.HOST_SERVER_USER,
+            config.HOST_SERVER_PASSWORD,
+            port=config.HOST_SERVER_SSH_PORT,
+            login_timeout=5,
+            auto_prompt_reset=False,
+        )
+        transport = cls(ssh)
+        await transport.sendline(_SET_PROMPT_COMMAND)
+        if not await transport.prompt(timeout=10):
+            ssh.close()
+            raise TimeoutError("Could not set the shell prompt")
+        return transport
+
+    async def sendline(self, line: str = "") -> None:
+        self._ssh.sendline(line)
+
+    async def sendcontrol(self, char: str) -> None:
+        self._ssh.sendcontrol(char)
+
+    async def expect(self, patterns: str | list[str], timeout: float = 30) -> int:  # noqa: ASYNC109
+        from asyncer import asyncify  # noqa: PLC0415
+        from pexpect import EOF, TIMEOUT  # noqa: PLC0415
+
+        try:
+            return await asyncify(self._ssh.expect)(patterns, timeout=timeout)
+        except TIMEOUT as e:
+            raise TimeoutError(f"Timeout while expecting {patterns}") from e
+        except EOF as e:
+            raise EOFError("SSH connection closed") from e
+        finally:
+            self.before = self._ssh.before
+
+    async def prompt(self, timeout: float = 30) -> bool:  # noqa: ASYNC109
+        try:
+            await self.expect(_PROMPT_PATTERN, timeout=timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def is_alive(self) -> bool:
+        return self._ssh.isalive()
+
+    async def logout(self) -> None:
+        from asyncer import asyncify  # noqa: PLC0415
+
+        await asyncify(self._ssh.logout)()
+
+    def close(self) -> None:
+        self._ssh.close()
+
+
+class AsyncSSHTransport(SSHTransport):
+    """
+    Uses asyncssh, so reading the output and matching the patterns happens on the event loop without any threads.
+    """
+
+    def __init__(self, connection: "asyncssh.SSHClientConnection | None", process: "asyncssh.SSHClientProcess") -> None:
+        self._connection = connection
+        self._process = process
+        self._buffer = ""
+        self._eof = False
+        self._new_data = asyncio.Event()
+        self._reader_task = asyncio.create_task(self._read_output())
+
+    @classmethod
+    async def connect(cls, config: Config) -> "AsyncSSHTransport":
+        import asyncssh  # noqa: PLC0415
+
+        connection = await asyncssh.connect(
+            config.HOST_SERVER_HOST,
+            port=config.HOST_SERVER_SSH_PORT,
+            username=config.HOST_SERVER_USER,
+            password=config.HOST_SERVER_PASSWORD,
+            known_hosts=None,
+            connect_timeout=5,
+        )
+        try:
+            process = await connection.create_process(term_type="ansi", term_size=(200, 50), errors="replace")
+        except Exception:
+            connection.close()
+            raise
+
+        transport = cls(connection, process)
+        await transport.sendline(_SET_PROMPT_COMMAND)
+        if not await transport.prompt(timeout=10):
+            transport.close()
+            raise TimeoutError("Could not set the shell prompt")
+        return transport
+
+    async def sendline(self, line: str = "") -> None:
+        self._process.stdin.write(line + "\n")
+
+    async def sendcontrol(self, char: str) -> None:
+        self._process.stdin.write(chr(ord(char.lower()) & 0x1F))
+
+    async def expect(self, patterns: str | list[str], timeout: float = 30) -> int:  # noqa: ASYNC109
+        compiled_patterns = [re.compile(pattern) for pattern in ([patterns] if isinstance(patterns, str) else patterns)]
+
+        async with asyncio.timeout(timeout):
+            while True:
+                match_index, match = _find_first_match(compiled_patterns, self._buffer)
+                if match:
+                    self.before = self._buffer[: match.start()]
+                    self._buffer = self._buffer[match.end() :]
+                    return match_index
+
+                if self._eof:
+                    self.before = self._buffer
+                    raise EOFError("SSH connection closed")
+
+                self._new_data.clear()
+                await self._new_data.wait()
+
+    async def prompt(self, timeout: float = 30) -> bool:  # noqa: ASYNC109
+        try:
+            await self.expect(_PROMPT_PATTERN, timeout=timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def is_alive(self) -> bool:
+        return not self._eof
+
+    async def logout(self) -> None:
+        await self.sendline("exit")
+        try:
+            async with asyncio.timeout(5):
+                await self._reader_task
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._eof = True
+        self._reader_task.cancel()
+        self._process.close()
+        if self._connection:
+            self._connection.close()
+
+    async def _read_output(self) -> None:
+        import asyncssh  # noqa: PLC0415
+
+        try:
+            while data := await self._process.stdout.read(65536):
+                # Only keep the newest output, nobody expects something that was printed minutes ago
+                self._buffer = (self._buffer + data)[-_MAX_BUFFER_SIZE:]
+                self._new_data.set()
+        except (asyncssh.Error, OSError):
+            pass
+        finally:
+            self._eof = True
+            self._new_data.set()
+
+
+def _find_first_match(patterns: list[re.Pattern], text: str) -> tuple[int, re.Match | None]:
+    first_index, first_match = -1, None
+    for i, pattern in enumerate(patterns):
+        match = pattern.search(text)
+        if match and (first_match is None or match.start() < first_match.start()):
+            first_index, first_match = i, match
+    return first_index, first_match
+
+
+async def connect(config: Config) -> SSHTransport:
+    if config.SSH_BACKEND == "pexpect":
+        return await PexpectTransport.connect(config)
+    return await AsyncSSHTransport.connect(config)
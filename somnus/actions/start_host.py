@@ -1,12 +1,30 @@
 import asyncio
+import itertools
+import socket
+import time
 from typing import AsyncGenerator
 
-from asyncer import asyncify
-from wakeonlan import send_magic_packet
-
-from somnus.actions.stats import get_server_state
+from somnus.actions.state_service import server_state_service
+from somnus.actions.stats import HostProbeLevel, probe_host
 from somnus.config import Config
 from somnus.logger import log
+from somnus.metrics import DURATION_BUCKETS, metrics
+
+WOL_PORT = 9
+DEFAULT_WOL_BROADCAST = "255.255.255.255"
+# Seconds to wait after each Wake On Lan burst, the last one repeats until the host server answers
+WOL_SEND_INTERVALS_SECONDS = (1, 1, 2, 3, 5, 10)
+READINESS_PROBE_INTERVAL_SECONDS = 1
+# Progress steps while waiting for the host server, finished ones are skipped when it answers earlier
+WAIT_STEPS = 7
+
+HOST_WAKE_SECONDS = metrics.histogram(
+    "somnus_host_wake_seconds",
+    "Time from sending the Wake On Lan packets until the host server is reachable",
+    ("host",),
+    DURATION_BUCKETS,
+)
+HOST_WAKE_FAILURES = metrics.counter("somnus_host_wake_failures_total", "Host server starts that timed out", ("host",))
 
 
 class HostServerStartError(Exception):
@@ -15,38 +33,75 @@ class HostServerStartError(Exception):
 
 async def start_host_server(config: Config) -> AsyncGenerator:
     """
+    Sends Wake On Lan packets in the background until the SSH server of the host server answers.
+
     Raises:
         HostServerStartError: If host server could not be started.
     """
 
-    ping_count = 2 if config.DEBUG else 15
-    ping_timeout_seconds = 5 if config.DEBUG else 300
+    timeout_seconds = 5 if config.DEBUG else 300
 
-    await _send_wol_packet(config)
-    yield
+    start_time = time.monotonic()
+    wake_task = asyncio.create_task(_send_wol_packets(config))
+    try:
+        yield
 
-    for i in range(ping_count):
-        await asyncio.sleep(ping_timeout_seconds // ping_count)
-
-        if (await get_server_state(config)).host_server_running:
-            for j in range(i, ping_count):
-                if j % 2:
+        step = 0
+        while time.monotonic() - start_time < timeout_seconds:
+            if await probe_host(config, HostProbeLevel.BANNER):
+                HOST_WAKE_SECONDS.observe(time.monotonic() - start_time, host=config.HOST_SERVER_NAME)
+                log.info(f"Host server answered after {time.monotonic() - start_time:.1f} seconds")
+                server_state_service.invalidate(config)
+                for _ in range(step, WAIT_STEPS):
                     yield
-            return
-
-        if i % 2:
-            yield
+                return
 
-        log.warning("Could not connect to host server, trying again...")
+            await asyncio.sleep(READINESS_PROBE_INTERVAL_SECONDS)
+            while step < WAIT_STEPS and time.monotonic() - start_time >= (step + 1) * timeout_seconds / WAIT_STEPS:
+                step += 1
+                yield
+    finally:
+        wake_task.cancel()
 
+    log.warning(f"Host server did not answer within {timeout_seconds} seconds")
+    HOST_WAKE_FAILURES.inc(host=config.HOST_SERVER_NAME)
     raise HostServerStartError
 
 
-async def _send_wol_packet(config: Config) -> None:
-    wol_send_delay_seconds = 5
-    wol_packed_amount = 10
+def get_wol_targets(config: Config) -> list[tuple[str, str | None]]:
+    """
+    The broadcast addresses with the local interface address to send from, None for the default interface.
+    Every broadcast address is used on every interface.
+    """
 
-    if config.HOST_SERVER_MAC != "":
-        for _ in range(wol_packed_amount):
-            await asyncify(send_magic_packet)(config.HOST_SERVER_MAC)
-            await asyncio.sleep(wol_send_delay_seconds)
+    broadcasts = config.HOST_SERVER_WOL_BROADCASTS or [DEFAULT_WOL_BROADCAST]
+    interfaces: list[str | None] = [*config.HOST_SERVER_WOL_INTERFACES] or [None]
+    return [(broadcast, interface) for interface in interfaces for broadcast in broadcasts]
+
+
+async def _send_wol_packets(config: Config) -> None:
+    from wakeonlan import create_magic_packet  # noqa: PLC0415
+
+    if config.HOST_SERVER_MAC == "":
+        return
+
+    packet = create_magic_packet(config.HOST_SERVER_MAC)
+    targets = get_wol_targets(config)
+    for i in itertools.count():
+        for broadcast, interface in targets:
+            try:
+                _send_packet(packet, broadcast, interface)
+            except OSError as e:
+                log.warning(f"Could not send Wake On Lan packet to {broadcast} from {interface or 'any'} | {e}")
+        if i == 0:
+            log.debug(f"Sent Wake On Lan packets to {len(targets)} targets")
+        await asyncio.sleep(WOL_SEND_INTERVALS_SECONDS[min(i, len(WOL_SEND_INTERVALS_SECONDS) - 1)])
+
+
+def _send_packet(packet: bytes, broadcast: str, interface: str | None) -> None:
+    # A UDP datagram on an unconnected socket does not block, so it is sent from the event loop
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if interface is not None:
+            sock.bind((interface, 0))
+        sock.sendto(packet, (broadcast, WOL_PORT))
@@ -1,49 +1,72 @@
+import time
 from typing import AsyncGenerator
 
-from asyncer import asyncify
-from pexpect import TIMEOUT, pxssh
-
-from somnus.actions.ssh import create_screen, detach_screen_session, kill_screen, ssh_login
+from somnus.actions.console_log import (
+    STARTUP_STAGES,
+    ScreenTerminated,
+    ServerCrashed,
+    ServerDone,
+    SpawnProgress,
+    StageReached,
+    read_console_events,
+)
+from somnus.actions.ssh import create_screen, detach_screen_session, leave_screen
+from somnus.actions.ssh_transport import SSHTransport
+from somnus.actions.state_service import server_state_service
 from somnus.config import Config
 from somnus.logger import log
 from somnus.logic.world_selector import get_current_world
+from somnus.metrics import DURATION_BUCKETS, metrics
+
+MC_START_STAGE_SECONDS = metrics.histogram(
+    "somnus_mc_start_stage_seconds",
+    "Time from the previous start stage (or the start command) until a start stage of the MC server was reached",
+    ("stage", "host"),
+    DURATION_BUCKETS,
+)
+MC_START_FAILURES = metrics.counter("somnus_mc_start_failures_total", "Failed MC server starts", ("host",))
 
 
 class MCServerStartError(Exception):
     pass
 
 
-async def start_mc_server(config: Config) -> AsyncGenerator:
-    ssh = await ssh_login(config)
+class _ScreenTerminatedError(Exception):
+    pass
+
 
-    await create_screen(ssh, config)
+async def start_mc_server(ssh: SSHTransport, config: Config, start_cmd: str | None = None) -> AsyncGenerator:
+    """
+    Starts the MC server with `start_cmd`, by default the one of the current world.
+
+    Raises:
+        MCServerStartError: If MC server could not be started.
+    """
+
+    await create_screen(ssh, config, start_cmd or (await get_current_world()).start_cmd)
     yield
 
     try:
-        async for _ in _try_start_mc_server(ssh):
+        async for _ in _try_start_mc_server(ssh, config):
             yield
 
         # Exit peacefully
         await detach_screen_session(ssh)
-        await asyncify(ssh.prompt)()
-        log.debug("Logging out ...")
-        ssh.logout()
         yield
 
-    # Exit in error, kill screen
+    # Exit in error, the screen session ends with the MC server or is killed
     except Exception as exception1:
+        MC_START_FAILURES.inc(host=config.HOST_SERVER_NAME)
         try:
             # Gracefull exit
             log.debug("Problem occurred, try to gracefully exit ...", exc_info=exception1)
-            await detach_screen_session(ssh)
-            await asyncify(ssh.prompt)()
-            await kill_screen(ssh, config)
-            await asyncify(ssh.prompt)()
-            ssh.logout()
-            # TODO: raise error to notify parent that the server dindt start correctly
+            if isinstance(exception1, _ScreenTerminatedError):
+                await ssh.prompt()
+            else:
+                await leave_screen(ssh, config)
         except Exception as exception2:
+            # The session gets dropped by the pool, so the connection is closed hard in this case
             log.error("Could not gracefully exit", exc_info=exception2)
-            ssh.close()  # Hard closing here to make shure the connection is dropped
             raise MCServerStartError(
                 "Problem occured, try to gracefully exit failed. Problem01 (initial problem):\n"
                 + str(exception1)
@@ -56,30 +79,41 @@ async def start_mc_server(config: Config) -> AsyncGenerator:
             ) from exception1
 
 
-async def _try_start_mc_server(ssh: pxssh.pxssh) -> AsyncGenerator:
+async def _try_start_mc_server(ssh: SSHTransport, config: Config) -> AsyncGenerator:
     log_search_timeout_seconds = 150
 
-    log.debug("Send MC server start command ...")
-    ssh.sendline((await get_current_world()).start_cmd)
-    yield
-
     log.debug("Waiting for MC server to start ...")
-    messages = [
-        ["Starting", "running"],
-        ["Loading libraries", "Loading"],
-        ["Environment", "Preparing"],
-        ["Preparing level"],
-        [],
-    ]
-    for i, message in enumerate(messages):
-        try:
-            found_element_index = await asyncify(ssh.expect)(["Done"] + message, timeout=log_search_timeout_seconds)
-            log.debug(f"Stage '{message}' completed")
-
-            if found_element_index == 0:  # if finished earlier, animate the progress bar to its end
-                for _ in range(i, len(messages)):
+    stage_start_time = time.monotonic()
+    reached_stages = 0
+    try:
+        async for event in read_console_events(ssh, log_search_timeout_seconds):
+            if isinstance(event, StageReached):
+                # Stages can be skipped by some server types, so every stage up to the reached one counts as done
+                log.debug(f"Stage '{event.stage}' reached")
+                MC_START_STAGE_SECONDS.observe(
+                    time.monotonic() - stage_start_time, stage=event.stage, host=config.HOST_SERVER_NAME
+                )
+                stage_start_time = time.monotonic()
+                for _ in range(reached_stages, STARTUP_STAGES.index(event.stage) + 1):
+                    reached_stages += 1
+                    yield
+            elif isinstance(event, SpawnProgress):
+                log.debug(f"Preparing spawn area: {event.percent}%")
+            elif isinstance(event, ServerCrashed):
+                raise MCServerStartError(f"Minecraft-Server crashed while starting: {event.line}")
+            elif isinstance(event, ScreenTerminated):
+                raise _ScreenTerminatedError("Minecraft-Server exited while starting")
+            elif isinstance(event, ServerDone):
+                log.info(f"MC server started in {event.startup_seconds} seconds")
+                MC_START_STAGE_SECONDS.observe(
+                    time.monotonic() - stage_start_time, stage="done", host=config.HOST_SERVER_NAME
+                )
+                server_state_service.mc_server_started(config)
+                # if finished earlier, animate the progress bar to its end
+                for _ in range(reached_stages, len(STARTUP_STAGES) + 1):
                     yield
                 return
-            yield
-        except TIMEOUT as e:
-            raise TimeoutError(f"Minecraft-Server could not be startet. Timeout in starting keyword expecting {e}")
+    except TimeoutError as e:
+        raise TimeoutError(
+            f"Minecraft-Server could not be startet. No console output for {log_search_timeout_seconds} seconds"
+        ) from e
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from somnus.actions.player_roster import player_roster
+from somnus.actions.stats import PlayerStats, ServerState, get_server_state
+from somnus.config import Config
+
+DEFAULT_MAX_AGE_SECONDS = 8
+COMMAND_MAX_AGE_SECONDS = 30
+
+
+class ServerStateService:
+    """
+    Central access point for the server state. Concurrent callers share one in-flight probe
+    and results are served from a short lived cache.
+    """
+
+    def __init__(self) -> None:
+        self._cache: dict[tuple[str, str], tuple[ServerState, float]] = {}
+        self._in_flight: dict[tuple[str, str], tuple[asyncio.Task[ServerState], float]] = {}
+        self._mc_server_started: dict[tuple[str, str], asyncio.Event] = {}
+
+    async def get_state(self, config: Config, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS) -> ServerState:
+        """
+        Returns a server state that was probed at most `max_age_seconds` ago.
+        Use `max_age_seconds=0` to force a new probe.
+        """
+
+        key = _get_state_key(config)
+        now = time.monotonic()
+
+        cached = self._cache.get(key)
+        if cached and now - cached[1] <= max_age_seconds:
+            return cached[0]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight and now - in_flight[1] <= max_age_seconds:
+            return await asyncio.shield(in_flight[0])
+
+        task = asyncio.create_task(self._probe(key, config, now))
+        self._in_flight[key] = (task, now)
+        return await asyncio.shield(task)
+
+    async def get_states(
+        self, configs: list[Config], max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS
+    ) -> list[ServerState]:
+        """
+        Probes several host servers in parallel.
+        """
+
+        return list(await asyncio.gather(*(self.get_state(config, max_age_seconds) for config in configs)))
+
+    def peek(self, config: Config) -> ServerState | None:
+        """
+        Returns the last probed state regardless of its age without probing.
+        """
+
+        cached = self._cache.get(_get_state_key(config))
+        return cached[0] if cached else None
+
+    async def get_players(self, config: Config, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS) -> PlayerStats | None:
+        """
+        The players from the followed console without probing, the probed ones if it is not followed.
+        """
+
+        players = player_roster.get_players(config)
+        if players is not None:
+            return players
+        return (await self.get_state(config, max_age_seconds)).players
+
+    def invalidate(self, config: Config) -> None:
+        """
+        Drops the cached state, e.g. after an action changed it. Probes that are still running are not reused anymore.
+        """
+
+        key = _get_state_key(config)
+        self._cache.pop(key, None)
+        self._in_flight.pop(key, None)
+
+    def mc_server_started(self, config: Config) -> None:
+        """
+        Called when the MC server printed "Done", wakes everyone waiting for it and drops the cached state.
+        """
+
+        key = _get_state_key(config)
+        self.invalidate(config)
+        event = self._mc_server_started.pop(key, None)
+        if event:
+            event.set()
+
+    async def wait_for_mc_server_start(self, config: Config, timeout_seconds: float) -> bool:
+        """
+        Waits until a MC server start that is running or about to run is done, without probing.
+        Returns if it was done within `timeout_seconds`.
+        """
+
+        event = self._mc_server_started.setdefault(_get_state_key(config), asyncio.Event())
+        try:
+            async with asyncio.timeout(timeout_seconds):
+                await event.wait()
+        except TimeoutError:
+            return False
+        return True
+
+    async def _probe(self, key: tuple[str, str], config: Config, started_at: float) -> ServerState:
+        server_state = None
+        try:
+            server_state = await get_server_state(config)
+            # The status only has a sample of the players, the console all of them
+            players = player_roster.get_players(config)
+            if server_state.mc_server_running and players is not None:
+                server_state = server_state.model_copy(update={"players": players})
+            return server_state
+        finally:
+            # Only the latest probe may update the cache, older or invalidated ones are discarded
+            in_flight = self._in_flight.get(key)
+            if in_flight and in_flight[0] is asyncio.current_task():
+                del self._in_flight[key]
+                if server_state is not None:
+                    self._cache[key] = (server_state, started_at)
+
+
+def _get_state_key(config: Config) -> tuple[str, str]:
+    return (config.HOST_SERVER_HOST, config.MC_SERVER_ADDRESS)
+
+
+server_state_service = ServerStateService()
@@ -1,63 +1,205 @@
-from asyncer import asyncify
-from mcstatus import JavaServer
-from mcstatus.status_response import JavaStatusResponse
-from pexpect import pxssh
-from ping3 import ping
+import asyncio
+import time
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Coroutine
+
 from pydantic import BaseModel
 
+from somnus.actions.rcon import RconError, parse_list_answer, rcon_is_configured, rcon_pool
+from somnus.actions.ssh import ssh_pool
 from somnus.config import Config
 from somnus.logger import log
+from somnus.metrics import metrics
+
+if TYPE_CHECKING:
+    from mcstatus.querier import QueryResponse
+    from mcstatus.status_response import JavaStatusResponse
+
+DEFAULT_DEADLINE_SECONDS = 5
+
+PROBE_SECONDS = metrics.histogram(
+    "somnus_probe_seconds", "Duration of the server state probes that finished in time", ("probe", "host")
+)
+PROBE_FAILURES = metrics.counter(
+    "somnus_probe_failures_total",
+    "Server state probes without answer, e.g. because the server is off",
+    ("probe", "host", "reason"),
+)
+
+
+class HostProbeLevel(IntEnum):
+    """
+    How sure a host probe has to be that the host server is running. Every level includes the ones before.
+    """
+
+    TCP = 1  # the SSH port accepts connections
+    BANNER = 2  # sshd sends its identification string
+    AUTHENTICATED = 3  # a pooled SSH session is logged in and responds
+
+
+class PlayerStats(BaseModel):
+    online: int
+    max: int
+    names: list[str]
+
+
+class ProbeResult(BaseModel):
+    success: bool
+    timed_out: bool
+    latency_seconds: float | None
 
 
 class ServerState(BaseModel):
     host_server_running: bool
     mc_server_running: bool
+    players: PlayerStats | None = None
+    probes: dict[str, ProbeResult] = {}
+
 
+async def get_mcstatus(config: Config) -> "JavaStatusResponse | None":
+    from mcstatus import JavaServer  # noqa: PLC0415
 
-async def get_mcstatus(config: Config) -> JavaStatusResponse | None:
     try:
         server = await JavaServer.async_lookup(config.MC_SERVER_ADDRESS)
-        return await asyncify(server.status)()
+        return await server.async_status()
     except Exception as e:
         if (not isinstance(e, OSError)) and (not isinstance(e, TimeoutError)):
             log.error(f"Couldn't get mcstatus: {e}")
         return None
 
 
-async def get_server_state(config: Config) -> ServerState:
-    host_server_running = await _is_host_server_running(config)
-    if not host_server_running:
-        return ServerState(host_server_running=False, mc_server_running=False)
-
-    mc_server_running = await _is_mc_server_running(config)
+async def get_mcquery(config: Config) -> "QueryResponse | None":
+    from mcstatus import JavaServer  # noqa: PLC0415
 
-    return ServerState(host_server_running=host_server_running, mc_server_running=mc_server_running)
+    try:
+        server = await JavaServer.async_lookup(config.MC_SERVER_ADDRESS)
+        return await server.async_query()
+    except Exception as e:
+        if (not isinstance(e, OSError)) and (not isinstance(e, TimeoutError)):
+            log.error(f"Couldn't get mcquery: {e}")
+        return None
 
 
-async def _is_mc_server_running(config: Config) -> bool:
-    return bool(await get_mcstatus(config))
+async def get_rcon_players(config: Config) -> PlayerStats | None:
+    """
+    The players from the answer to `list` over the pooled RCON connection.
+    """
 
+    try:
+        answer = parse_list_answer(await rcon_pool.command(config, "list"))
+    except RconError as e:
+        if not isinstance(e.__cause__, (OSError, TimeoutError)):
+            log.error(f"Couldn't get players over RCON: {e}")
+        return None
+    if answer is None:
+        return None
+    online, max_players, names = answer
+    return PlayerStats(online=online, max=max_players, names=names)
+
+
+async def get_server_state(
+    config: Config,
+    host_probe_level: HostProbeLevel = HostProbeLevel.TCP,
+    deadline_seconds: float = DEFAULT_DEADLINE_SECONDS,
+) -> ServerState:
+    """
+    Runs all probes at the same time. Probes that did not finish within the deadline are cancelled
+    and count as failed, their result is marked as timed out.
+    """
+
+    probes: dict[str, Coroutine[Any, Any, Any]] = {
+        "host": probe_host(config, host_probe_level),
+        "status": get_mcstatus(config),
+    }
+    if config.MC_SERVER_QUERY_ENABLED:
+        probes["query"] = get_mcquery(config)
+    if rcon_is_configured(config):
+        probes["rcon"] = get_rcon_players(config)
+
+    results = await _run_probes(probes, deadline_seconds)
+    for name, (result, latency) in results.items():
+        if latency is not None:
+            PROBE_SECONDS.observe(latency, probe=name, host=config.HOST_SERVER_NAME)
+        if not result:
+            reason = "timeout" if latency is None else "failed"
+            PROBE_FAILURES.inc(probe=name, host=config.HOST_SERVER_NAME, reason=reason)
+
+    host_running = bool(results["host"][0])
+    mc_status: "JavaStatusResponse | None" = results["status"][0]
+    mc_query: "QueryResponse | None" = results.get("query", (None, None))[0]
+    rcon_players: PlayerStats | None = results.get("rcon", (None, None))[0]
+
+    # RCON and the query protocol always return all player names, the status only a sample of them
+    players = None
+    if rcon_players:
+        players = rcon_players
+    elif mc_query:
+        players = PlayerStats(online=mc_query.players.online, max=mc_query.players.max, names=mc_query.players.names)
+    elif mc_status:
+        players = PlayerStats(
+            online=mc_status.players.online,
+            max=mc_status.players.max,
+            names=[player.name for player in mc_status.players.sample or []],
+        )
 
-async def _is_host_server_running(config: Config) -> bool:
+    return ServerState(
+        # The MC server answering also proves that its host is running
+        host_server_running=host_running or players is not None,
+        mc_server_running=players is not None,
+        players=players,
+        probes={
+            name: ProbeResult(success=bool(result), timed_out=latency is None, latency_seconds=latency)
+            for name, (result, latency) in results.items()
+        },
+    )
+
+
+async def _run_probes(
+    probes: dict[str, Coroutine[Any, Any, Any]], deadline_seconds: float
+) -> dict[str, tuple[Any, float | None]]:
+    async def run_probe(name: str, probe: Coroutine[Any, Any, Any]) -> tuple[Any, float]:
+        start_time = time.monotonic()
+        try:
+            result = await probe
+        except Exception as e:
+            log.warning(f"Probe '{name}' failed | {e}")
+            result = None
+        return result, time.monotonic() - start_time
+
+    tasks = {name: asyncio.create_task(run_probe(name, probe)) for name, probe in probes.items()}
+    await asyncio.wait(tasks.values(), timeout=deadline_seconds)
+
+    results: dict[str, tuple[Any, float | None]] = {}
+    for name, task in tasks.items():
+        if task.done():
+            results[name] = task.result()
+        else:
+            task.cancel()
+            results[name] = (None, None)
+            log.debug(f"Probe '{name}' did not finish within {deadline_seconds} seconds")
+    return results
+
+
+async def probe_host(config: Config, level: HostProbeLevel = HostProbeLevel.TCP, timeout_seconds: float = 2) -> bool:
     if config.DEBUG and config.HOST_SERVER_HOST in ["localhost", "127.0.0.1"]:
         return True
 
-    ping_success = await asyncify(ping)(config.HOST_SERVER_HOST)
-    if config.HOST_SERVER_HOST not in ["localhost", "127.0.0.1"] and not ping_success:
-        return False
-
     try:
-        ssh = pxssh.pxssh()
-        await asyncify(ssh.login)(
-            config.HOST_SERVER_HOST,
-            config.HOST_SERVER_USER,
-            config.HOST_SERVER_PASSWORD,
-            port=config.HOST_SERVER_SSH_PORT,
-            login_timeout=5,
-        )
-        await asyncify(ssh.prompt)()
-        ssh.logout()
-    except Exception:
+        async with asyncio.timeout(timeout_seconds):
+            reader, writer = await asyncio.open_connection(config.HOST_SERVER_HOST, config.HOST_SERVER_SSH_PORT)
+            try:
+                if level >= HostProbeLevel.BANNER and not (await reader.readline()).startswith(b"SSH-"):
+                    return False
+            finally:
+                writer.close()
+    except (OSError, TimeoutError):
         return False
 
+    if level >= HostProbeLevel.AUTHENTICATED:
+        try:
+            async with ssh_pool.lease(config, login_attempts=1):
+                pass
+        except Exception:
+            return False
+
     return True
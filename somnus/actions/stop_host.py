@@ -1,14 +1,14 @@
-from pexpect import pxssh
+from somnus.actions.ssh import send_sudo_command
+from somnus.actions.ssh_transport import SSHTransport
 from somnus.config import Config
 from somnus.logger import log
-from somnus.actions.ssh import send_sudo_command
 
 
 class HostServerStopError(Exception):
     pass
 
 
-async def stop_host_server(ssh: pxssh.pxssh, config: Config) -> None:
+async def stop_host_server(ssh: SSHTransport, config: Config) -> None:
     """
     Raises:
         HostServerStopError: If host server could not be stopped.
@@ -19,3 +19,18 @@ async def stop_host_server(ssh: pxssh.pxssh, config: Config) -> None:
         await send_sudo_command(ssh, config, "shutdown -h now")
     except Exception as e:
         raise HostServerStopError from e
+
+
+async def suspend_host_server(ssh: SSHTransport, config: Config) -> None:
+    """
+    Suspends the host server to RAM, it is woken by Wake On Lan like a stopped one.
+
+    Raises:
+        HostServerStopError: If host server could not be suspended.
+    """
+
+    try:
+        log.debug("Suspending host server ...")
+        await send_sudo_command(ssh, config, "systemctl suspend")
+    except Exception as e:
+        raise HostServerStopError from e
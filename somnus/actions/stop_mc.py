@@ -1,18 +1,27 @@
+import time
 from typing import AsyncGenerator
 
-from asyncer import asyncify
-from pexpect import pxssh
-
-from somnus.actions.ssh import attach_screen, detach_screen_session, kill_screen
+from somnus.actions.rcon import RconError, connect_rcon, rcon_pool
+from somnus.actions.ssh import attach_screen, leave_screen
+from somnus.actions.ssh_transport import SSHTransport
 from somnus.config import Config
 from somnus.logger import log
+from somnus.metrics import DURATION_BUCKETS, metrics
+
+MC_STOP_STAGE_SECONDS = metrics.histogram(
+    "somnus_mc_stop_stage_seconds",
+    "Time from the previous stop stage (or the stop command) until a stop stage of the MC server was completed",
+    ("stage", "host"),
+    DURATION_BUCKETS,
+)
+MC_STOP_FAILURES = metrics.counter("somnus_mc_stop_failures_total", "Failed MC server stops", ("host",))
 
 
 class MCServerStopError(Exception):
     pass
 
 
-async def stop_mc_server(ssh: pxssh.pxssh, config: Config) -> AsyncGenerator:
+async def stop_mc_server(ssh: SSHTransport, config: Config) -> AsyncGenerator:
     """
     Raises:
         MCServerStopError: If MC server could not be stopped.
@@ -25,23 +34,70 @@ async def stop_mc_server(ssh: pxssh.pxssh, config: Config) -> AsyncGenerator:
         async for _ in _try_stop_mc_server(ssh, config):
             yield
     except Exception as e:
+        MC_STOP_FAILURES.inc(host=config.HOST_SERVER_NAME)
         raise MCServerStopError(f"Could not stop MC server | {e}")
     finally:
         log.debug("Exiting screen session ...")
-        await detach_screen_session(ssh)
-        await kill_screen(ssh, config)
+        await leave_screen(ssh, config)
+
+
+async def stop_mc_server_with_rcon(config: Config) -> AsyncGenerator:
+    """
+    Sends `stop` over RCON and waits until the server closed the connection, which happens after the worlds were saved.
+    No SSH session is needed for this, the screen session ends together with the MC server.
+
+    Raises:
+        RconError: If the stop command could not be sent, the server is still running then.
+        MCServerStopError: If MC server could not be stopped.
+    """
+
+    server_shutdown_maximum_time = 600
+
+    # The pooled connection would only be closed by the server
+    rcon_pool.discard(config)
+    try:
+        connection = await connect_rcon(config)
+    except (OSError, TimeoutError) as e:
+        raise RconError(f"Could not connect to RCON | {e}") from e
+
+    try:
+        log.debug("Sending stop command over RCON ...")
+        stage_start_time = time.monotonic()
+        try:
+            await connection.command("stop")
+        except ConnectionError:
+            # The server may close the connection before it answers
+            pass
+        yield
+
+        await connection.wait_closed(server_shutdown_maximum_time)
+        log.debug("Stage 'All' completed")
+        MC_STOP_STAGE_SECONDS.observe(time.monotonic() - stage_start_time, stage="All", host=config.HOST_SERVER_NAME)
+    except Exception as e:
+        MC_STOP_FAILURES.inc(host=config.HOST_SERVER_NAME)
+        raise MCServerStopError(f"Could not stop MC server | {e}")
+    finally:
+        connection.close()
+
+    # Same number of progress steps as the stop over the screen session
+    for _ in range(4):
+        yield
 
 
-async def _try_stop_mc_server(ssh: pxssh.pxssh, config: Config) -> AsyncGenerator:
+async def _try_stop_mc_server(ssh: SSHTransport, config: Config) -> AsyncGenerator:
     server_shutdown_maximum_time = 600
 
     log.debug("Sending stop command ...")
-    ssh.sendline("stop")
+    await ssh.sendline("stop")
+    stage_start_time = time.monotonic()
 
     messages = ["overworld", "nether", "end", "All"]
     for i, message in enumerate(messages):
-        found_element_index = await asyncify(ssh.expect)(["All", message], timeout=server_shutdown_maximum_time)
+        found_element_index = await ssh.expect(["All", message], timeout=server_shutdown_maximum_time)
         log.debug(f"Stage '{message}' completed")
+        stage = messages[-1] if found_element_index == 0 else message
+        MC_STOP_STAGE_SECONDS.observe(time.monotonic() - stage_start_time, stage=stage, host=config.HOST_SERVER_NAME)
+        stage_start_time = time.monotonic()
 
         if found_element_index == 0:
             for _ in range(i, len(messages)):
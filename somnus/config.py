@@ -1,24 +1,70 @@
+import json
 import sys
 from os import environ
+from typing import Literal
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, ValidationError, field_validator
 
 
+DEFAULT_HOST_NAME = "default"
+
+LogLevel = Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+
+class HostServer(BaseModel):
+    name: str
+    host: str
+    user: str
+    ssh_port: int = 22
+    password: str
+    mac: str = ""
+    wol_broadcasts: list[str] = []
+    wol_interfaces: list[str] = []
+    mc_server_address: str
+    rcon_port: int | None = None
+    rcon_password: str = ""
+    wake_listener_port: int | None = None
+
+
 class Config(BaseModel):
     DISCORD_TOKEN: str
+    HOST_SERVER_NAME: str = DEFAULT_HOST_NAME
     HOST_SERVER_HOST: str
     HOST_SERVER_USER: str
     HOST_SERVER_SSH_PORT: int = 22
     HOST_SERVER_PASSWORD: str
     HOST_SERVER_MAC: str = ""
+    HOST_SERVER_WOL_BROADCASTS: list[str] = []
+    HOST_SERVER_WOL_INTERFACES: list[str] = []
+    SSH_BACKEND: Literal["asyncssh", "pexpect"] = "asyncssh"
     MC_SERVER_START_CMD: str
     MC_SERVER_ADDRESS: str
+    MC_SERVER_RCON_PORT: int | None = None
+    MC_SERVER_RCON_PASSWORD: str = ""
+    WAKE_LISTENER_PORT: int | None = None
+    WAKE_LISTENER_HOST: str = "0.0.0.0"  # noqa: S104
+    WAKE_LISTENER_PROXY: bool = False
+    HOST_SERVERS: list[HostServer] = []
+    MC_SERVER_QUERY_ENABLED: bool = False
     GET_PLAYERS_COMMAND_ENABLED: bool = True
     INACTIVITY_SHUTDOWN_MINUTES: int = 0
+    # Minutes after the MC server was stopped for inactivity until the host server is suspended, 0 to never suspend.
+    # While this and INACTIVITY_POWER_OFF_MINUTES are 0, the inactivity stop shuts the host server down right away.
+    INACTIVITY_SUSPEND_MINUTES: int = 0
+    # Minutes after the MC server was stopped for inactivity until the host server is powered off, 0 to never power
+    # it off. A suspended host server is woken for this.
+    INACTIVITY_POWER_OFF_MINUTES: int = 0
     DISCORD_STATUS_CHANNEL_ID: int | None = None
     LANGUAGE: str = "en"
     DISCORD_SUPER_USER_ID: str = ""
+    METRICS_PORT: int | None = None
+    METRICS_HOST: str = "127.0.0.1"
+    LOG_LEVEL: LogLevel = "DEBUG"
+    LOG_FILE_LEVEL: LogLevel = "DEBUG"
+    LOG_FILE_FORMAT: Literal["text", "json"] = "text"
+    LOG_FILE_MAX_MB: int = 10
+    LOG_FILE_BACKUPS: int = 14
     DEBUG: bool = False
 
     @field_validator("DEBUG", mode="before")
@@ -28,6 +74,69 @@ class Config(BaseModel):
 
         return text_is_true(value)
 
+    @field_validator("LOG_LEVEL", "LOG_FILE_LEVEL", mode="before")
+    def convert_to_upper_case(cls, value: str) -> str:  # noqa: N805
+        return value.upper()
+
+    @field_validator("HOST_SERVERS", "HOST_SERVER_WOL_BROADCASTS", "HOST_SERVER_WOL_INTERFACES", mode="before")
+    def parse_json(cls, value: str | list) -> list:  # noqa: N805
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_hosts(self) -> list[HostServer]:
+        """
+        The host server from the `HOST_SERVER_*` variables followed by the additional ones from `HOST_SERVERS`.
+        """
+
+        default_host = HostServer(
+            name=self.HOST_SERVER_NAME,
+            host=self.HOST_SERVER_HOST,
+            user=self.HOST_SERVER_USER,
+            ssh_port=self.HOST_SERVER_SSH_PORT,
+            password=self.HOST_SERVER_PASSWORD,
+            mac=self.HOST_SERVER_MAC,
+            wol_broadcasts=self.HOST_SERVER_WOL_BROADCASTS,
+            wol_interfaces=self.HOST_SERVER_WOL_INTERFACES,
+            mc_server_address=self.MC_SERVER_ADDRESS,
+            rcon_port=self.MC_SERVER_RCON_PORT,
+            rcon_password=self.MC_SERVER_RCON_PASSWORD,
+            wake_listener_port=self.WAKE_LISTENER_PORT,
+        )
+        return [default_host, *self.HOST_SERVERS]
+
+    def for_host(self, name: str) -> "Config":
+        """
+        Returns a copy of the config where the `HOST_SERVER_*`, `MC_SERVER_ADDRESS`, `MC_SERVER_RCON_*` and
+        `WAKE_LISTENER_PORT` values describe the given host, so it can be passed to all actions.
+
+        Raises:
+            KeyError: If no host with this name exists
+        """
+
+        for host in self.get_hosts():
+            if host.name == name:
+                return self.model_copy(
+                    update={
+                        "HOST_SERVER_NAME": host.name,
+                        "HOST_SERVER_HOST": host.host,
+                        "HOST_SERVER_USER": host.user,
+                        "HOST_SERVER_SSH_PORT": host.ssh_port,
+                        "HOST_SERVER_PASSWORD": host.password,
+                        "HOST_SERVER_MAC": host.mac,
+                        "HOST_SERVER_WOL_BROADCASTS": host.wol_broadcasts,
+                        "HOST_SERVER_WOL_INTERFACES": host.wol_interfaces,
+                        "MC_SERVER_ADDRESS": host.mc_server_address,
+                        "MC_SERVER_RCON_PORT": host.rcon_port,
+                        "MC_SERVER_RCON_PASSWORD": host.rcon_password,
+                        "WAKE_LISTENER_PORT": host.wake_listener_port,
+                    }
+                )
+        raise KeyError(f"Host server '{name}' not found")
+
+    def for_all_hosts(self) -> list["Config"]:
+        return [self.for_host(host.name) for host in self.get_hosts()]
+
 
 def text_is_true(text: str) -> bool:
     if text.lower() == "true":
@@ -41,13 +150,35 @@ def text_is_true(text: str) -> bool:
     raise ValueError(f"Invalid value: {text}")
 
 
-load_dotenv()
+def load_config() -> Config:
+    """
+    Validates the config from the environment and the `.env` file once, exits if it is invalid.
+    """
+
+    global _config  # noqa: PLW0603
+    if _config is not None:
+        return _config
+
+    load_dotenv()
+    try:
+        for key, value in {key: value for key, value in environ.items() if value.strip() != ""}.items():
+            environ[key] = value.strip()
+        _config = Config(**environ)  # type: ignore
+    except ValidationError as errors:
+        for error in errors.errors():
+            print(f"FATAL: Missing environment variable: {error['loc'][0]}")  # noqa: T201
+        sys.exit(1)
+    return _config
+
+
+class _LazyConfig:
+    """
+    Stands in for the config until it is used, so importing somnus does not read the environment.
+    """
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(load_config(), name)
+
 
-try:
-    for key, value in {key: value for key, value in environ.items() if value.strip() != ""}.items():
-        environ[key] = value.strip()
-    CONFIG = Config(**environ)  # type: ignore
-except ValidationError as errors:
-    for error in errors.errors():
-        print(f"FATAL: Missing environment variable: {error['loc'][0]}")  # noqa: T201
-    sys.exit(1)
+_config: Config | None = None
+CONFIG: Config = _LazyConfig()  # type: ignore
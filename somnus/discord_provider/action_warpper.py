@@ -1,23 +1,53 @@
-from typing import AsyncGenerator, Callable
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Callable
 
 import discord
 from pydantic import BaseModel, ConfigDict
 
+from somnus.actions.state_service import server_state_service
+from somnus.config import Config
 from somnus.discord_provider.bot import TOTAL_PROGRESS_BAR_STEPS, bot
-from somnus.discord_provider.busy_provider import busy_provider
+from somnus.discord_provider.operation_scheduler import (
+    JobOutcome,
+    OperationCanceledError,
+    QueueFullError,
+    operation_scheduler,
+)
+from somnus.discord_provider.progress_renderer import ProgressRenderer
 from somnus.discord_provider.utils import (
     edit_error_for_discord_subtitle,
     generate_progress_bar,
     ping_user_after_error,
 )
 from somnus.language_handler import LH
-from somnus.logger import log
-from somnus.logic import errors
+from somnus.logger import log, new_action_id
+from somnus.logic import errors, stage_history
+from somnus.metrics import DURATION_BUCKETS, metrics
+
+OPERATION_SECONDS = metrics.histogram(
+    "somnus_operation_seconds",
+    "Duration of the operations requested over Discord, without the time waiting in the queue",
+    ("operation", "outcome"),
+    DURATION_BUCKETS,
+)
+OPERATION_QUEUE_SECONDS = metrics.histogram(
+    "somnus_operation_queue_seconds", "Time operations waited in the queue", ("operation",), DURATION_BUCKETS
+)
+
+# The progress moves with the time between the steps, the renderer combines the updates anyway
+PROGRESS_TICK_SECONDS = 1.5
 
 
 class ActionWrapperProperties(BaseModel):
     func: Callable[..., AsyncGenerator[None, None]]
     ctx: discord.Interaction
+    config: Config
+    # Operations with the same key that are queued directly after each other are only run once
+    operation: str
+    # The stage timings are learned per world
+    world: str
     activity: str
     progress_message: str
     finish_message: str
@@ -28,50 +58,146 @@ class ActionWrapperProperties(BaseModel):
 async def action_wrapper(props: ActionWrapperProperties) -> None:
     """
     Wraps a long running, server specifc and potientially error prone task.
-    Provides busy check, error handling, progress bar and bot presence.
+    Provides queueing per host server, error handling, progress bar and bot presence.
     """
 
-    if busy_provider.is_busy():
-        await props.ctx.response.send_message(LH("other.busy"), ephemeral=True)
-        return
-
-    log.info(props.progress_message)
-    busy_provider.make_busy()
-
-    await bot.change_presence(status=discord.Status.idle, activity=discord.Game(name=props.activity))
-
-    i = 0
-    message_content = generate_progress_bar(i, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
-
+    message_content = generate_progress_bar(0, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
     if props.ctx.response.is_done():
         await props.ctx.edit_original_response(content=message_content)
     else:
         await props.ctx.response.send_message(content=message_content)
 
+    progress = ProgressRenderer(lambda content: props.ctx.edit_original_response(content=content))
+    ran_action = False
+    queued_at = time.monotonic()
+    # The key can contain a world name, which is not needed in the metrics
+    operation_kind = props.operation.split(":")[0]
+
+    async def run(previous_outcome: JobOutcome | None) -> None:
+        nonlocal ran_action
+        ran_action = True
+        OPERATION_QUEUE_SECONDS.observe(time.monotonic() - queued_at, operation=operation_kind)
+        with new_action_id() as action_id:
+            log.debug(f"Running '{props.operation}' as action {action_id}")
+            if previous_outcome and previous_outcome.error:
+                await _report_failed_previous_operation(props, previous_outcome)
+            start_time = time.monotonic()
+            outcome = "error"
+            try:
+                await _run_action(props, progress, operation_kind)
+                outcome = "success"
+            finally:
+                OPERATION_SECONDS.observe(time.monotonic() - start_time, operation=operation_kind, outcome=outcome)
+
+    async def show_queue_position(position: int) -> None:
+        progress.update(props.progress_message + "\n" + LH("other.queued", args={"position": position}))
+
     try:
-        async for _ in props.func():
-            i += 1
-            await props.ctx.edit_original_response(
-                content=generate_progress_bar(i, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
+        await operation_scheduler.run(props.config.HOST_SERVER_NAME, props.operation, run, show_queue_position)
+    except QueueFullError as e:
+        await progress.finish(LH("other.busy"))
+        raise RuntimeError("Too many queued operations") from e
+    except Exception as e:
+        await _finish_failed_progress(progress, props.progress_message, e, ran_action)
+        raise
+    else:
+        if not ran_action:
+            await progress.finish(
+                generate_progress_bar(TOTAL_PROGRESS_BAR_STEPS, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
             )
+
+
+async def _finish_failed_progress(progress: ProgressRenderer, message: str, error: Exception, ran_action: bool) -> None:
+    # Canceled with /reset_busy, the progress would stay where the operation was canceled otherwise
+    if isinstance(error, OperationCanceledError):
+        await progress.finish(message + "\n" + LH("other.operation_canceled"))
+    # Merged into an operation that failed, its requester already got the details
+    elif not ran_action:
+        await progress.finish(LH("commands.general_error", args={"e": edit_error_for_discord_subtitle(error)}))
+
+
+async def _report_failed_previous_operation(props: ActionWrapperProperties, previous_outcome: JobOutcome) -> None:
+    # The failed operation left the server in an unknown state, the action checks it again with a new probe
+    log.info(f"Previous operation '{previous_outcome.key}' failed, checking the state again for '{props.operation}'")
+    server_state_service.invalidate(props.config)
+    await props.ctx.channel.send(  # type: ignore
+        LH("other.previous_operation_failed", args={"operation": previous_outcome.key.split(":")[0]})
+    )
+
+
+async def _run_action(props: ActionWrapperProperties, progress: ProgressRenderer, operation_kind: str) -> None:
+    log.info(props.progress_message)
+
+    await bot.change_presence(status=discord.Status.idle, activity=discord.Game(name=props.activity))
+
+    timer = stage_history.StageTimer(await stage_history.get_expected_stage_seconds(props.world, operation_kind))
+    progress.update(_render_progress(timer, props.progress_message))
+
+    try:
+        async with _tick_progress(timer, progress, props.progress_message):
+            async for _ in props.func():
+                timer.next_stage()
+                progress.update(_render_progress(timer, props.progress_message))
     except errors.UserInputError as e:
-        await props.ctx.edit_original_response(content=str(e))
-        raise RuntimeError
+        await progress.finish(str(e))
+        raise RuntimeError(str(e)) from e
 
     except Exception as e:
         log.error("Failed to run action", exc_info=e)
-        await props.ctx.edit_original_response(
-            content=LH("commands.general_error", args={"e": edit_error_for_discord_subtitle(e)})
-        )
+        await progress.finish(LH("commands.general_error", args={"e": edit_error_for_discord_subtitle(e)}))
         await ping_user_after_error(props.ctx)
         raise RuntimeError("Failed to run action") from e
 
     else:
         log.info(props.finish_message)
-        await props.ctx.edit_original_response(
-            content=generate_progress_bar(TOTAL_PROGRESS_BAR_STEPS, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
+        await stage_history.record_run(props.world, operation_kind, timer.stage_seconds)
+        await progress.finish(
+            generate_progress_bar(TOTAL_PROGRESS_BAR_STEPS, TOTAL_PROGRESS_BAR_STEPS, props.progress_message)
         )
         await props.ctx.channel.send(props.finish_message)  # type: ignore
 
     finally:
-        busy_provider.make_available()
+        server_state_service.invalidate(props.config)
+
+
+@asynccontextmanager
+async def _tick_progress(
+    timer: stage_history.StageTimer, progress: ProgressRenderer, message: str
+) -> AsyncIterator[None]:
+    """
+    Updates the progress over time while the block runs, so the bar also moves during long stages.
+    """
+
+    async def tick() -> None:
+        while True:
+            await asyncio.sleep(PROGRESS_TICK_SECONDS)
+            progress.update(_render_progress(timer, message))
+
+    if timer.expected_stage_seconds is None:
+        yield
+        return
+
+    ticker = asyncio.create_task(tick())
+    try:
+        yield
+    finally:
+        ticker.cancel()
+
+
+def _render_progress(timer: stage_history.StageTimer, message: str) -> str:
+    """
+    Interpolates the progress over time with the stage durations of previous runs,
+    without them every step fills one field of the bar.
+    """
+
+    estimate = timer.get_progress()
+    if estimate is None:
+        value = min(len(timer.stage_seconds), TOTAL_PROGRESS_BAR_STEPS)
+        return generate_progress_bar(value, TOTAL_PROGRESS_BAR_STEPS, message)
+
+    fraction, remaining_seconds = estimate
+    # The bar is only full once the operation finished
+    value = min(int(fraction * TOTAL_PROGRESS_BAR_STEPS), TOTAL_PROGRESS_BAR_STEPS - 1)
+    minutes, seconds = divmod(round(remaining_seconds), 60)
+    eta = LH("other.eta", args={"time": f"{minutes}:{seconds:02d}"})
+    return generate_progress_bar(value, TOTAL_PROGRESS_BAR_STEPS, message) + "\n" + eta
@@ -0,0 +1,73 @@
+import datetime
+import time
+from typing import Literal
+
+from somnus.language_handler import LH
+from somnus.logic import player_activity
+from somnus.logic.player_activity import ActivitySample
+
+ActivityPeriod = Literal["day", "week", "month", "year"]
+
+# Time span, length of a line and the format of its time
+ACTIVITY_PERIODS: dict[str, tuple[int, int, str]] = {
+    "day": (24 * 3600, 3600, "%H:%M"),
+    "week": (7 * 24 * 3600, 6 * 3600, "%a %H:%M"),
+    "month": (30 * 24 * 3600, 24 * 3600, "%d.%m."),
+    "year": (365 * 24 * 3600, 14 * 24 * 3600, "%d.%m.%y"),
+}
+BAR_WIDTH = 20
+
+
+async def render_activity(host_name: str, period: ActivityPeriod, now: float | None = None) -> str:
+    """
+    One line per time slot with a bar of the average players online, followed by a summary.
+    """
+
+    span_seconds, line_seconds, time_format = ACTIVITY_PERIODS[period]
+    now = time.time() if now is None else now
+    # Aligned to the slots, so that the lines start at full hours or days (in UTC)
+    since = now - now % line_seconds - span_seconds + line_seconds
+    samples = await player_activity.get_activity(host_name, since, line_seconds, now)
+
+    title = LH("commands.activity.title", args={"host": host_name, "period": LH(f"commands.activity.periods.{period}")})
+    if not samples:
+        return title + "\n" + LH("commands.activity.no_data", args={"host": host_name})
+
+    highest = max(1, *(sample.peak_online for sample in samples))
+    lines = [title]
+    for sample in samples:
+        local_time = datetime.datetime.fromtimestamp(sample.time, datetime.UTC).astimezone()
+        lines.append(
+            LH(
+                "formatting.activity.line",
+                args={
+                    "time": local_time.strftime(time_format),
+                    "bar": _render_bar(sample, highest),
+                    "peak": sample.peak_online,
+                    "average": f"{sample.average_online:.1f}",
+                },
+            )
+        )
+    lines.append(_render_summary(samples))
+    return "\n".join(lines)
+
+
+def _render_bar(sample: ActivitySample, highest: int) -> str:
+    if sample.uptime == 0:
+        return "·" * BAR_WIDTH
+    length = round(sample.average_online / highest * BAR_WIDTH)
+    if length == 0 and sample.peak_online > 0:
+        length = 1
+    return "█" * length + " " * (BAR_WIDTH - length)
+
+
+def _render_summary(samples: list[ActivitySample]) -> str:
+    total_seconds = sum(sample.weight for sample in samples) or 1
+    return LH(
+        "commands.activity.summary",
+        args={
+            "uptime": round(sum(sample.uptime * sample.weight for sample in samples) / total_seconds * 100),
+            "average": f"{sum(sample.average_online * sample.weight for sample in samples) / total_seconds:.1f}",
+            "peak": max(sample.peak_online for sample in samples),
+        },
+    )
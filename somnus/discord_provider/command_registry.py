@@ -0,0 +1,42 @@
+from typing import Any, Callable, Coroutine, TypeVar
+
+from discord import app_commands
+
+from somnus.language_handler import LH
+
+_CommandFunc = TypeVar("_CommandFunc", bound=Callable[..., Coroutine[Any, Any, Any]])
+
+
+class CommandRegistry:
+    """
+    Collects the slash commands while their module is imported and adds them to the command tree in `register`,
+    after the locales for their descriptions were loaded. The description is `commands.<name>.description`.
+    """
+
+    def __init__(self) -> None:
+        self._commands: list[tuple[str, Callable]] = []
+        self._autocompletes: list[tuple[Callable, str, Callable]] = []
+
+    def command(self, name: str) -> Callable[[_CommandFunc], _CommandFunc]:
+        def decorator(func: _CommandFunc) -> _CommandFunc:
+            self._commands.append((name, func))
+            return func
+
+        return decorator
+
+    def autocomplete(self, command_func: Callable, parameter: str) -> Callable[[_CommandFunc], _CommandFunc]:
+        def decorator(func: _CommandFunc) -> _CommandFunc:
+            self._autocompletes.append((command_func, parameter, func))
+            return func
+
+        return decorator
+
+    def register(self, tree: app_commands.CommandTree) -> None:
+        commands = {}
+        for name, func in self._commands:
+            commands[func] = tree.command(name=name, description=LH(f"commands.{name}.description"))(func)
+        for command_func, parameter, func in self._autocompletes:
+            commands[command_func].autocomplete(parameter)(func)
+
+
+command_registry = CommandRegistry()
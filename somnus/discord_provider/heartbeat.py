@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from somnus.actions.player_roster import player_roster
+from somnus.actions.state_service import server_state_service
+from somnus.config import CONFIG, Config
+from somnus.discord_provider.inactivity_shutdown import idle_tracker, power_ladder
+from somnus.discord_provider.operation_scheduler import operation_scheduler
+from somnus.discord_provider.update_bot_presence import update_bot_presence
+from somnus.logger import log
+from somnus.logic import player_activity
+from somnus.metrics import metrics
+
+BUSY_PROBE_INTERVAL_SECONDS = 3
+HOST_ONLY_PROBE_INTERVAL_SECONDS = 10
+ONLINE_PROBE_INTERVAL_SECONDS = 30
+OFFLINE_PROBE_INTERVAL_SECONDS = 120
+PROBE_TIMEOUT_SECONDS = 15
+
+PRESENCE_INTERVAL_SECONDS = 10
+PRESENCE_TIMEOUT_SECONDS = 15
+
+# The presence only reads the state probed by the probe jobs
+_CACHED_STATE_MAX_AGE_SECONDS = OFFLINE_PROBE_INTERVAL_SECONDS + PROBE_TIMEOUT_SECONDS
+
+PERIODIC_JOB_SECONDS = metrics.histogram("somnus_periodic_job_seconds", "Duration of the periodic jobs", ("job",))
+PERIODIC_JOB_FAILURES = metrics.counter(
+    "somnus_periodic_job_failures_total", "Periodic jobs that failed or timed out", ("job", "reason")
+)
+
+
+class PeriodicJob:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[None]],
+        get_interval: Callable[[], float],
+        timeout_seconds: float,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.get_interval = get_interval
+        self.timeout_seconds = timeout_seconds
+        self.last_duration_seconds: float | None = None
+
+
+class PeriodicJobScheduler:
+    """
+    Runs every job in its own task with its own timeout and interval, so a hanging job never delays the others.
+    """
+
+    def __init__(self) -> None:
+        self._jobs: list[PeriodicJob] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[None]],
+        interval: float | Callable[[], float],
+        timeout_seconds: float,
+    ) -> None:
+        get_interval: Callable[[], float]
+        if isinstance(interval, (int, float)):
+            fixed_interval = interval
+            get_interval = lambda: fixed_interval  # noqa: E731
+        else:
+            get_interval = interval
+        self._jobs.append(PeriodicJob(name, func, get_interval, timeout_seconds))
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run_job(job), name=job.name) for job in self._jobs]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def run_once(self) -> None:
+        """
+        Runs every job once at the same time, like a single tick of the started jobs.
+        """
+
+        await asyncio.gather(*(self._run_job_once(job) for job in self._jobs))
+
+    async def _run_job(self, job: PeriodicJob) -> None:
+        while True:
+            await self._run_job_once(job)
+            await asyncio.sleep(max(0, job.get_interval() - (job.last_duration_seconds or 0)))
+
+    async def _run_job_once(self, job: PeriodicJob) -> None:
+        start_time = time.monotonic()
+        try:
+            async with asyncio.timeout(job.timeout_seconds):
+                await job.func()
+        except TimeoutError:
+            PERIODIC_JOB_FAILURES.inc(job=job.name, reason="timeout")
+            log.warning(f"Periodic job '{job.name}' timed out after {job.timeout_seconds} seconds")
+        except Exception as e:
+            PERIODIC_JOB_FAILURES.inc(job=job.name, reason="error")
+            log.error(f"Periodic job '{job.name}' failed", exc_info=e)
+        job.last_duration_seconds = time.monotonic() - start_time
+        PERIODIC_JOB_SECONDS.observe(job.last_duration_seconds, job=job.name)
+
+
+def get_probe_interval(config: Config) -> float:
+    """
+    Probes often while the server changes its state and rarely while the host server is off.
+    """
+
+    if operation_scheduler.is_busy(config.HOST_SERVER_NAME):
+        return BUSY_PROBE_INTERVAL_SECONDS
+
+    server_state = server_state_service.peek(config)
+    if server_state is None:
+        return BUSY_PROBE_INTERVAL_SECONDS
+    if server_state.mc_server_running:
+        return ONLINE_PROBE_INTERVAL_SECONDS
+    # Booting or stopping, or a host server that is kept running without the MC server
+    if server_state.host_server_running:
+        return HOST_ONLY_PROBE_INTERVAL_SECONDS
+    return OFFLINE_PROBE_INTERVAL_SECONDS
+
+
+def create_heartbeat() -> PeriodicJobScheduler:
+    heartbeat = PeriodicJobScheduler()
+
+    for config in CONFIG.for_all_hosts():
+        heartbeat.add(
+            f"probe {config.HOST_SERVER_NAME}",
+            _create_probe(config),
+            lambda config=config: get_probe_interval(config),
+            PROBE_TIMEOUT_SECONDS,
+        )
+
+    heartbeat.add(
+        "bot presence",
+        lambda: update_bot_presence(_CACHED_STATE_MAX_AGE_SECONDS),
+        PRESENCE_INTERVAL_SECONDS,
+        PRESENCE_TIMEOUT_SECONDS,
+    )
+    return heartbeat
+
+
+def _create_probe(config: Config) -> Callable[[], Awaitable[None]]:
+    async def probe() -> None:
+        server_state = await server_state_service.get_state(config, max_age_seconds=1)
+        await player_activity.record_server_state(config.HOST_SERVER_NAME, server_state)
+        player_roster.observe(config, server_state.mc_server_running)
+        # The shutdown itself is started by the timer of the idle tracker
+        if CONFIG.INACTIVITY_SHUTDOWN_MINUTES:
+            idle_tracker.observe(config, server_state)
+        power_ladder.observe(config, server_state)
+
+    return probe
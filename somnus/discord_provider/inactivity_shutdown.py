@@ -1,44 +1,299 @@
 import asyncio
+import time
+from typing import Awaitable, Callable, Literal
 
 import discord
 
-from somnus.actions import stats
-from somnus.config import CONFIG
+from somnus.actions.console_log import PlayerJoined, PlayerLeft
+from somnus.actions.player_roster import player_roster
+from somnus.actions.state_service import server_state_service
+from somnus.actions.stats import PlayerStats, ServerState
+from somnus.config import CONFIG, Config
 from somnus.discord_provider.bot import bot
-from somnus.discord_provider.busy_provider import busy_provider
+from somnus.discord_provider.operation_scheduler import JobOutcome, operation_scheduler
 from somnus.language_handler import LH
-from somnus.logger import log
+from somnus.logger import log, new_action_id
 from somnus.logic import stop, world_selector
 
+PowerStep = Literal["suspend", "power off"]
 
-class InactivityProvider:
-    def __init__(self) -> None:
-        self.inactivity_seconds = 0
 
+class IdleTracker:
+    """
+    Remembers per host server when a player was last seen and since when the server is empty, as monotonic times.
+    A timer runs `on_deadline` when the server was empty for the idle time, independent of how often
+    or how punctually the server is probed.
+    """
 
-inactivity_provider = InactivityProvider()
+    def __init__(self, on_deadline: Callable[[Config], Awaitable[None]], get_idle_seconds: Callable[[], float]) -> None:
+        self._on_deadline = on_deadline
+        self._get_idle_seconds = get_idle_seconds
+        self.last_player_seen: dict[str, float] = {}
+        self.empty_since: dict[str, float] = {}
+        self._timers: dict[str, asyncio.Task] = {}
+        self._running: dict[str, asyncio.Task] = {}
 
+    def observe(self, config: Config, server_state: ServerState, now: float | None = None) -> None:
+        """
+        Updates the idle time with a probed server state.
+        """
 
-async def check_and_shutdown_for_inactivity() -> None:
-    server_status = await stats.get_server_state(CONFIG)
+        host_name = config.HOST_SERVER_NAME
+        if not server_state.mc_server_running:
+            self._forget(host_name)
+            return
 
-    if not server_status.mc_server_running:
-        return
+        players = server_state.players
+        if not players:
+            log.warning(f"Could not get mcstatus of host '{host_name}' for inactivity shutdown check!")
+            return
+
+        if players.online > 0:
+            self.player_seen(host_name, now)
+        elif host_name not in self.empty_since:
+            self.server_empty(config, now)
+
+    def player_seen(self, host_name: str, now: float | None = None) -> None:
+        self.last_player_seen[host_name] = time.monotonic() if now is None else now
+        self.empty_since.pop(host_name, None)
+        self._cancel_timer(host_name)
+
+    def server_empty(self, config: Config, since: float | None = None) -> None:
+        self.empty_since[config.HOST_SERVER_NAME] = time.monotonic() if since is None else since
+        self._schedule(config)
+
+    def reset(self, config: Config) -> None:
+        """
+        Starts the idle time again, e.g. after a start or when the shutdown was canceled.
+        """
+
+        if config.HOST_SERVER_NAME in self.empty_since:
+            self.server_empty(config)
+
+    def get_deadline(self, host_name: str) -> float | None:
+        empty_since = self.empty_since.get(host_name)
+        return None if empty_since is None else empty_since + self._get_idle_seconds()
+
+    def _forget(self, host_name: str) -> None:
+        self.empty_since.pop(host_name, None)
+        self._cancel_timer(host_name)
+
+    def _cancel_timer(self, host_name: str) -> None:
+        timer = self._timers.pop(host_name, None)
+        if timer:
+            timer.cancel()
+
+    def _schedule(self, config: Config) -> None:
+        host_name = config.HOST_SERVER_NAME
+        self._cancel_timer(host_name)
+        # A running shutdown schedules the next deadline itself when it is done
+        if host_name not in self._running:
+            self._timers[host_name] = asyncio.create_task(self._wait_for_deadline(config))
+
+    async def _wait_for_deadline(self, config: Config) -> None:
+        host_name = config.HOST_SERVER_NAME
+        deadline = self.get_deadline(host_name)
+        if deadline is None:
+            return
+        await asyncio.sleep(max(0, deadline - time.monotonic()))
+
+        # The shutdown gets its own task, so rescheduling the timer does not cancel it
+        self._timers.pop(host_name, None)
+        self._running[host_name] = asyncio.create_task(self._run_on_deadline(config))
+
+    async def _run_on_deadline(self, config: Config) -> None:
+        host_name = config.HOST_SERVER_NAME
+        try:
+            await self._on_deadline(config)
+        except Exception as e:
+            log.error(f"Inactivity shutdown of host '{host_name}' failed", exc_info=e)
+        finally:
+            del self._running[host_name]
+            if host_name in self.empty_since:
+                # Still empty because the shutdown was skipped, the idle time starts again
+                deadline = self.get_deadline(host_name)
+                if deadline is not None and deadline <= time.monotonic():
+                    self.empty_since[host_name] = time.monotonic()
+                self._schedule(config)
+
+
+class PowerLadder:
+    """
+    Powers a host server down step by step after its MC server was stopped for inactivity. The host server is kept
+    running at first, so a start only has to start the MC server, then it is suspended and at last powered off.
+    Every step saves more power and makes the next start slower, from waking the host server to a cold boot.
+    """
+
+    def __init__(
+        self,
+        on_step: Callable[[Config, PowerStep, bool], Awaitable[bool]],
+        get_step_seconds: Callable[[], dict[PowerStep, float]],
+    ) -> None:
+        self._on_step = on_step
+        self._get_step_seconds = get_step_seconds
+        self.mc_stopped_since: dict[str, float] = {}
+        self.completed_steps: dict[str, int] = {}
+        self.suspended: set[str] = set()
+        self._timers: dict[str, asyncio.Task] = {}
+        self._running: set[str] = set()
+
+    def is_enabled(self) -> bool:
+        return bool(self._get_steps())
+
+    def mc_stopped(self, config: Config, now: float | None = None) -> None:
+        """
+        Starts the ladder after the MC server was stopped for inactivity and the host server was kept running.
+        """
+
+        if not self.is_enabled() or config.HOST_SERVER_HOST in ["localhost", "127.0.0.1"]:
+            return
+
+        host_name = config.HOST_SERVER_NAME
+        self.mc_stopped_since[host_name] = time.monotonic() if now is None else now
+        self.completed_steps[host_name] = 0
+        self.suspended.discard(host_name)
+        self._schedule(config)
+
+    def observe(self, config: Config, server_state: ServerState) -> None:
+        """
+        Leaves the ladder when somebody else started or stopped the server in the meantime.
+        """
+
+        host_name = config.HOST_SERVER_NAME
+        if host_name not in self.mc_stopped_since or host_name in self._running:
+            return
+
+        if server_state.mc_server_running or not (server_state.host_server_running or host_name in self.suspended):
+            self.forget(host_name)
+        elif server_state.host_server_running and host_name in self.suspended:
+            log.debug(f"Suspended host server '{host_name}' was woken, keeping it running again")
+            self.mc_stopped(config)
+
+    def forget(self, host_name: str) -> None:
+        self.mc_stopped_since.pop(host_name, None)
+        self.completed_steps.pop(host_name, None)
+        self.suspended.discard(host_name)
+        timer = self._timers.pop(host_name, None)
+        if timer:
+            timer.cancel()
+
+    def get_next_step(self, host_name: str) -> tuple[PowerStep, float] | None:
+        """
+        The next step and its monotonic deadline.
+        """
+
+        mc_stopped_since = self.mc_stopped_since.get(host_name)
+        if mc_stopped_since is None:
+            return None
+        steps = self._get_steps()[self.completed_steps[host_name] :]
+        return (steps[0][0], mc_stopped_since + steps[0][1]) if steps else None
 
-    mc_status = await stats.get_mcstatus(CONFIG)
-    if not mc_status:
-        log.warning("Could not get mcstatus for inactivity shutdown check!")
+    def _get_steps(self) -> list[tuple[PowerStep, float]]:
+        steps = sorted(
+            ((step, seconds) for step, seconds in self._get_step_seconds().items() if seconds > 0),
+            key=lambda step: step[1],
+        )
+        # Suspending after the host server was powered off is pointless
+        power_off_index = next((i for i, (step, _) in enumerate(steps) if step == "power off"), len(steps))
+        return steps[: power_off_index + 1]
+
+    def _schedule(self, config: Config) -> None:
+        host_name = config.HOST_SERVER_NAME
+        timer = self._timers.pop(host_name, None)
+        if timer:
+            timer.cancel()
+
+        next_step = self.get_next_step(host_name)
+        if next_step:
+            self._timers[host_name] = asyncio.create_task(self._wait_for_step(config, *next_step))
+
+    async def _wait_for_step(self, config: Config, step: PowerStep, deadline: float) -> None:
+        host_name = config.HOST_SERVER_NAME
+        await asyncio.sleep(max(0, deadline - time.monotonic()))
+
+        # From here on the step is not canceled anymore when the host server is forgotten
+        self._timers.pop(host_name, None)
+        self._running.add(host_name)
+        try:
+            done = await self._on_step(config, step, host_name in self.suspended)
+        except Exception as e:
+            log.error(f"Could not {step} host server '{host_name}' for inactivity", exc_info=e)
+            # Goes on with the next step, e.g. the power off when suspending is not supported
+            done = None
+        finally:
+            self._running.discard(host_name)
+
+        if host_name not in self.mc_stopped_since:
+            return
+        if done is False or (done and step == "power off"):
+            self.forget(host_name)
+            return
+        if done:
+            self.suspended.add(host_name)
+        self.completed_steps[host_name] += 1
+        self._schedule(config)
+
+
+async def _power_down_for_inactivity(config: Config, step: PowerStep, suspended: bool) -> bool:
+    """
+    Returns if the step was done, it is skipped when the server was started or stopped in the meantime.
+    """
+
+    done = False
+
+    async def power_down(previous_outcome: JobOutcome | None) -> None:
+        nonlocal done
+        server_state = await server_state_service.get_state(config, max_age_seconds=0)
+        if server_state.mc_server_running or not (server_state.host_server_running or suspended):
+            log.debug(f"Server was started or stopped in the meantime, skipping {step} for inactivity")
+            return
+
+        log.info(f"Host server is idle, {step} ...")
+        if step == "suspend":
+            await stop.suspend_host(config)
+        else:
+            await stop.power_off_host(config, suspended)
+        done = True
+
+    with new_action_id():
+        # Waits for running operations and checks the state again afterwards
+        await operation_scheduler.run(config.HOST_SERVER_NAME, step, power_down)
+    return done
+
+
+async def _stop_for_inactivity(config: Config) -> None:
+    if operation_scheduler.is_busy(config.HOST_SERVER_NAME):
+        log.debug("An operation is running on the host server, skipping shutdown!")
         return
 
-    if mc_status.players.online == 0 and not busy_provider.is_busy():
-        inactivity_provider.inactivity_seconds -= 10
-        if inactivity_provider.inactivity_seconds <= 0:
-            await _stop_inactivity()
+    with new_action_id():
+        await _stop_inactivity(config)
+
+
+idle_tracker = IdleTracker(_stop_for_inactivity, lambda: CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60)
+power_ladder = PowerLadder(
+    _power_down_for_inactivity,
+    lambda: {
+        "suspend": CONFIG.INACTIVITY_SUSPEND_MINUTES * 60,
+        "power off": CONFIG.INACTIVITY_POWER_OFF_MINUTES * 60,
+    },
+)
+
+
+def _track_roster(config: Config, event: PlayerJoined | PlayerLeft, players: PlayerStats) -> None:
+    # The last player leaving starts the idle time right away instead of with the next probe
+    if not CONFIG.INACTIVITY_SHUTDOWN_MINUTES:
+        return
+    if players.online:
+        idle_tracker.player_seen(config.HOST_SERVER_NAME)
     else:
-        inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+        idle_tracker.server_empty(config)
+
 
+player_roster.subscribe(_track_roster)
 
-async def _inactivity_shutdown_verification(channel: discord.TextChannel) -> bool:
+
+async def _inactivity_shutdown_verification(channel: discord.TextChannel, config: Config) -> bool:
     result_future = asyncio.Future()
 
     cancel_button = discord.ui.Button(label=LH("other.inactivity_shutdown.cancel"), style=discord.ButtonStyle.green)
@@ -46,7 +301,7 @@ async def _inactivity_shutdown_verification(channel: discord.TextChannel) -> boo
     async def cancel_callback(interaction: discord.Interaction) -> None:
         await interaction.response.defer()
         cancel_button.disabled = True
-        inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+        idle_tracker.reset(config)
         await message.edit(
             content=LH(
                 "other.inactivity_shutdown.canceled",
@@ -83,7 +338,7 @@ async def _inactivity_shutdown_verification(channel: discord.TextChannel) -> boo
         return result
 
 
-async def _stop_inactivity() -> None:
+async def _stop_inactivity(config: Config) -> None:
     if not CONFIG.DISCORD_STATUS_CHANNEL_ID:
         log.error(
             "DISCORD_STATUS_CHANNEL_ID in .env.test not correct. Automatic shutdown due to inactivity not possible!"
@@ -94,36 +349,52 @@ async def _stop_inactivity() -> None:
         raise TypeError("Could not get channel from Discord!")
 
     log.info("Send information message for shutdown due to inactivity ...")
-    player_confirmed_stop = await _inactivity_shutdown_verification(channel)
+    player_confirmed_stop = await _inactivity_shutdown_verification(channel, config)
     if not player_confirmed_stop:
-        inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+        idle_tracker.reset(config)
         return
     log.info("Stopping due to inactivity ...")
 
     # Just stop doing anything when the server should not be stopped, doesnt print any message to reduce clutter
-    mcstatus = await stats.get_mcstatus(CONFIG)
-    if mcstatus is None:
+    players = await server_state_service.get_players(config, max_age_seconds=0)
+    if players is None:
         log.debug("Could not get mcstatus for inactivity shutdown check, skipping shutdown!")
         return
-    if mcstatus.players.online != 0:
+    if players.online != 0:
         log.debug("Players came online during inactivity shutdown verification, skipping shutdown!")
+        idle_tracker.player_seen(config.HOST_SERVER_NAME)
+        return
+
+    if operation_scheduler.is_busy(config.HOST_SERVER_NAME):
+        log.debug("An operation is running on the host server, skipping shutdown!")
         return
 
-    world_config = await world_selector.get_world_selector_config()
-    activity = discord.Game(name=LH("status.text.stopping", args={"world_name": world_config.current_world}))
+    async def stop_host(previous_outcome: JobOutcome | None) -> None:
+        await _stop_host_for_inactivity(channel, config)
+
+    # Queued as a normal stop, so a stop requested at the same time is merged into it
+    await operation_scheduler.run(config.HOST_SERVER_NAME, "stop", stop_host)
+
+
+async def _stop_host_for_inactivity(channel: discord.TextChannel, config: Config) -> None:
+    world_name = await world_selector.get_world_name_for_host(config)
+    activity = discord.Game(name=LH("status.text.stopping", args={"world_name": world_name}))
     await bot.change_presence(status=discord.Status.idle, activity=activity)
 
     message = await channel.send(content=LH("other.inactivity_shutdown.stopping"))
 
-    busy_provider.make_busy()
+    # With the power ladder the host server is kept running and powered down later
+    keep_host_running = power_ladder.is_enabled()
     try:
-        async for _ in stop.stop_server(False, CONFIG):
+        async for _ in stop.stop_server(keep_host_running, config):
             pass
     except Exception as e:
         log.error("Failed to stop server during inactivity shutdown", exc_info=e)
-        inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+        idle_tracker.reset(config)
         await message.edit(content=LH("commands.stop.error.general", args={"e": e}))
     else:
+        if keep_host_running:
+            power_ladder.mc_stopped(config)
         await message.edit(content=LH("other.inactivity_shutdown.finished_msg"))
     finally:
-        busy_provider.make_available()
+        server_state_service.invalidate(config)
@@ -1,25 +1,35 @@
 import asyncio
+import functools
+import importlib.metadata
+import tomllib
 from typing import AsyncGenerator
 
-import aiofiles
 import discord
-import toml
 from discord import app_commands
-from discord.ext import tasks
-from mcstatus.status_response import JavaStatusResponse
 
-from somnus.actions import ssh, start_mc, stats, stop_mc
-from somnus.config import CONFIG
+from somnus.actions import ssh, start_mc
+from somnus.actions.state_service import COMMAND_MAX_AGE_SECONDS, server_state_service
+from somnus.actions.stats import PlayerStats
+from somnus.config import CONFIG, Config, load_config
+from somnus.discord_provider.activity_renderer import ActivityPeriod, render_activity
 from somnus.discord_provider.action_warpper import ActionWrapperProperties, action_wrapper
 from somnus.discord_provider.bot import bot
-from somnus.discord_provider.busy_provider import busy_provider
-from somnus.discord_provider.inactivity_shutdown import check_and_shutdown_for_inactivity, inactivity_provider
+from somnus.discord_provider.operation_scheduler import operation_scheduler
+from somnus.discord_provider.command_registry import command_registry
+from somnus.discord_provider.heartbeat import PeriodicJobScheduler, create_heartbeat
+from somnus.discord_provider.inactivity_shutdown import idle_tracker, power_ladder
 from somnus.discord_provider.update_bot_presence import update_bot_presence
+from somnus.discord_provider.wake_on_connect import start_wake_listeners
 from somnus.language_handler import LH
-from somnus.logger import log
-from somnus.logic import start, stop, world_selector
+from somnus.logger import log, setup_logging
+from somnus.logic import errors, start, stop, world_selector
+from somnus.logic.wake_listener import WakeListener
+from somnus.metrics import start_metrics_server
 
 tree = app_commands.CommandTree(bot)
+heartbeat: PeriodicJobScheduler | None = None
+metrics_server: asyncio.Server | None = None
+wake_listeners: list[WakeListener] | None = None
 
 
 @bot.event
@@ -37,31 +47,53 @@ async def on_ready() -> None:
     except Exception as e:
         log.error(f"Failed to sync commands: {e}")
 
-    if CONFIG.INACTIVITY_SHUTDOWN_MINUTES:
-        inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+    global heartbeat, metrics_server, wake_listeners  # noqa: PLW0603
+    if not heartbeat:
+        heartbeat = create_heartbeat()
+    heartbeat.start()
 
-    await hartbeat.start()
+    if CONFIG.METRICS_PORT and not metrics_server:
+        metrics_server = await start_metrics_server(CONFIG.METRICS_HOST, CONFIG.METRICS_PORT)
 
+    # on_ready runs again after every reconnect
+    if wake_listeners is None:
+        wake_listeners = await start_wake_listeners()
 
-@tree.command(name="ping", description=LH("commands.ping.description"))
+
+@command_registry.command("ping")
 async def ping_command(ctx: discord.Interaction) -> None:
-    version = ""
-    async with aiofiles.open("pyproject.toml", "r") as file:
-        toml_data = await file.read()
-        data = toml.loads(toml_data)
-        version = "v" + data["project"]["version"]
+    await ctx.response.send_message(LH("commands.ping.response", args={"version": _get_version()}))
+
+
+@functools.cache
+def _get_version() -> str:
+    try:
+        return "v" + importlib.metadata.version("somnus")
+    except importlib.metadata.PackageNotFoundError:
+        pass
 
-    await ctx.response.send_message(LH("commands.ping.response", args={"version": version}))
+    # Running from source without installing somnus
+    try:
+        with open("pyproject.toml", "rb") as file:
+            return "v" + tomllib.load(file)["project"]["version"]
+    except (OSError, tomllib.TOMLDecodeError, KeyError):
+        return "unknown version"
 
 
-@tree.command(name="start", description=LH("commands.start.description"))
-async def start_server_command(ctx: discord.Interaction) -> None:
-    world_config = await world_selector.get_world_selector_config()
+@command_registry.command("start")
+async def start_server_command(ctx: discord.Interaction, world: str | None = None) -> None:
+    world_and_config = await _get_world_and_host_config(ctx, world)
+    if not world_and_config:
+        return
+    selected_world, host_config = world_and_config
 
     action_props = ActionWrapperProperties(
-        func=lambda: start.start_server(CONFIG),
+        func=lambda: start.start_server(host_config, selected_world),
         ctx=ctx,
-        activity=LH("status.text.starting", args={"world_name": world_config.current_world}),
+        config=host_config,
+        operation=f"start:{selected_world.display_name}",
+        world=selected_world.display_name,
+        activity=LH("status.text.starting", args={"world_name": selected_world.display_name}),
         progress_message=LH("commands.start.msg_above_process_bar"),
         finish_message=LH("commands.start.finished_msg"),
     )
@@ -71,39 +103,57 @@ async def start_server_command(ctx: discord.Interaction) -> None:
     except Exception:
         pass
     else:
-        if CONFIG.INACTIVITY_SHUTDOWN_MINUTES:
-            inactivity_provider.inactivity_seconds = CONFIG.INACTIVITY_SHUTDOWN_MINUTES * 60
+        idle_tracker.reset(host_config)
+        power_ladder.forget(host_config.HOST_SERVER_NAME)
 
 
-@tree.command(name="stop", description=LH("commands.stop.description"))
-async def stop_server_command(ctx: discord.Interaction) -> None:
-    await _stop_server(ctx, prevent_host_shutdown=False)
+@command_registry.autocomplete(start_server_command, "world")
+async def _start_server_command_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice]:
+    return await _get_world_choices()
+
+
+@command_registry.command("stop")
+async def stop_server_command(ctx: discord.Interaction, world: str | None = None) -> None:
+    await _stop_server(ctx, prevent_host_shutdown=False, world_name=world)
 
 
-@tree.command(name="stop_without_shutdown", description=LH("commands.stop_without_shutdown.description"))
+@command_registry.autocomplete(stop_server_command, "world")
+async def _stop_server_command_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice]:
+    return await _get_world_choices()
+
+
+@command_registry.command("stop_without_shutdown")
 async def stop_without_shutdown_command(ctx: discord.Interaction) -> None:
     if not await _is_super_user(ctx):
         return
     await _stop_server(ctx, prevent_host_shutdown=True)
 
 
-async def _stop_server(ctx: discord.Interaction, prevent_host_shutdown: bool) -> None:
+async def _stop_server(ctx: discord.Interaction, prevent_host_shutdown: bool, world_name: str | None = None) -> None:
+    world_and_config = await _get_world_and_host_config(ctx, world_name)
+    if not world_and_config:
+        return
+    selected_world, host_config = world_and_config
+
     message = LH("commands.stop.msg_above_process_bar")
 
-    mc_status = await stats.get_mcstatus(CONFIG)
-    if (
-        mc_status
-        and mc_status.players.online
-        and not await _players_online_verification_for_stop(ctx, message, mc_status)
-    ):
+    players = await server_state_service.get_players(host_config, COMMAND_MAX_AGE_SECONDS)
+    if players and players.online and not await _players_online_verification_for_stop(ctx, message, players):
         return
 
-    world_config = await world_selector.get_world_selector_config()
+    current_world = await world_selector.get_current_world()
 
     props = ActionWrapperProperties(
-        func=lambda: stop.stop_server(prevent_host_shutdown, CONFIG),
+        func=lambda: stop.stop_server(prevent_host_shutdown, host_config),
         ctx=ctx,
-        activity=LH("status.text.stopping", args={"world_name": world_config.current_world}),
+        config=host_config,
+        operation="stop_without_shutdown" if prevent_host_shutdown else "stop",
+        world=selected_world.display_name,
+        activity=LH("status.text.stopping", args={"world_name": selected_world.display_name}),
         progress_message=message,
         finish_message=LH("commands.stop.finished_msg"),
     )
@@ -114,17 +164,20 @@ async def _stop_server(ctx: discord.Interaction, prevent_host_shutdown: bool) ->
         pass
     finally:
         # Its now safe to change the world if it was requested
-        await world_selector.change_world()
+        if world_selector.get_host_config(current_world).HOST_SERVER_NAME == host_config.HOST_SERVER_NAME:
+            await world_selector.change_world()
 
 
-@tree.command(name="add_world", description=LH("commands.add_world.description"))
-async def add_world_command(ctx: discord.Interaction, display_name: str, start_cmd: str, visible: bool) -> None:
+@command_registry.command("add_world")
+async def add_world_command(
+    ctx: discord.Interaction, display_name: str, start_cmd: str, visible: bool, host: str | None = None
+) -> None:
     # only allow super users
     if not await _is_super_user(ctx):
         return
 
     try:
-        await world_selector.create_new_world(display_name, start_cmd, visible)
+        await world_selector.create_new_world(display_name, start_cmd, visible, host)
         await ctx.response.send_message(
             LH("commands.add_world.success", args={"display_name": display_name}), ephemeral=True
         )
@@ -136,20 +189,26 @@ async def add_world_command(ctx: discord.Interaction, display_name: str, start_c
         )
 
 
-@tree.command(name="edit_world", description=LH("commands.edit_world.description"))
-async def edit_world_command(
+@command_registry.autocomplete(add_world_command, "host")
+async def _add_world_command_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice]:
+    return _get_host_choices()
+
+
+@command_registry.command("edit_world")
+async def edit_world_command(  # noqa: PLR0913
     ctx: discord.Interaction,
     editing_world_name: str,
     new_display_name: str | None = None,
     start_cmd: str | None = None,
     visible: bool | None = None,
+    host: str | None = None,
 ) -> None:
     # only super users
     if not await _is_super_user(ctx):
         return
 
     try:
-        world = await world_selector.edit_new_world(editing_world_name, new_display_name, start_cmd, visible)
+        world = await world_selector.edit_new_world(editing_world_name, new_display_name, start_cmd, visible, host)
         await ctx.response.send_message(
             LH(
                 "commands.edit_world.success",
@@ -167,12 +226,19 @@ async def edit_world_command(
         log.warning(f"Couldn't edit world '{editing_world_name}' | {e}", exc_info=e)
 
 
-@edit_world_command.autocomplete("editing_world_name")
+@command_registry.autocomplete(edit_world_command, "editing_world_name")
 async def _edit_world_command_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice]:
     return await _get_world_choices()
 
 
-@tree.command(name="delete_world", description=LH("commands.delete_world.description"))
+@command_registry.autocomplete(edit_world_command, "host")
+async def _edit_world_command_host_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice]:
+    return _get_host_choices()
+
+
+@command_registry.command("delete_world")
 async def delete_world_command(ctx: discord.Interaction, display_name: str) -> None:
     if not await _is_super_user(ctx):
         return
@@ -232,7 +298,7 @@ async def delete_world_command(ctx: discord.Interaction, display_name: str) -> N
     )
 
 
-@delete_world_command.autocomplete("display_name")
+@command_registry.autocomplete(delete_world_command, "display_name")
 async def _delete_world_command_autocomplete(
     interaction: discord.Interaction, current: str
 ) -> list[app_commands.Choice]:
@@ -244,7 +310,30 @@ async def _get_world_choices() -> list[app_commands.Choice]:
     return [app_commands.Choice(name=world.display_name, value=world.display_name) for world in data.worlds]
 
 
-@tree.command(name="change_world", description=LH("commands.change_world.description"))
+def _get_host_choices() -> list[app_commands.Choice]:
+    return [app_commands.Choice(name=host.name, value=host.name) for host in CONFIG.get_hosts()]
+
+
+async def _get_world_and_host_config(
+    ctx: discord.Interaction, world_name: str | None
+) -> tuple[world_selector.WorldSelectorWorld, Config] | None:
+    """
+    Looks up the world, by default the current one, and the config of its host server.
+    Sends an error message and returns None if one of them doesn't exist.
+    """
+
+    world_selector_config = await world_selector.get_world_selector_config()
+    try:
+        world = await world_selector.get_world_by_name(
+            world_name or world_selector_config.current_world, world_selector_config
+        )
+        return world, world_selector.get_host_config(world)
+    except world_selector.UserInputError as e:
+        await ctx.response.send_message(str(e), ephemeral=True)
+        return None
+
+
+@command_registry.command("change_world")
 async def change_world_command(ctx: discord.Interaction) -> None:
     world_selector_config = await world_selector.get_world_selector_config()
     options = []
@@ -271,7 +360,9 @@ async def change_world_command(ctx: discord.Interaction) -> None:
         )
         await interaction.response.defer()
 
-        if not (await stats.get_server_state(CONFIG)).mc_server_running:
+        current_world = await world_selector.get_current_world()
+        host_config = world_selector.get_host_config(current_world)
+        if not (await server_state_service.get_state(host_config)).mc_server_running:
             await world_selector.change_world()
             await update_bot_presence()
 
@@ -288,7 +379,7 @@ async def change_world_command(ctx: discord.Interaction) -> None:
     )
 
 
-@tree.command(name="show_worlds", description=LH("commands.show_worlds.description"))
+@command_registry.command("show_worlds")
 async def show_worlds_command(ctx: discord.Interaction) -> None:
     sudo = await _is_super_user(ctx, False)
     world_selector_config = await world_selector.get_world_selector_config()
@@ -316,7 +407,7 @@ async def show_worlds_command(ctx: discord.Interaction) -> None:
     await ctx.response.send_message(string + LH("formatting.show_worlds.end"), ephemeral=sudo)
 
 
-@tree.command(name="help", description=LH("commands.help.description"))
+@command_registry.command("help")
 async def help_command(ctx: discord.Interaction) -> None:
     sudo = await _is_super_user(ctx, False)
     user_commands = [
@@ -352,7 +443,7 @@ async def help_command(ctx: discord.Interaction) -> None:
             value="",
             inline=False,
         )
-        admin_commands = ["add_world", "edit_world", "delete_world", "stop_without_shutdown"]
+        admin_commands = ["add_world", "edit_world", "delete_world", "stop_without_shutdown", "activity"]
         for admin_command in admin_commands:
             description = LH(f"commands.{admin_command}.description").replace(
                 LH("formatting.help.admin_prefix_to_remove"), ""
@@ -365,9 +456,9 @@ async def help_command(ctx: discord.Interaction) -> None:
     await ctx.response.send_message(embed=embed, ephemeral=True)
 
 
-@tree.command(name="reset_busy", description=LH("commands.reset_busy.description"))
+@command_registry.command("reset_busy")
 async def reset_busy_command(ctx: discord.Interaction) -> bool | None:
-    if not busy_provider.is_busy():
+    if not operation_scheduler.get_busy_targets():
         await ctx.response.send_message(LH("commands.reset_busy.error.general"), ephemeral=True)
         return False
 
@@ -381,7 +472,8 @@ async def reset_busy_command(ctx: discord.Interaction) -> bool | None:
                 ephemeral=True,
             )
             return
-        busy_provider.make_available()
+        for host_name in operation_scheduler.get_busy_targets():
+            operation_scheduler.cancel_running(host_name)
         confirm_button.disabled = True
         cancel_button.disabled = True
         await interaction.response.edit_message(content=LH("commands.reset_busy.success"), view=view)
@@ -407,31 +499,30 @@ async def reset_busy_command(ctx: discord.Interaction) -> bool | None:
     await ctx.response.send_message(LH("commands.reset_busy.verification"), view=view)
 
 
-@tree.command(name="get_players", description=LH("commands.get_players.description"))
+@command_registry.command("get_players")
 async def get_players_command(ctx: discord.Interaction) -> None:
     if CONFIG.GET_PLAYERS_COMMAND_ENABLED:
-        mc_status = await stats.get_mcstatus(CONFIG)
-        if mc_status:
-            if mc_status.players.online == 0:
+        host_config = world_selector.get_host_config(await world_selector.get_current_world())
+        players = await server_state_service.get_players(host_config, COMMAND_MAX_AGE_SECONDS)
+        if players:
+            if players.online == 0:
                 content = LH("commands.get_players.error.no_one_online")
-            elif mc_status.players.sample:
-                if mc_status.players.online == 1:
+            elif players.names:
+                if players.online == 1:
                     player_name = LH(
                         "formatting.get_players.player_name_line",
-                        args={"player_name": mc_status.players.sample[0].name},
+                        args={"player_name": players.names[0]},
                     )
                     content = LH("commands.get_players.response_singular", args={"player_name": player_name})
                 else:
                     player_names = ""
-                    for player in mc_status.players.sample:
-                        player_names += "\n" + LH(
-                            "formatting.get_players.player_name_line", args={"player_name": player.name}
-                        )
+                    for name in players.names:
+                        player_names += "\n" + LH("formatting.get_players.player_name_line", args={"player_name": name})
 
                     content = LH(
                         "commands.get_players.response_plural",
                         args={
-                            "player_count": mc_status.players.online,
+                            "player_count": players.online,
                             "player_names": player_names,
                         },
                     )
@@ -446,25 +537,47 @@ async def get_players_command(ctx: discord.Interaction) -> None:
     await ctx.response.send_message(content)
 
 
-@tree.command(name="restart", description=LH("commands.restart.description"))
+@command_registry.command("activity")
+async def activity_command(ctx: discord.Interaction, period: ActivityPeriod = "day", host: str | None = None) -> None:
+    if not await _is_super_user(ctx):
+        return
+
+    if host is None:
+        host = world_selector.get_host_config(await world_selector.get_current_world()).HOST_SERVER_NAME
+    await ctx.response.send_message(await render_activity(host, period), ephemeral=True)
+
+
+@command_registry.autocomplete(activity_command, "host")
+async def _activity_command_host_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice]:
+    return _get_host_choices()
+
+
+@command_registry.command("restart")
 async def restart_command(ctx: discord.Interaction) -> None:
-    if not (await stats.get_server_state(CONFIG)).mc_server_running:
+    world_and_config = await _get_world_and_host_config(ctx, None)
+    if not world_and_config:
+        return
+    current_world, host_config = world_and_config
+
+    server_state = await server_state_service.get_state(host_config, COMMAND_MAX_AGE_SECONDS)
+    if not server_state.mc_server_running:
         await ctx.response.send_message(content=LH("commands.restart.error"))
         return
 
     message = LH("commands.restart.above_process_bar.msg")
 
-    mc_status = await stats.get_mcstatus(CONFIG)
-    if (
-        mc_status
-        and mc_status.players.online
-        and not await _players_online_verification_for_stop(ctx, message, mc_status)
-    ):
+    players = server_state.players
+    if players and players.online and not await _players_online_verification_for_stop(ctx, message, players):
         return
 
     props = ActionWrapperProperties(
-        func=_restart,
+        func=lambda: _restart(host_config),
         ctx=ctx,
+        config=host_config,
+        operation="restart",
+        world=current_world.display_name,
         activity=LH("status.text.restarting"),
         progress_message=message,
         finish_message=LH("commands.restart.finished_msg"),
@@ -476,21 +589,25 @@ async def restart_command(ctx: discord.Interaction) -> None:
         pass
 
 
-# TODO(2mal3): prevent duble login
-async def _restart() -> AsyncGenerator:
-    ssh_client = await ssh.ssh_login(CONFIG)
-    async for _ in stop_mc.stop_mc_server(ssh_client, CONFIG):
+async def _restart(config: Config) -> AsyncGenerator:
+    # The newly selected world is started after the restart, which is only possible on the same host server
+    world_selector_config = await world_selector.get_world_selector_config()
+    new_world = await world_selector.get_world_by_name(
+        world_selector_config.new_selected_world or world_selector_config.current_world, world_selector_config
+    )
+    if world_selector.get_host_config(new_world).HOST_SERVER_NAME != config.HOST_SERVER_NAME:
+        raise errors.UserInputError(LH("commands.restart.world_on_other_host", args={"world": new_world.display_name}))
+
+    async for _ in stop.stop_mc(config):
         yield
         yield
     await world_selector.change_world()
-    async for _ in start_mc.start_mc_server(CONFIG):
-        yield
-    ssh_client.close()
+    async with ssh.ssh_pool.lease(config) as ssh_client:
+        async for _ in start_mc.start_mc_server(ssh_client, config, new_world.start_cmd):
+            yield
 
 
-async def _players_online_verification_for_stop(
-    ctx: discord.Interaction, message: str, mcstatus: JavaStatusResponse
-) -> None:
+async def _players_online_verification_for_stop(ctx: discord.Interaction, message: str, players: PlayerStats) -> None:
     result_future = asyncio.Future()
 
     confirm_button = discord.ui.Button(
@@ -533,12 +650,10 @@ async def _players_online_verification_for_stop(
     view.add_item(confirm_button)
     view.add_item(cancel_button)
 
-    if mcstatus.players.online == 1:
+    if players.online == 1:
         player_name = ""
-        if mcstatus.players.sample:
-            player_name = LH(
-                "formatting.get_players.player_name_line", args={"player_name": mcstatus.players.sample[0].name}
-            )
+        if players.names:
+            player_name = LH("formatting.get_players.player_name_line", args={"player_name": players.names[0]})
         content = (
             message
             + "\n\n"
@@ -546,16 +661,15 @@ async def _players_online_verification_for_stop(
         )
     else:
         player_names = ""
-        if mcstatus.players.sample:
-            for player in mcstatus.players.sample:
-                player_names += "\n" + LH("formatting.get_players.player_name_line", args={"player_name": player.name})
+        for name in players.names:
+            player_names += "\n" + LH("formatting.get_players.player_name_line", args={"player_name": name})
 
         content = (
             message
             + "\n\n"
             + LH(
                 "commands.stop.error.players_online.question_plural",
-                args={"player_count": mcstatus.players.online, "player_names": player_names},
+                args={"player_count": players.online, "player_names": player_names},
             )
         )
     await ctx.response.send_message(content=content, view=view)
@@ -567,7 +681,7 @@ async def _players_online_verification_for_stop(
 async def _get_formatted_world_info_string(world: world_selector.WorldSelectorWorld) -> str:
     string = LH("formatting.sudo_world_info.start")
 
-    attributes = ["display_name", "start_cmd", "start_cmd_sudo", "visible"]
+    attributes = ["display_name", "start_cmd", "visible", "host"]
     for attr in attributes:
         string += LH(
             "formatting.sudo_world_info.line",
@@ -587,19 +701,14 @@ async def _is_super_user(ctx: discord.Interaction, message: bool = True) -> bool
     return False
 
 
-@tasks.loop(seconds=10)
-async def hartbeat() -> None:
-    try:
-        await update_bot_presence()
-        if CONFIG.INACTIVITY_SHUTDOWN_MINUTES:
-            await check_and_shutdown_for_inactivity()
-    except Exception as e:
-        log.error("Failed to update bot presence and inactivity", exc_info=e)
-
-
 def main() -> None:
+    config = load_config()
+    setup_logging(config)
+    LH.load(config.LANGUAGE)
+    command_registry.register(tree)
+
     log.info("Starting bot ...")
-    bot.run(CONFIG.DISCORD_TOKEN, log_handler=None)
+    bot.run(config.DISCORD_TOKEN, log_handler=None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine
+
+from pydantic import BaseModel, ConfigDict
+
+from somnus.logger import log
+from somnus.metrics import metrics
+
+MAX_QUEUE_SIZE = 5
+
+QUEUED_OPERATIONS = metrics.gauge("somnus_queued_operations", "Running and waiting operations per target", ("target",))
+MERGED_OPERATIONS = metrics.counter(
+    "somnus_merged_operations_total", "Operations merged into an identical queued one", ("target",)
+)
+REJECTED_OPERATIONS = metrics.counter(
+    "somnus_rejected_operations_total", "Operations rejected because the queue was full", ("target",)
+)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class OperationCanceledError(Exception):
+    pass
+
+
+class JobOutcome(BaseModel):
+    key: str
+    error: Exception | None = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+JobFunc = Callable[[JobOutcome | None], Coroutine[Any, Any, None]]
+
+
+class _Job:
+    def __init__(self, key: str, func: JobFunc) -> None:
+        self.key = key
+        self.func = func
+        self.task: asyncio.Task | None = None
+        self.outcome: JobOutcome | None = None
+        self.done = asyncio.Event()
+
+
+class OperationScheduler:
+    """
+    Runs the operations on a target (e.g. a host server) one after another in FIFO order.
+    An operation with the same key as the last queued one is merged into it instead of queued again,
+    and every operation gets the outcome of the previous one on its target.
+    """
+
+    def __init__(self, max_queue_size: int = MAX_QUEUE_SIZE) -> None:
+        self._max_queue_size = max_queue_size
+        self._queues: dict[str, list[_Job]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self._last_outcomes: dict[str, JobOutcome] = {}
+        self._queue_changed: dict[str, asyncio.Event] = {}
+
+    async def run(
+        self,
+        target: str,
+        key: str,
+        func: JobFunc,
+        on_position: Callable[[int], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Queues `func` and waits until it or the operation it was merged into ran.
+        `on_position` is called with the number of operations that run before, whenever it changes.
+
+        Raises:
+            QueueFullError: If too many operations are queued for the target
+            OperationCanceledError: If the operation was canceled
+            Exception: The error of the operation
+        """
+
+        queue = self._queues.setdefault(target, [])
+        if queue and queue[-1].key == key:
+            job = queue[-1]
+            MERGED_OPERATIONS.inc(target=target)
+            log.debug(f"Operation '{key}' on '{target}' merged into the queued one")
+        elif len(queue) >= self._max_queue_size:
+            REJECTED_OPERATIONS.inc(target=target)
+            raise QueueFullError(f"Too many operations queued for '{target}'")
+        else:
+            job = _Job(key, func)
+            queue.append(job)
+            QUEUED_OPERATIONS.set(len(queue), target=target)
+            if target not in self._workers:
+                self._workers[target] = asyncio.create_task(self._work(target))
+
+        position = None
+        while not job.done.is_set():
+            queue_changed = self._queue_changed.setdefault(target, asyncio.Event())
+            new_position = self._get_position(target, job)
+            if on_position and new_position and new_position != position:
+                await on_position(new_position)
+            position = new_position
+
+            done_task = asyncio.create_task(job.done.wait())
+            changed_task = asyncio.create_task(queue_changed.wait())
+            await asyncio.wait([done_task, changed_task], return_when=asyncio.FIRST_COMPLETED)
+            done_task.cancel()
+            changed_task.cancel()
+
+        if job.outcome and job.outcome.error:
+            raise job.outcome.error
+
+    def is_busy(self, target: str) -> bool:
+        return bool(self._queues.get(target))
+
+    def get_running_key(self, target: str) -> str | None:
+        """
+        The key of the operation that runs or is about to run on the target, None if nothing is queued.
+        """
+
+        queue = self._queues.get(target)
+        return queue[0].key if queue else None
+
+    def get_busy_targets(self) -> list[str]:
+        return [target for target, queue in self._queues.items() if queue]
+
+    def get_last_outcome(self, target: str) -> JobOutcome | None:
+        return self._last_outcomes.get(target)
+
+    def cancel_running(self, target: str) -> bool:
+        """
+        Cancels the running operation of the target, e.g. when it is stuck. Queued operations run afterwards.
+        """
+
+        queue = self._queues.get(target)
+        if not queue or not queue[0].task:
+            return False
+        return queue[0].task.cancel()
+
+    async def _work(self, target: str) -> None:
+        queue = self._queues[target]
+        try:
+            while queue:
+                job = queue[0]
+                self._notify(target)
+
+                job.task = asyncio.create_task(job.func(self._last_outcomes.get(target)))
+                try:
+                    await job.task
+                    error = None
+                except asyncio.CancelledError:
+                    # Only the operation was canceled, not the worker
+                    if not job.task.cancelled():
+                        raise
+                    error = OperationCanceledError(f"Operation '{job.key}' was canceled")
+                except Exception as e:
+                    error = e
+
+                job.outcome = self._last_outcomes[target] = JobOutcome(key=job.key, error=error)
+                queue.pop(0)
+                QUEUED_OPERATIONS.set(len(queue), target=target)
+                job.done.set()
+                self._notify(target)
+        finally:
+            del self._workers[target]
+
+    def _get_position(self, target: str, job: _Job) -> int:
+        queue = self._queues.get(target, [])
+        return queue.index(job) if job in queue else 0
+
+    def _notify(self, target: str) -> None:
+        queue_changed = self._queue_changed.pop(target, None)
+        if queue_changed:
+            queue_changed.set()
+
+
+operation_scheduler = OperationScheduler()
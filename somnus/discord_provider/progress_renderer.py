@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+import discord
+
+from somnus.logger import log
+
+DEFAULT_MIN_INTERVAL_SECONDS = 1.5
+
+
+class ProgressRenderer:
+    """
+    Edits a progress message at most once per `min_interval_seconds`. Updates in between are coalesced,
+    only the latest content is sent, so the number of edits does not grow with the number of updates.
+    Create it right after the message was sent.
+    """
+
+    def __init__(
+        self,
+        edit: Callable[[str], Awaitable[object]],
+        min_interval_seconds: float = DEFAULT_MIN_INTERVAL_SECONDS,
+    ) -> None:
+        self._edit = edit
+        self._min_interval_seconds = min_interval_seconds
+        self._latest_content: str | None = None
+        self._sent_content: str | None = None
+        self._last_edit_time = time.monotonic()
+        self._flush_task: asyncio.Task | None = None
+
+    def update(self, content: str) -> None:
+        self._latest_content = content
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def finish(self, content: str) -> None:
+        """
+        Sends `content` as the last edit, after all pending updates.
+        """
+
+        self._latest_content = content
+        if self._flush_task:
+            await self._flush_task
+        await self._flush()
+
+    async def _flush(self) -> None:
+        while self._latest_content != self._sent_content:
+            await asyncio.sleep(max(0, self._last_edit_time + self._min_interval_seconds - time.monotonic()))
+
+            content = self._latest_content
+            self._last_edit_time = time.monotonic()
+            try:
+                await self._edit(content)  # type: ignore
+            except discord.HTTPException as e:
+                log.warning(f"Could not update progress message: {e}")
+            self._sent_content = content
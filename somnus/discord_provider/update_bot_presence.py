@@ -1,24 +1,26 @@
 import discord
 
 from somnus.actions import stats
-from somnus.config import CONFIG
+from somnus.actions.state_service import DEFAULT_MAX_AGE_SECONDS, server_state_service
 from somnus.discord_provider.bot import bot
-from somnus.discord_provider.busy_provider import busy_provider
+from somnus.discord_provider.operation_scheduler import operation_scheduler
 from somnus.language_handler import LH
 from somnus.logic import world_selector
 
 
-async def update_bot_presence() -> None:
-    world_selector_config = await world_selector.get_world_selector_config()
-    server_status = await stats.get_server_state(CONFIG)
-
-    if busy_provider.is_busy():
+async def update_bot_presence(max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS) -> None:
+    # The running action shows its own presence
+    if operation_scheduler.get_busy_targets():
         return
 
+    world_selector_config = await world_selector.get_world_selector_config()
+    current_world = await world_selector.get_current_world()
+    server_status = await server_state_service.get_state(world_selector.get_host_config(current_world), max_age_seconds)
+
     if server_status.mc_server_running:
         # Online
-        mc_status = await stats.get_mcstatus(CONFIG)
-        if not mc_status:
+        players = server_status.players
+        if not players:
             text = LH(
                 "status.text.online",
                 args={"world_name": world_selector_config.current_world, "players_online": "X", "max_players": "Y"},
@@ -28,8 +30,8 @@ async def update_bot_presence() -> None:
                 "status.text.online",
                 args={
                     "world_name": world_selector_config.current_world,
-                    "players_online": mc_status.players.online,
-                    "max_players": mc_status.players.max,
+                    "players_online": players.online,
+                    "max_players": players.max,
                 },
             )
         activity = discord.Game(name=text)
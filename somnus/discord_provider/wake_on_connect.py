@@ -0,0 +1,99 @@
+import discord
+
+from somnus.actions.state_service import server_state_service
+from somnus.config import CONFIG, Config
+from somnus.discord_provider.bot import bot
+from somnus.discord_provider.inactivity_shutdown import idle_tracker, power_ladder
+from somnus.discord_provider.operation_scheduler import JobOutcome, operation_scheduler
+from somnus.language_handler import LH
+from somnus.logger import log, new_action_id
+from somnus.logic import errors, start, world_selector
+from somnus.logic.wake_listener import WakeListener, WakeState
+
+
+# Operations after which the MC server runs, a login while they run only has to wait
+STARTING_OPERATIONS = ("start", "restart")
+
+
+def get_wake_state(config: Config) -> WakeState:
+    # Only reads the state probed by the heartbeat, so a status ping never probes the host server
+    running_key = operation_scheduler.get_running_key(config.HOST_SERVER_NAME)
+    if running_key is not None:
+        # A login during a stop queues a start after it
+        return "starting" if running_key.split(":")[0] in STARTING_OPERATIONS else "sleeping"
+    server_state = server_state_service.peek(config)
+    # Not probed again yet after a start or stop, a needless start is rejected as already running
+    if server_state is None or not server_state.mc_server_running:
+        return "sleeping"
+    return "running"
+
+
+async def start_for_login(config: Config, player_name: str) -> None:
+    """
+    Starts the current world on the host server of `config`, queued like a `/start` with the same world.
+    """
+
+    world = await world_selector.get_current_world()
+    if (world.host or CONFIG.HOST_SERVER_NAME) != config.HOST_SERVER_NAME:
+        log.warning(
+            f"Current world '{world.display_name}' is not on host server '{config.HOST_SERVER_NAME}', "
+            f"not starting it for '{player_name}'"
+        )
+        return
+
+    message = await _send_status_message(
+        LH("other.wake_listener.starting", args={"player": player_name, "world_name": world.display_name})
+    )
+
+    async def start_server(previous_outcome: JobOutcome | None) -> None:
+        async for _ in start.start_server(config, world):
+            pass
+
+    with new_action_id():
+        try:
+            await operation_scheduler.run(config.HOST_SERVER_NAME, f"start:{world.display_name}", start_server)
+        except errors.UserInputError as e:
+            log.info(f"Server not started for '{player_name}' | {e}")
+            content = str(e)
+        except Exception as e:
+            log.error(f"Could not start server for '{player_name}'", exc_info=e)
+            content = LH("commands.start.error.general", args={"e": e})
+        else:
+            idle_tracker.reset(config)
+            power_ladder.forget(config.HOST_SERVER_NAME)
+            content = LH(
+                "other.wake_listener.finished_msg", args={"player": player_name, "world_name": world.display_name}
+            )
+
+    if message:
+        await message.edit(content=content)
+
+
+async def start_wake_listeners() -> list[WakeListener]:
+    """
+    Starts a wake listener for every host server with a `WAKE_LISTENER_PORT`.
+    """
+
+    listeners = []
+    for config in CONFIG.for_all_hosts():
+        if config.WAKE_LISTENER_PORT is None:
+            continue
+
+        listener = WakeListener(config, get_wake_state, start_for_login, CONFIG.WAKE_LISTENER_PROXY)
+        try:
+            await listener.start(CONFIG.WAKE_LISTENER_HOST, config.WAKE_LISTENER_PORT)
+        except OSError as e:
+            log.error(f"Could not start the wake listener of host server '{config.HOST_SERVER_NAME}'", exc_info=e)
+            continue
+        listeners.append(listener)
+    return listeners
+
+
+async def _send_status_message(content: str) -> discord.Message | None:
+    if not CONFIG.DISCORD_STATUS_CHANNEL_ID:
+        return None
+    channel = bot.get_channel(CONFIG.DISCORD_STATUS_CHANNEL_ID)
+    if not isinstance(channel, discord.TextChannel):
+        log.warning("Could not get the status channel from Discord")
+        return None
+    return await channel.send(content=content)
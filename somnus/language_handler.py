@@ -1,6 +1,137 @@
-from yai18n import Translator
+import json
+import string
+from pathlib import Path
 
 from somnus.config import CONFIG
 
+LOCALE_FOLDER_PATH = Path("somnus/locales")
+FALLBACK_LOCALE = "en"
 
-LH = Translator(fallback_locale="en", default_locale=CONFIG.LANGUAGE, locale_folder_path="somnus/locales")
+
+class TranslationError(Exception):
+    pass
+
+
+class _Template:
+    """
+    A locale string split into its literal parts and placeholders once, so rendering only joins them.
+    """
+
+    __slots__ = ("fields", "parts", "text")
+
+    def __init__(self, template: str) -> None:
+        self.parts: list[tuple[str, str | None]] = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(template):
+            if format_spec or conversion:
+                raise TranslationError(f"Only plain placeholders are supported, got '{template}'")
+            self.parts.append((literal, field))
+
+        self.fields = frozenset(field for _, field in self.parts if field is not None)
+        # Strings without placeholders are rendered only once
+        self.text = "".join(literal for literal, _ in self.parts) if not self.fields else None
+
+    def render(self, args: dict) -> str:
+        if self.text is not None:
+            return self.text
+
+        rendered = []
+        for literal, field in self.parts:
+            rendered.append(literal)
+            if field is not None:
+                if field not in args:
+                    raise KeyError(f"Missing required translation argument: '{field}'")
+                rendered.append(format(args[field]))
+        return "".join(rendered)
+
+
+class Translator:
+    """
+    Compiles all locales at once and checks that every locale has the same keys with the same placeholders.
+
+    Raises:
+        TranslationError: If a locale file could not be read or the locales do not match.
+    """
+
+    def __init__(self, default_locale: str, locale_folder_path: Path = LOCALE_FOLDER_PATH) -> None:
+        self.locales: dict[str, dict[str, _Template]] = {}
+        for path in sorted(locale_folder_path.glob("*.json")):
+            try:
+                self.locales[path.stem] = _compile_locale(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError) as e:
+                raise TranslationError(f"Could not read locale file '{path}': {e}") from e
+
+        for locale in (FALLBACK_LOCALE, default_locale):
+            if locale not in self.locales:
+                raise TranslationError(f"Locale '{locale}' not found in locales ({', '.join(self.locales)})")
+        self.default_locale = default_locale
+
+        _check_locales(self.locales)
+
+    def __call__(self, key: str, locale: str | None = None, args: dict | None = None) -> str:
+        """
+        Raises:
+            KeyError: If the key or an argument of its string is missing.
+        """
+
+        try:
+            templates = self.locales[locale or self.default_locale]
+        except KeyError:
+            raise KeyError(f"Locale '{locale}' not found in locales ({', '.join(self.locales)})") from None
+        try:
+            template = templates[key]
+        except KeyError:
+            raise KeyError(f"Key '{key}' not found in locale '{locale or self.default_locale}'") from None
+        return template.render(args or {})
+
+
+class _LazyTranslator:
+    """
+    Loads the locales on the first translation, unless they were loaded before with `load`.
+    """
+
+    def __init__(self) -> None:
+        self._translator: Translator | None = None
+
+    def load(self, language: str) -> None:
+        """
+        Raises:
+            TranslationError: If the locales could not be loaded.
+        """
+
+        self._translator = Translator(language)
+
+    def __call__(self, key: str, locale: str | None = None, args: dict | None = None) -> str:
+        if self._translator is None:
+            self.load(CONFIG.LANGUAGE)
+        return self._translator(key, locale, args)  # type: ignore
+
+
+def _compile_locale(data: dict, prefix: str = "") -> dict[str, _Template]:
+    templates = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            templates.update(_compile_locale(value, f"{prefix}{key}."))
+        elif isinstance(value, str):
+            templates[f"{prefix}{key}"] = _Template(value)
+        else:
+            raise TranslationError(f"'{prefix}{key}' is not a string")
+    return templates
+
+
+def _check_locales(locales: dict[str, dict[str, _Template]]) -> None:
+    reference = locales[FALLBACK_LOCALE]
+    problems = []
+    for locale, templates in locales.items():
+        problems.extend(f"'{key}' is missing in locale '{locale}'" for key in reference.keys() - templates.keys())
+        problems.extend(f"'{key}' is only in locale '{locale}'" for key in templates.keys() - reference.keys())
+        problems.extend(
+            f"'{key}' has other placeholders in locale '{locale}'"
+            for key in reference.keys() & templates.keys()
+            if templates[key].fields != reference[key].fields
+        )
+
+    if problems:
+        raise TranslationError("The locales do not match:\n" + "\n".join(sorted(problems)))
+
+
+LH = _LazyTranslator()
@@ -1,28 +1,158 @@
+import atexit
+import contextvars
 import datetime
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Generator
 
-_LEVEL = logging.DEBUG
+from somnus.config import Config
+
+LOG_FILE_PATH = Path.cwd() / "data" / "logs" / "somnus.log"
 
 log = logging.getLogger("somnus")
 
+# Identifies the log records of one action, e.g. a start requested over Discord, in the JSON logs
+action_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("action_id", default=None)
+
 _formatter = logging.Formatter(
     "[%(asctime)s] [%(module)s/%(process)d/%(levelname)s]: %(message)s", datefmt="%d-%m-%y %H:%M:%S"
 )
 
-log.setLevel(_LEVEL)
-_console_handler = logging.StreamHandler()
-_console_handler.setLevel(_LEVEL)
-_console_handler.setFormatter(_formatter)
-log.addHandler(_console_handler)
 
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the action ID of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.datetime.fromtimestamp(record.created, datetime.UTC).astimezone()
+        data = {
+            "time": created.isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "module": record.module,
+            "process": record.process,
+            "action_id": getattr(record, "action_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RotatingCompressedFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Starts a new file at midnight or when the file would grow above `max_bytes`.
+    Old files are compressed with gzip, only the newest `backup_count` of them are kept.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, backup_count: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(path, "a", encoding="utf-8")
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._rollover_time = _get_next_midnight()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:  # noqa: N802
+        # An empty file is never rotated
+        size = self.stream.tell() if self.stream else 0
+        if not size:
+            if time.time() >= self._rollover_time:
+                self._rollover_time = _get_next_midnight()
+            return False
+        if time.time() >= self._rollover_time:
+            return True
+        return bool(self.max_bytes) and size + len(self.format(record)) + 1 > self.max_bytes
+
+    def doRollover(self) -> None:  # noqa: N802
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        timestamp = f"{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}"
+        rotated_path = f"{self.baseFilename}.{timestamp}"
+        i = 0
+        while os.path.exists(f"{rotated_path}.gz"):
+            i += 1
+            rotated_path = f"{self.baseFilename}.{timestamp}-{i}"
+
+        os.replace(self.baseFilename, rotated_path)
+        with open(rotated_path, "rb") as source, gzip.open(f"{rotated_path}.gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(rotated_path)
+        self._delete_old_files()
+
+        self.stream = self._open()
+        self._rollover_time = _get_next_midnight()
+
+    def _delete_old_files(self) -> None:
+        directory = Path(self.baseFilename).parent
+        old_files = sorted(
+            directory.glob(f"{Path(self.baseFilename).name}.*.gz"), key=lambda path: path.stat().st_mtime
+        )
+        for path in old_files[: max(0, len(old_files) - self.backup_count)]:
+            path.unlink(missing_ok=True)
+
+
+class _ActionIdFilter(logging.Filter):
+    # Runs in the thread that logs, where the context variable is set
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.action_id = action_id.get()
+        return True
+
+
+@contextmanager
+def new_action_id() -> Generator[str, None, None]:
+    """
+    Gives the log records of the block, also of the tasks created in it, a new action ID.
+    """
+
+    new_id = uuid.uuid4().hex[:8]
+    token = action_id.set(new_id)
+    try:
+        yield new_id
+    finally:
+        action_id.reset(token)
+
+
+def _get_next_midnight() -> float:
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    return tomorrow.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def setup_logging(config: Config) -> logging.handlers.QueueListener:
+    """
+    The records are only put into a queue on the logging thread, usually the event loop.
+    Formatting and writing them happens in the thread of the returned listener.
+    """
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(config.LOG_LEVEL)
+    console_handler.setFormatter(_formatter)
+
+    file_handler = RotatingCompressedFileHandler(
+        LOG_FILE_PATH, config.LOG_FILE_MAX_MB * 1024 * 1024, config.LOG_FILE_BACKUPS
+    )
+    file_handler.setLevel(config.LOG_FILE_LEVEL)
+    file_handler.setFormatter(JsonFormatter() if config.LOG_FILE_FORMAT == "json" else _formatter)
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_ActionIdFilter())
 
-_file_name = datetime.datetime.now().strftime("%y-%m-%d_%H-%M-%S") + ".log"
-_log_file_path = Path.cwd() / "data" / "logs" / _file_name
-_log_file_path.parent.mkdir(parents=True, exist_ok=True)
-open(_log_file_path, "w").close()
+    log.setLevel(min(console_handler.level, file_handler.level))
+    log.addHandler(queue_handler)
 
-_file_handler = logging.FileHandler(_log_file_path)
-_file_handler.setLevel(_LEVEL)
-_file_handler.setFormatter(_formatter)
-log.addHandler(_file_handler)
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    # Writes the records that are still queued
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,66 @@
+import asyncio
+import os
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class DataFileCache(Generic[T]):
+    """
+    Parsed content of a data file in `data/`, read once per path. With `watch_file` it is read again when the
+    modification time or size of the file changed, e.g. when it was edited by hand. The cached value is shared by
+    all readers, changes are made on a copy and saved.
+    """
+
+    def __init__(self, watch_file: bool = False) -> None:
+        self.value: T | None = None
+        self.write_lock = asyncio.Lock()
+        self._watch_file = watch_file
+        self._key: tuple[str, tuple[int, int] | None] | None = None
+
+    def get(self, path: str) -> T | None:
+        if self.value is not None and self._key == self._get_key(path):
+            return self.value
+        return None
+
+    def set(self, path: str, value: T) -> None:
+        self.value = value
+        self._key = self._get_key(path)
+
+    async def save(self, path: str, value: T, content: str) -> None:
+        """
+        Writes `content` in a thread and caches `value`. Callers that changed a loaded value hold `write_lock`
+        from loading it until here, so concurrent changes can't overwrite each other.
+
+        Raises:
+            OSError: If the file could not be written
+        """
+
+        await asyncio.to_thread(write_file_atomically, path, content)
+        self.set(path, value)
+
+    def _get_key(self, path: str) -> tuple[str, tuple[int, int] | None]:
+        return path, _get_file_key(path) if self._watch_file else None
+
+
+def write_file_atomically(path: str, content: str) -> None:
+    """
+    Blocks until the content is on the disk, run it in a thread.
+    """
+
+    temp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write a complete copy first and swap it in, so a crash while writing can't leave a truncated file behind
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def _get_file_key(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,295 @@
+import base64
+import json
+import struct
+import time
+from typing import Iterator, NamedTuple
+
+import aiofiles
+from pydantic import BaseModel
+
+from somnus.actions.stats import ServerState
+from somnus.logger import log
+from somnus.logic.data_file import DataFileCache
+
+PLAYER_ACTIVITY_FILE_PATH = "data/player_activity.json"
+# Samples closer together are skipped, this bounds the raw samples kept for a day
+RAW_MIN_INTERVAL_SECONDS = 10
+# A longer gap, e.g. while the bot was not running, only counts with this duration
+MAX_SAMPLE_WEIGHT_SECONDS = 300
+
+
+class _Tier(NamedTuple):
+    name: str
+    resolution_seconds: int
+    retention_seconds: int
+
+
+# From fine to coarse, every tier is downsampled from the one before
+TIERS = (
+    _Tier("raw", RAW_MIN_INTERVAL_SECONDS, 24 * 3600),
+    _Tier("5m", 300, 30 * 24 * 3600),
+    _Tier("1h", 3600, 365 * 24 * 3600),
+)
+
+
+class ActivitySample(NamedTuple):
+    time: float
+    # Seconds the sample stands for
+    weight: float
+    average_online: float
+    # Share of the time the Minecraft server was running, between 0 and 1
+    uptime: float
+    peak_online: int
+    max_players: int
+
+
+# Time, weight, average, uptime, peak, max players
+_RECORD = struct.Struct("<IfffHH")
+
+
+class _RingBuffer:
+    """
+    Fixed number of packed samples in one bytearray, the oldest one is overwritten when it is full.
+    """
+
+    def __init__(self, capacity: int, data: bytes = b"") -> None:
+        self.capacity = capacity
+        self._buffer = bytearray(capacity * _RECORD.size)
+        self._start = 0
+        self.count = 0
+        for i in range(0, len(data), _RECORD.size):
+            self.append(ActivitySample(*_RECORD.unpack_from(data, i)))
+
+    def append(self, sample: ActivitySample) -> None:
+        index = (self._start + self.count) % self.capacity
+        _RECORD.pack_into(
+            self._buffer,
+            index * _RECORD.size,
+            int(sample.time),
+            sample.weight,
+            sample.average_online,
+            sample.uptime,
+            min(sample.peak_online, 0xFFFF),
+            min(sample.max_players, 0xFFFF),
+        )
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def __iter__(self) -> Iterator[ActivitySample]:
+        # Oldest first
+        for i in range(self.count):
+            index = (self._start + i) % self.capacity
+            yield ActivitySample(*_RECORD.unpack_from(self._buffer, index * _RECORD.size))
+
+    def newest(self) -> ActivitySample | None:
+        if not self.count:
+            return None
+        index = (self._start + self.count - 1) % self.capacity
+        return ActivitySample(*_RECORD.unpack_from(self._buffer, index * _RECORD.size))
+
+    def to_bytes(self) -> bytes:
+        end = self._start + self.count
+        if end <= self.capacity:
+            return bytes(self._buffer[self._start * _RECORD.size : end * _RECORD.size])
+        return bytes(self._buffer[self._start * _RECORD.size :] + self._buffer[: (end - self.capacity) * _RECORD.size])
+
+
+class _Bucket:
+    """
+    Time weighted aggregate of the samples of a bucket that is not finished yet.
+    """
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.weight = 0.0
+        self.online_seconds = 0.0
+        self.uptime_seconds = 0.0
+        self.peak_online = 0
+        self.max_players = 0
+
+    def add(self, sample: ActivitySample) -> None:
+        self.weight += sample.weight
+        self.online_seconds += sample.average_online * sample.weight
+        self.uptime_seconds += sample.uptime * sample.weight
+        self.peak_online = max(self.peak_online, sample.peak_online)
+        self.max_players = max(self.max_players, sample.max_players)
+
+    def to_sample(self) -> ActivitySample:
+        weight = self.weight or 1
+        return ActivitySample(
+            self.start,
+            self.weight,
+            self.online_seconds / weight,
+            self.uptime_seconds / weight,
+            self.peak_online,
+            self.max_players,
+        )
+
+
+class _ActivitySeries:
+    def __init__(self) -> None:
+        self.rings = [_RingBuffer(tier.retention_seconds // tier.resolution_seconds) for tier in TIERS]
+        # The unfinished bucket of every tier except the raw one
+        self.buckets: list[_Bucket | None] = [None] * len(TIERS)
+        self.last_sample_time: float | None = None
+
+    def add(self, now: float, online: int, max_players: int, running: bool) -> bool:
+        """
+        Returns if a bucket was finished, which is a good time to save.
+        """
+
+        if self.last_sample_time is not None and now - self.last_sample_time < RAW_MIN_INTERVAL_SECONDS:
+            return False
+        weight = min(now - self.last_sample_time, MAX_SAMPLE_WEIGHT_SECONDS) if self.last_sample_time else 0
+        self.last_sample_time = now
+
+        sample = ActivitySample(now, weight, online, float(running), online, max_players)
+        self.rings[0].append(sample)
+        return self._add_to_bucket(1, sample)
+
+    def rebuild_buckets(self) -> None:
+        """
+        Fills the unfinished buckets again from the finer samples after the last finished bucket of their tier.
+        """
+
+        for tier_index in range(1, len(TIERS)):
+            ring = self.rings[tier_index]
+            last = ring.newest()
+            covered_until = last.time + TIERS[tier_index].resolution_seconds if last else 0
+            for sample in self.rings[tier_index - 1]:
+                if sample.time >= covered_until:
+                    self._add_to_bucket(tier_index, sample, cascade=False)
+
+    def get_samples(self, since: float, now: float) -> list[ActivitySample]:
+        """
+        The samples of the finest tier that still covers the time span, completed with the finer samples
+        after its last finished bucket.
+        """
+
+        span = now - since
+        tier_index = next((i for i, tier in enumerate(TIERS) if span <= tier.retention_seconds), len(TIERS) - 1)
+
+        samples: list[ActivitySample] = []
+        covered_until = since
+        for i in range(tier_index, -1, -1):
+            newer = [sample for sample in self.rings[i] if sample.time >= covered_until]
+            if newer:
+                samples += newer
+                covered_until = newer[-1].time + TIERS[i].resolution_seconds
+        return samples
+
+    def _add_to_bucket(self, tier_index: int, sample: ActivitySample, cascade: bool = True) -> bool:
+        if tier_index >= len(TIERS):
+            return False
+
+        resolution = TIERS[tier_index].resolution_seconds
+        bucket_start = sample.time - sample.time % resolution
+        bucket = self.buckets[tier_index]
+        finished = False
+        if bucket is not None and bucket.start != bucket_start:
+            finished_sample = bucket.to_sample()
+            self.rings[tier_index].append(finished_sample)
+            if cascade:
+                self._add_to_bucket(tier_index + 1, finished_sample)
+            bucket = None
+            finished = True
+        if bucket is None:
+            bucket = self.buckets[tier_index] = _Bucket(bucket_start)
+        bucket.add(sample)
+        return finished
+
+
+class _PlayerActivityData(BaseModel):
+    # Host server name -> tier name -> packed samples, oldest first, in base64
+    hosts: dict[str, dict[str, str]] = {}
+    last_sample_times: dict[str, float] = {}
+
+
+_cache: DataFileCache[dict[str, _ActivitySeries]] = DataFileCache()
+
+
+async def record_server_state(host_name: str, server_state: ServerState) -> None:
+    """
+    Adds a sample with the players online, a stopped server counts as no players online.
+    """
+
+    players = server_state.players
+    online = players.online if players and server_state.mc_server_running else 0
+    max_players = players.max if players and server_state.mc_server_running else 0
+    await record_sample(host_name, online, max_players, server_state.mc_server_running)
+
+
+async def record_sample(host_name: str, online: int, max_players: int, running: bool, now: float | None = None) -> None:
+    series = (await _get_all_series()).setdefault(host_name, _ActivitySeries())
+    if not series.add(time.time() if now is None else now, online, max_players, running):
+        return
+
+    async with _cache.write_lock:
+        try:
+            await _save_all_series(await _get_all_series())
+        except OSError as e:
+            log.warning(f"Could not save the player activity | {e}")
+
+
+async def get_activity(
+    host_name: str, since: float, bucket_seconds: float, now: float | None = None
+) -> list[ActivitySample]:
+    """
+    The samples since `since` combined into buckets of `bucket_seconds`, buckets without samples are left out.
+    """
+
+    series = (await _get_all_series()).get(host_name)
+    if series is None:
+        return []
+
+    buckets: dict[int, _Bucket] = {}
+    for sample in series.get_samples(since, time.time() if now is None else now):
+        index = int((sample.time - since) // bucket_seconds)
+        buckets.setdefault(index, _Bucket(since + index * bucket_seconds)).add(sample)
+    return [buckets[index].to_sample() for index in sorted(buckets)]
+
+
+async def _get_all_series() -> dict[str, _ActivitySeries]:
+    cached_series = _cache.get(PLAYER_ACTIVITY_FILE_PATH)
+    if cached_series is not None:
+        return cached_series
+
+    all_series: dict[str, _ActivitySeries] = {}
+    try:
+        async with aiofiles.open(PLAYER_ACTIVITY_FILE_PATH, encoding="utf-8") as file:
+            data = _PlayerActivityData(**json.loads(await file.read()))
+        for host_name, tiers in data.hosts.items():
+            series = all_series[host_name] = _ActivitySeries()
+            for i, tier in enumerate(TIERS):
+                series.rings[i] = _RingBuffer(series.rings[i].capacity, base64.b64decode(tiers.get(tier.name, "")))
+            series.last_sample_time = data.last_sample_times.get(host_name)
+            series.rebuild_buckets()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.error(f"Could not read '{PLAYER_ACTIVITY_FILE_PATH}', starting a new player activity", exc_info=e)
+        all_series = {}
+
+    _cache.set(PLAYER_ACTIVITY_FILE_PATH, all_series)
+    return all_series
+
+
+async def _save_all_series(all_series: dict[str, _ActivitySeries]) -> None:
+    # The unfinished buckets are not saved, they are rebuilt from the finer samples when the file is read
+    data = _PlayerActivityData(
+        hosts={
+            host_name: {
+                tier.name: base64.b64encode(ring.to_bytes()).decode() for tier, ring in zip(TIERS, series.rings)
+            }
+            for host_name, series in all_series.items()
+        },
+        last_sample_times={
+            host_name: series.last_sample_time
+            for host_name, series in all_series.items()
+            if series.last_sample_time is not None
+        },
+    )
+
+    await _cache.save(PLAYER_ACTIVITY_FILE_PATH, all_series, json.dumps(data.model_dump(), separators=(",", ":")))
@@ -0,0 +1,127 @@
+import json
+import statistics
+import time
+
+import aiofiles
+from pydantic import BaseModel
+
+from somnus.logger import log
+from somnus.logic.data_file import DataFileCache
+
+STAGE_HISTORY_FILE_PATH = "data/stage_history.json"
+MAX_RUNS_PER_OPERATION = 10
+
+
+class StageHistory(BaseModel):
+    # World name -> operation -> the last runs, oldest first, each with the seconds every stage took
+    worlds: dict[str, dict[str, list[list[float]]]] = {}
+
+
+class StageTimer:
+    """
+    Times the stages of a running operation, a stage lasts from one progress step to the next.
+    With the stage durations of previous runs, the progress is interpolated over time.
+    """
+
+    def __init__(self, expected_stage_seconds: list[float] | None = None) -> None:
+        self.expected_stage_seconds = expected_stage_seconds
+        self.stage_seconds: list[float] = []
+        self._stage_start_time = time.monotonic()
+
+    def next_stage(self) -> None:
+        now = time.monotonic()
+        self.stage_seconds.append(now - self._stage_start_time)
+        self._stage_start_time = now
+
+    def get_progress(self) -> tuple[float, float] | None:
+        """
+        Estimated progress between 0 and 1 and the estimated remaining seconds, None without previous runs.
+        """
+
+        expected = self.expected_stage_seconds
+        if not expected or sum(expected) <= 0:
+            return None
+
+        stage = len(self.stage_seconds)
+        if stage >= len(expected):
+            # Took more stages than usual, the end has to be close
+            return 1, 0
+
+        seconds_in_stage = min(time.monotonic() - self._stage_start_time, expected[stage])
+        done_seconds = sum(expected[:stage]) + seconds_in_stage
+        total_seconds = sum(expected)
+        return done_seconds / total_seconds, total_seconds - done_seconds
+
+
+_cache: DataFileCache[StageHistory] = DataFileCache()
+
+
+async def get_expected_stage_seconds(world: str, operation: str) -> list[float] | None:
+    """
+    The typical seconds per stage of the last runs, None if the operation never finished for this world.
+    """
+
+    runs = (await _get_stage_history()).worlds.get(world, {}).get(operation)
+    if not runs:
+        return None
+
+    stage_count = round(statistics.median(len(run) for run in runs))
+    return [statistics.median(run[i] for run in runs if len(run) > i) for i in range(stage_count)]
+
+
+async def record_run(world: str, operation: str, stage_seconds: list[float]) -> None:
+    """
+    Stores the stage durations of a finished run, only the last `MAX_RUNS_PER_OPERATION` runs are kept.
+    """
+
+    if not stage_seconds:
+        return
+
+    async with _cache.write_lock:
+        history = await _get_stage_history()
+        runs = history.worlds.setdefault(world, {}).setdefault(operation, [])
+        runs.append([round(seconds, 2) for seconds in stage_seconds])
+        del runs[:-MAX_RUNS_PER_OPERATION]
+
+        try:
+            await _save_stage_history(history)
+        except OSError as e:
+            log.warning(f"Could not save the stage history | {e}")
+
+
+async def rename_world(old_name: str, new_name: str) -> None:
+    async with _cache.write_lock:
+        history = await _get_stage_history()
+        if old_name not in history.worlds:
+            return
+        history.worlds[new_name] = history.worlds.pop(old_name)
+        await _save_stage_history(history)
+
+
+async def delete_world(name: str) -> None:
+    async with _cache.write_lock:
+        history = await _get_stage_history()
+        if history.worlds.pop(name, None) is not None:
+            await _save_stage_history(history)
+
+
+async def _get_stage_history() -> StageHistory:
+    cached_history = _cache.get(STAGE_HISTORY_FILE_PATH)
+    if cached_history is not None:
+        return cached_history
+
+    try:
+        async with aiofiles.open(STAGE_HISTORY_FILE_PATH, encoding="utf-8") as file:
+            history = StageHistory(**json.loads(await file.read()))
+    except FileNotFoundError:
+        history = StageHistory()
+    except Exception as e:
+        log.error(f"Could not read '{STAGE_HISTORY_FILE_PATH}', starting a new stage history", exc_info=e)
+        history = StageHistory()
+
+    _cache.set(STAGE_HISTORY_FILE_PATH, history)
+    return history
+
+
+async def _save_stage_history(history: StageHistory) -> None:
+    await _cache.save(STAGE_HISTORY_FILE_PATH, history, json.dumps(history.model_dump(), separators=(",", ":")))
@@ -1,23 +1,37 @@
+import time
 from typing import AsyncGenerator
 
+from somnus.actions.ssh import ssh_pool
 from somnus.actions.start_host import start_host_server
 from somnus.actions.start_mc import start_mc_server
-from somnus.actions.stats import get_server_state
+from somnus.actions.state_service import server_state_service
 from somnus.config import Config
 from somnus.language_handler import LH
 from somnus.logger import log
 from somnus.logic.errors import UserInputError
+from somnus.logic.world_selector import WorldSelectorWorld
+from somnus.metrics import DURATION_BUCKETS, metrics
 
+SERVER_START_SECONDS = metrics.histogram(
+    "somnus_server_start_seconds",
+    "Duration of complete server starts, including the host server if it was off",
+    ("host", "host_was_running"),
+    DURATION_BUCKETS,
+)
 
-async def start_server(config: Config) -> AsyncGenerator:
+
+async def start_server(config: Config, world: WorldSelectorWorld | None = None) -> AsyncGenerator:
     """
+    Starts `world` on the host server of `config`, by default the current world.
+
     Raises:
         UserInputError: If the user input is invalid.
         MCServerStartError: If MC server could not be started.
         HostServerStartError: If host server could not be started.
     """
 
-    server_state = await get_server_state(config)
+    start_time = time.monotonic()
+    server_state = await server_state_service.get_state(config, max_age_seconds=0)
     log.info(
         f"Host server running: {server_state.host_server_running} | MC server running: {server_state.mc_server_running}"
     )
@@ -50,5 +64,12 @@ async def start_server(config: Config) -> AsyncGenerator:
     yield
 
     # Start MC server
-    async for _ in start_mc_server(config):
-        yield
+    async with ssh_pool.lease(config) as ssh:
+        async for _ in start_mc_server(ssh, config, world.start_cmd if world else None):
+            yield
+
+    SERVER_START_SECONDS.observe(
+        time.monotonic() - start_time,
+        host=config.HOST_SERVER_NAME,
+        host_was_running=server_state.host_server_running,
+    )
@@ -1,15 +1,24 @@
+import time
 from typing import AsyncGenerator
 
-from asyncer import asyncify
-
-from somnus.actions.ssh import ssh_login
-from somnus.actions.stats import get_server_state
-from somnus.actions.stop_host import stop_host_server
-from somnus.actions.stop_mc import stop_mc_server
+from somnus.actions.rcon import RconError, rcon_is_configured
+from somnus.actions.ssh import ssh_pool
+from somnus.actions.start_host import start_host_server
+from somnus.actions.state_service import server_state_service
+from somnus.actions.stop_host import stop_host_server, suspend_host_server
+from somnus.actions.stop_mc import stop_mc_server, stop_mc_server_with_rcon
 from somnus.config import Config
 from somnus.language_handler import LH
 from somnus.logger import log
 from somnus.logic.errors import UserInputError
+from somnus.metrics import DURATION_BUCKETS, metrics
+
+SERVER_STOP_SECONDS = metrics.histogram(
+    "somnus_server_stop_seconds",
+    "Duration of complete server stops, including the shutdown of the host server",
+    ("host",),
+    DURATION_BUCKETS,
+)
 
 
 async def stop_server(prevent_host_shutdown: bool, config: Config) -> AsyncGenerator:
@@ -20,19 +29,15 @@ async def stop_server(prevent_host_shutdown: bool, config: Config) -> AsyncGener
         HostServerStopError: If host server could not be started.
     """
 
-    ssh = await ssh_login(config)
-    server_state = await get_server_state(config)
+    start_time = time.monotonic()
+    server_state = await server_state_service.get_state(config, max_age_seconds=0)
     log.info(
         f"Host server running: {server_state.host_server_running} | MC server running: {server_state.mc_server_running}"
     )
 
     if not (server_state.host_server_running or server_state.mc_server_running):
-        asyncify(ssh.prompt)()
-        ssh.logout()
         raise UserInputError(LH("commands.stop.error.already_stopped"))
     elif prevent_host_shutdown and not server_state.mc_server_running:
-        asyncify(ssh.prompt)()
-        ssh.logout()
         raise UserInputError(LH("commands.stop.error.mc_already_stopped"))
 
     yield
@@ -40,7 +45,7 @@ async def stop_server(prevent_host_shutdown: bool, config: Config) -> AsyncGener
     # Stop MC server
     if server_state.mc_server_running:
         log.debug("Stopping MC server ...")
-        async for _ in stop_mc_server(ssh, config):
+        async for _ in stop_mc(config):
             yield
     else:
         for _ in range(5):
@@ -53,9 +58,67 @@ async def stop_server(prevent_host_shutdown: bool, config: Config) -> AsyncGener
         and not prevent_host_shutdown
         and config.HOST_SERVER_HOST not in ["localhost", "127.0.0.1"]
     ):
-        await stop_host_server(ssh, config)
+        async with ssh_pool.lease(config) as ssh:
+            await stop_host_server(ssh, config)
     yield
-
-    await asyncify(ssh.prompt)()
-    ssh.logout()
+    SERVER_STOP_SECONDS.observe(time.monotonic() - start_time, host=config.HOST_SERVER_NAME)
     yield
+
+
+async def suspend_host(config: Config) -> None:
+    """
+    Suspends the host server while the MC server is stopped, a start wakes it like a stopped host server.
+
+    Raises:
+        TimeoutError: If no SSH connection could be established.
+        HostServerStopError: If host server could not be suspended.
+    """
+
+    try:
+        async with ssh_pool.lease(config) as ssh:
+            await suspend_host_server(ssh, config)
+    finally:
+        server_state_service.invalidate(config)
+
+
+async def power_off_host(config: Config, suspended: bool) -> None:
+    """
+    Shuts the host server down while the MC server is stopped.
+
+    Raises:
+        HostServerStartError: If a suspended host server could not be woken.
+        TimeoutError: If no SSH connection could be established.
+        HostServerStopError: If host server could not be stopped.
+    """
+
+    try:
+        # A suspended host server has to be woken to shut it down
+        if suspended:
+            async for _ in start_host_server(config):
+                pass
+        async with ssh_pool.lease(config) as ssh:
+            await stop_host_server(ssh, config)
+    finally:
+        server_state_service.invalidate(config)
+
+
+async def stop_mc(config: Config) -> AsyncGenerator:
+    """
+    Stops only the MC server, over RCON if it is configured and reachable, otherwise over the screen session.
+
+    Raises:
+        TimeoutError: If no SSH connection could be established.
+        MCServerStopError: If MC server could not be stopped.
+    """
+
+    if rcon_is_configured(config):
+        try:
+            async for _ in stop_mc_server_with_rcon(config):
+                yield
+            return
+        except RconError as e:
+            log.warning(f"Could not stop MC server over RCON, using the screen session | {e}")
+
+    async with ssh_pool.lease(config) as ssh:
+        async for _ in stop_mc_server(ssh, config):
+            yield
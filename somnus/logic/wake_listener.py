@@ -0,0 +1,417 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import time
+from typing import Awaitable, Callable, Literal, NamedTuple
+
+from somnus.actions.state_service import server_state_service
+from somnus.config import Config
+from somnus.language_handler import LH
+from somnus.logger import log
+from somnus.metrics import metrics
+
+WakeState = Literal["sleeping", "starting", "running"]
+
+# Handshakes and login starts are a few hundred bytes at most
+MAX_PACKET_BYTES = 2048
+READ_TIMEOUT_SECONDS = 5
+# Forwarded players count as well
+MAX_CONNECTIONS = 1024
+# Moved per read of a forwarded connection, the default capacity of a pipe
+PROXY_BUFFER_BYTES = 64 * 1024
+# Below the 30 second read timeout of the client
+PROXY_HOLD_SECONDS = 25
+DEFAULT_MC_SERVER_PORT = 25565
+# Logins within this time after a start request don't start the server again
+START_DEBOUNCE_SECONDS = 60
+
+_HANDSHAKE_ID = 0x00
+_STATUS_REQUEST_ID = 0x00
+_STATUS_RESPONSE_ID = 0x00
+_PING_REQUEST_ID = 0x01
+_PONG_RESPONSE_ID = 0x01
+_LOGIN_START_ID = 0x00
+_LOGIN_DISCONNECT_ID = 0x00
+_STATUS_NEXT_STATE = 1
+# Login and the transfer from another server
+_LOGIN_NEXT_STATES = (2, 3)
+# First byte of the ping of clients older than 1.7, which is not answered
+_LEGACY_PING = 0xFE
+_SPLICE_FLAGS = getattr(os, "SPLICE_F_MOVE", 0) | getattr(os, "SPLICE_F_NONBLOCK", 0)
+
+WAKE_LISTENER_CONNECTIONS = metrics.counter(
+    "somnus_wake_listener_connections_total", "Connections to the wake listener", ("host", "intent")
+)
+PROXY_CONNECTIONS = metrics.gauge(
+    "somnus_proxy_connections", "Connections forwarded to the MC server by the wake listener", ("host",)
+)
+WAKE_LISTENER_HOLD_SECONDS = metrics.histogram(
+    "somnus_wake_listener_hold_seconds", "Time logins were held open while the MC server started", ("host",)
+)
+WAKE_LISTENER_STARTS = metrics.counter(
+    "somnus_wake_listener_starts_total", "Server starts requested by a login to the wake listener", ("host",)
+)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Handshake(NamedTuple):
+    protocol_version: int
+    server_address: str
+    server_port: int
+    next_state: int
+
+
+async def read_varint(reader: asyncio.StreamReader, first_byte: int | None = None) -> int:
+    """
+    `first_byte` is the first byte of the VarInt if it was already read.
+
+    Raises:
+        ProtocolError: If the VarInt is longer than 5 bytes.
+        asyncio.IncompleteReadError: If the connection was closed.
+    """
+
+    value = 0
+    for i in range(5):
+        byte = first_byte if i == 0 and first_byte is not None else (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value - (1 << 32) if value & (1 << 31) else value
+    raise ProtocolError("VarInt is too long")
+
+
+def decode_varint(data: bytes, offset: int) -> tuple[int, int]:
+    """
+    The value and the offset after it.
+
+    Raises:
+        ProtocolError: If the VarInt is too long or incomplete.
+    """
+
+    value = 0
+    for i in range(5):
+        if offset + i >= len(data):
+            raise ProtocolError("VarInt is incomplete")
+        byte = data[offset + i]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return (value - (1 << 32) if value & (1 << 31) else value), offset + i + 1
+    raise ProtocolError("VarInt is too long")
+
+
+def encode_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    data = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def decode_string(data: bytes, offset: int) -> tuple[str, int]:
+    """
+    Raises:
+        ProtocolError: If the string is incomplete.
+    """
+
+    length, offset = decode_varint(data, offset)
+    if length < 0 or offset + length > len(data):
+        raise ProtocolError("String is incomplete")
+    return data[offset : offset + length].decode("utf-8", errors="replace"), offset + length
+
+
+def encode_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return encode_varint(len(data)) + data
+
+
+def encode_packet(packet_id: int, payload: bytes) -> bytes:
+    body = encode_varint(packet_id) + payload
+    return encode_varint(len(body)) + body
+
+
+async def read_packet(reader: asyncio.StreamReader, first_byte: int | None = None) -> tuple[int, bytes]:
+    """
+    The ID and the payload of the next uncompressed packet.
+
+    Raises:
+        ProtocolError: If the packet is invalid or too long.
+        asyncio.IncompleteReadError: If the connection was closed.
+    """
+
+    length = await read_varint(reader, first_byte)
+    if not 0 < length <= MAX_PACKET_BYTES:
+        raise ProtocolError(f"Invalid packet length {length}")
+    body = await reader.readexactly(length)
+    packet_id, offset = decode_varint(body, 0)
+    return packet_id, body[offset:]
+
+
+def get_mc_server_address(config: Config) -> tuple[str, int]:
+    host, _, port = config.MC_SERVER_ADDRESS.rpartition(":")
+    if not host or not port.isdigit():
+        return config.MC_SERVER_ADDRESS, DEFAULT_MC_SERVER_PORT
+    return host, int(port)
+
+
+def _parse_handshake_packet(packet_id: int, payload: bytes) -> Handshake:
+    if packet_id != _HANDSHAKE_ID:
+        raise ProtocolError(f"Expected a handshake, got packet {packet_id}")
+    return parse_handshake(payload)
+
+
+def parse_handshake(payload: bytes) -> Handshake:
+    """
+    Raises:
+        ProtocolError: If the handshake is incomplete.
+    """
+
+    protocol_version, offset = decode_varint(payload, 0)
+    server_address, offset = decode_string(payload, offset)
+    if offset + 2 > len(payload):
+        raise ProtocolError("Handshake is incomplete")
+    (server_port,) = struct.unpack_from(">H", payload, offset)
+    next_state, _ = decode_varint(payload, offset + 2)
+    return Handshake(protocol_version, server_address, server_port, next_state)
+
+
+async def _forward(source: socket.socket, target: socket.socket) -> None:
+    """
+    Copies everything from `source` to `target` until `source` is closed. On Linux the bytes are moved through a pipe
+    with `splice` and never copied into Python, otherwise one buffer is reused for every read.
+    """
+
+    loop = asyncio.get_running_loop()
+    if not hasattr(os, "splice"):
+        buffer = memoryview(bytearray(PROXY_BUFFER_BYTES))
+        while nbytes := await loop.sock_recv_into(source, buffer):
+            await loop.sock_sendall(target, buffer[:nbytes])
+        return
+
+    read_fd, write_fd = os.pipe()
+    try:
+        while True:
+            try:
+                nbytes = os.splice(source.fileno(), write_fd, PROXY_BUFFER_BYTES, flags=_SPLICE_FLAGS)
+            except BlockingIOError:
+                await _wait_for_fd(loop.add_reader, loop.remove_reader, source)
+                continue
+            if nbytes == 0:
+                return
+
+            # The pipe is emptied before the next read, so it never fills up
+            while nbytes:
+                try:
+                    nbytes -= os.splice(read_fd, target.fileno(), nbytes, flags=_SPLICE_FLAGS)
+                except BlockingIOError:
+                    await _wait_for_fd(loop.add_writer, loop.remove_writer, target)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+async def _wait_for_fd(add: Callable[..., None], remove: Callable[[int], object], sock: socket.socket) -> None:
+    future = asyncio.get_running_loop().create_future()
+    add(sock.fileno(), lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        remove(sock.fileno())
+
+
+class WakeListener:
+    """
+    Stands in for the MC server of a host server while it is off. Status pings are answered with a MOTD that tells
+    the players to join, and the first login starts the server. Nothing runs until a client connects.
+
+    As a proxy it also forwards the connections to the running MC server, and logins while it starts are held open
+    and handed over when it is done.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        get_state: Callable[[Config], WakeState],
+        on_login: Callable[[Config, str], Awaitable[None]],
+        proxy: bool = False,
+    ) -> None:
+        self.config = config
+        self._get_state = get_state
+        self._on_login = on_login
+        self._proxy = proxy
+        self._server: asyncio.Server | None = None
+        self._connections = 0
+        self._last_start_time: float | None = None
+        self._start_task: asyncio.Task | None = None
+
+    async def start(self, host: str, port: int) -> None:
+        """
+        Raises:
+            OSError: If the port could not be bound.
+        """
+
+        self._server = await asyncio.start_server(self._handle, host, port)
+        log.info(f"Wake listener of host server '{self.config.HOST_SERVER_NAME}' listens on {host}:{port}")
+
+    def get_port(self) -> int | None:
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    def close(self) -> None:
+        if self._server:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._connections >= MAX_CONNECTIONS:
+            writer.close()
+            return
+
+        self._connections += 1
+        try:
+            async with asyncio.timeout(READ_TIMEOUT_SECONDS):
+                first_byte = (await reader.readexactly(1))[0]
+                if first_byte == _LEGACY_PING:
+                    return
+                handshake_packet = await read_packet(reader, first_byte)
+                handshake = _parse_handshake_packet(*handshake_packet)
+                # Clients send the status request or login start right after the handshake and then wait
+                packet = await read_packet(reader)
+
+            # Both packets are sent again to the MC server if the connection is forwarded
+            received = encode_packet(*handshake_packet) + encode_packet(*packet)
+            if handshake.next_state == _STATUS_NEXT_STATE:
+                WAKE_LISTENER_CONNECTIONS.inc(host=self.config.HOST_SERVER_NAME, intent="status")
+                if not await self._forward_if_running(writer, received):
+                    await self._answer_status(reader, writer, handshake, packet)
+            elif handshake.next_state in _LOGIN_NEXT_STATES:
+                WAKE_LISTENER_CONNECTIONS.inc(host=self.config.HOST_SERVER_NAME, intent="login")
+                if not await self._forward_if_running(writer, received):
+                    await self._answer_login(writer, packet, received)
+        except (ProtocolError, OSError, TimeoutError, asyncio.IncompleteReadError) as e:
+            log.debug(f"Wake listener connection ended | {e!r}")
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _answer_status(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        handshake: Handshake,
+        packet: tuple[int, bytes],
+    ) -> None:
+        if packet[0] != _STATUS_REQUEST_ID:
+            raise ProtocolError(f"Expected a status request, got packet {packet[0]}")
+
+        state = self._get_state(self.config)
+        status = {
+            # The version of the client, so it is not shown as incompatible
+            "version": {"name": "Somnus", "protocol": handshake.protocol_version},
+            "players": {"max": 0, "online": 0},
+            "description": {"text": LH(f"other.wake_listener.motd.{state}")},
+        }
+        writer.write(encode_packet(_STATUS_RESPONSE_ID, encode_string(json.dumps(status))))
+        await writer.drain()
+
+        async with asyncio.timeout(READ_TIMEOUT_SECONDS):
+            packet_id, payload = await read_packet(reader)
+        if packet_id == _PING_REQUEST_ID:
+            writer.write(encode_packet(_PONG_RESPONSE_ID, payload))
+            await writer.drain()
+
+    async def _answer_login(self, writer: asyncio.StreamWriter, packet: tuple[int, bytes], received: bytes) -> None:
+        if packet[0] != _LOGIN_START_ID:
+            raise ProtocolError(f"Expected a login start, got packet {packet[0]}")
+        player_name, _ = decode_string(packet[1], 0)
+
+        state = self._get_state(self.config)
+        if state == "sleeping":
+            self._request_start(player_name)
+
+        if self._proxy:
+            # The client gives up after about 30 seconds without an answer, a short start is waited for
+            start_time = time.monotonic()
+            await server_state_service.wait_for_mc_server_start(self.config, PROXY_HOLD_SECONDS)
+            WAKE_LISTENER_HOLD_SECONDS.observe(time.monotonic() - start_time, host=self.config.HOST_SERVER_NAME)
+            if await self._forward_if_running(writer, received):
+                return
+            state = self._get_state(self.config)
+
+        message = {"text": LH(f"other.wake_listener.disconnect.{state}")}
+        writer.write(encode_packet(_LOGIN_DISCONNECT_ID, encode_string(json.dumps(message))))
+        await writer.drain()
+
+    async def _forward_if_running(self, writer: asyncio.StreamWriter, received: bytes) -> bool:
+        """
+        Forwards the connection to the MC server until one side closes it, if the proxy is on and it is running.
+        """
+
+        if not self._proxy or self._get_state(self.config) != "running":
+            return False
+
+        loop = asyncio.get_running_loop()
+        host, port = get_mc_server_address(self.config)
+        try:
+            async with asyncio.timeout(READ_TIMEOUT_SECONDS):
+                family, kind, proto, _, address = (await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))[0]
+                server = socket.socket(family, kind, proto)
+                server.setblocking(False)
+                try:
+                    await loop.sock_connect(server, address)
+                except BaseException:
+                    server.close()
+                    raise
+        except (OSError, TimeoutError) as e:
+            log.warning(f"Could not connect to MC server of host server '{self.config.HOST_SERVER_NAME}' | {e!r}")
+            return False
+
+        # The transport of the client stops reading and the bytes are forwarded from a duplicate of its socket,
+        # because the event loop allows no other reader on the socket of a transport
+        writer.transport.pause_reading()  # type: ignore
+        client = socket.socket(fileno=os.dup(writer.get_extra_info("socket").fileno()))
+        client.setblocking(False)
+        for sock in (client, server):
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        PROXY_CONNECTIONS.inc(host=self.config.HOST_SERVER_NAME)
+        tasks = [asyncio.create_task(_forward(client, server)), asyncio.create_task(_forward(server, client))]
+        try:
+            await loop.sock_sendall(server, received)
+            # The connection ends when one side closes it
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            PROXY_CONNECTIONS.inc(-1, host=self.config.HOST_SERVER_NAME)
+            client.close()
+            server.close()
+        return True
+
+    def _request_start(self, player_name: str) -> None:
+        # A burst of logins starts the server only once
+        if self._start_task and not self._start_task.done():
+            return
+        now = time.monotonic()
+        if self._last_start_time is not None and now - self._last_start_time < START_DEBOUNCE_SECONDS:
+            return
+
+        log.info(f"Player '{player_name}' tried to join host server '{self.config.HOST_SERVER_NAME}', starting it")
+        WAKE_LISTENER_STARTS.inc(host=self.config.HOST_SERVER_NAME)
+        self._last_start_time = now
+        self._start_task = asyncio.create_task(self._run_on_login(player_name))
+
+    async def _run_on_login(self, player_name: str) -> None:
+        try:
+            await self._on_login(self.config, player_name)
+        except Exception as e:
+            log.error(f"Start of host server '{self.config.HOST_SERVER_NAME}' for a login failed", exc_info=e)
@@ -6,6 +6,8 @@ from pydantic import BaseModel
 
 from somnus.config import CONFIG, Config
 from somnus.logger import log
+from somnus.logic import stage_history
+from somnus.logic.data_file import DataFileCache
 
 WORLD_SELECTOR_CONFIG_FILE_PATH = "data/world_selector_data.json"
 
@@ -18,6 +20,8 @@ class WorldSelectorWorld(BaseModel):
     display_name: str
     start_cmd: str
     visible: bool
+    # None is the host server from the `HOST_SERVER_*` variables
+    host: str | None = None
 
 
 class WorldSelectorConfig(BaseModel):
@@ -26,6 +30,26 @@ class WorldSelectorConfig(BaseModel):
     worlds: list[WorldSelectorWorld]
 
 
+class _WorldSelectorCache(DataFileCache[WorldSelectorConfig]):
+    """
+    The world selector file can be edited by hand, so it is read again when it changed.
+    The worlds are indexed by their name for the lookups.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(watch_file=True)
+        self.worlds_by_name: dict[str, WorldSelectorWorld] = {}
+
+    def set(self, path: str, value: WorldSelectorConfig) -> None:
+        super().set(path, value)
+        self.worlds_by_name = {}
+        for world in value.worlds:
+            self.worlds_by_name.setdefault(world.display_name, world)
+
+
+_cache = _WorldSelectorCache()
+
+
 async def get_current_world() -> WorldSelectorWorld:
     world_selector_config = await get_world_selector_config()
 
@@ -36,18 +60,25 @@ async def get_current_world() -> WorldSelectorWorld:
     return current_world
 
 
-async def create_new_world(display_name: str, start_cmd: str, visible: bool) -> None:
-    new_world = WorldSelectorWorld(display_name=display_name, start_cmd=start_cmd, visible=visible)
+async def create_new_world(display_name: str, start_cmd: str, visible: bool, host: str | None = None) -> None:
+    """
+    Raises:
+        UserInputError: If the display name is already in use or the host server doesn't exist
+    """
 
-    world_selector_config = await get_world_selector_config()
+    new_world = WorldSelectorWorld(display_name=display_name, start_cmd=start_cmd, visible=visible, host=host or None)
+    get_host_config(new_world)
 
-    if await _world_exists(display_name, world_selector_config):
-        text = f"New World {display_name} couldn't be created because the display name is already in use"
-        log.debug(text)
-        raise UserInputError(text)
+    async with _cache.write_lock:
+        world_selector_config = await _get_world_selector_config_for_update()
 
-    world_selector_config.worlds.append(new_world)
-    await _save_world_selector_config(world_selector_config)
+        if await _world_exists(display_name, world_selector_config):
+            text = f"New World {display_name} couldn't be created because the display name is already in use"
+            log.debug(text)
+            raise UserInputError(text)
+
+        world_selector_config.worlds.append(new_world)
+        await _save_world_selector_config(world_selector_config)
 
 
 async def _world_exists(display_name: str, world_selector_config: WorldSelectorConfig) -> bool:
@@ -59,26 +90,28 @@ async def _world_exists(display_name: str, world_selector_config: WorldSelectorC
 
 
 async def change_world() -> None:
-    world_selector_config = await get_world_selector_config()
+    async with _cache.write_lock:
+        world_selector_config = await _get_world_selector_config_for_update()
 
-    # Check if world is existing
-    if world_selector_config.new_selected_world != "":
-        for world in world_selector_config.worlds:
-            if world.display_name == world_selector_config.new_selected_world and world.visible:
-                world_selector_config.current_world = world_selector_config.new_selected_world
-                world_selector_config.new_selected_world = ""
-                await _save_world_selector_config(world_selector_config)
-                return
-        log.error(f"change world to '{world_selector_config.new_selected_world}' failed - world does not exist")
+        # Check if world is existing
+        if world_selector_config.new_selected_world != "":
+            for world in world_selector_config.worlds:
+                if world.display_name == world_selector_config.new_selected_world and world.visible:
+                    world_selector_config.current_world = world_selector_config.new_selected_world
+                    world_selector_config.new_selected_world = ""
+                    await _save_world_selector_config(world_selector_config)
+                    return
+            log.error(f"change world to '{world_selector_config.new_selected_world}' failed - world does not exist")
 
 
 async def select_new_world(new_world_name: str) -> None:
-    world_selector_config = await get_world_selector_config()
-    if world_selector_config.current_world == new_world_name:
-        world_selector_config.new_selected_world = ""
-    else:
-        world_selector_config.new_selected_world = new_world_name
-    await _save_world_selector_config(world_selector_config)
+    async with _cache.write_lock:
+        world_selector_config = await _get_world_selector_config_for_update()
+        if world_selector_config.current_world == new_world_name:
+            world_selector_config.new_selected_world = ""
+        else:
+            world_selector_config.new_selected_world = new_world_name
+        await _save_world_selector_config(world_selector_config)
 
 
 async def edit_new_world(
@@ -86,29 +119,37 @@ async def edit_new_world(
     new_display_name: str | None,
     start_cmd: str | None,
     visible: bool | None,
+    host: str | None = None,
 ) -> WorldSelectorWorld:
     """
     Raises
-        UserInputError: If the world to edit doesn't exist
+        UserInputError: If the world to edit or the new host server doesn't exist
     """
 
-    world_selector_config = await get_world_selector_config()
-
-    for i, world in enumerate(world_selector_config.worlds):
-        if world.display_name == editing_world_name:
-            if new_display_name not in ("", None):
-                world_selector_config.worlds[i].display_name = new_display_name
-                if world_selector_config.current_world == editing_world_name:
-                    world_selector_config.current_world = new_display_name
-            if start_cmd not in ("", None):
-                world_selector_config.worlds[i].start_cmd = start_cmd
-            if visible not in ("", None):
-                world_selector_config.worlds[i].visible = visible
+    async with _cache.write_lock:
+        world_selector_config = await _get_world_selector_config_for_update()
+
+        edited_world = await get_world_by_name(editing_world_name, world_selector_config)
+        if new_display_name not in ("", None):
+            edited_world.display_name = new_display_name
+            if world_selector_config.current_world == editing_world_name:
+                world_selector_config.current_world = new_display_name
+        if start_cmd not in ("", None):
+            edited_world.start_cmd = start_cmd
+        if visible not in ("", None):
+            edited_world.visible = visible
+        if host not in ("", None):
+            edited_world.host = host
+            get_host_config(edited_world)
 
-            await _save_world_selector_config(world_selector_config)
-            return world_selector_config.worlds[i]
+        await _save_world_selector_config(world_selector_config)
 
-    raise UserInputError(f"World '{editing_world_name}' not found")
+    # The stage timings follow a renamed world, but don't fit anymore if it is started differently
+    if edited_world.display_name != editing_world_name:
+        await stage_history.rename_world(editing_world_name, edited_world.display_name)
+    if start_cmd not in ("", None) or host not in ("", None):
+        await stage_history.delete_world(edited_world.display_name)
+    return edited_world
 
 
 async def try_delete_world(display_name: str) -> bool:
@@ -120,32 +161,87 @@ async def try_delete_world(display_name: str) -> bool:
 
 
 async def _delete_world(display_name: str) -> None:
-    world_selector_config = await get_world_selector_config()
+    async with _cache.write_lock:
+        world_selector_config = await _get_world_selector_config_for_update()
 
-    for i, world in enumerate(world_selector_config.worlds):
-        if world.display_name == display_name:
-            del world_selector_config.worlds[i]
-            log.debug(f"world '{display_name}' deleted succesfully")
-            break
+        for i, world in enumerate(world_selector_config.worlds):
+            if world.display_name == display_name:
+                del world_selector_config.worlds[i]
+                log.debug(f"world '{display_name}' deleted succesfully")
+                break
 
-    await _save_world_selector_config(world_selector_config)
+        await _save_world_selector_config(world_selector_config)
+    await stage_history.delete_world(display_name)
 
 
 async def get_world_by_name(display_name: str, world_selector_config: WorldSelectorConfig) -> WorldSelectorWorld:
-    found_worlds = [world for world in world_selector_config.worlds if world.display_name == display_name]
-    if len(found_worlds) == 0:
+    """
+    Raises:
+        UserInputError: If no world with this display name exists
+    """
+
+    if world_selector_config is _cache.value:
+        world = _cache.worlds_by_name.get(display_name)
+    else:
+        world = next((world for world in world_selector_config.worlds if world.display_name == display_name), None)
+
+    if world is None:
         raise UserInputError(f"World '{display_name}' not found")
-    return found_worlds[0]
+    return world
+
+
+def get_host_config(world: WorldSelectorWorld, config: Config = CONFIG) -> Config:
+    """
+    Returns the config to run actions on the host server of the world.
+
+    Raises:
+        UserInputError: If the host server of the world doesn't exist
+    """
+
+    try:
+        return config.for_host(world.host or config.HOST_SERVER_NAME)
+    except KeyError as e:
+        raise UserInputError(f"Host server '{world.host}' of world '{world.display_name}' not found") from e
+
+
+async def get_world_name_for_host(config: Config) -> str:
+    """
+    Name to show for the host server of `config`: the current world if it belongs to this host, otherwise the host name.
+    """
+
+    current_world = await get_current_world()
+    if (current_world.host or CONFIG.HOST_SERVER_NAME) == config.HOST_SERVER_NAME:
+        return current_world.display_name
+    return config.HOST_SERVER_NAME
 
 
 async def get_world_selector_config() -> WorldSelectorConfig:
+    """
+    The returned config is shared with all other callers and must not be changed.
+    """
+
+    cached_config = _cache.get(WORLD_SELECTOR_CONFIG_FILE_PATH)
+    if cached_config is not None:
+        return cached_config
+
     try:
         world_selector_config = await _get_world_selector_config_from_path(WORLD_SELECTOR_CONFIG_FILE_PATH)
+        _cache.set(WORLD_SELECTOR_CONFIG_FILE_PATH, world_selector_config)
         return world_selector_config
-    except Exception:
-        world_selector_config = _get_default_world_selector_config()
-        await _save_world_selector_config(world_selector_config)
-        return world_selector_config
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.error(f"Could not read '{WORLD_SELECTOR_CONFIG_FILE_PATH}', resetting it to the default", exc_info=e)
+
+    # Not under the write lock, which the changing callers already hold, a missing file is written the same by all
+    world_selector_config = _get_default_world_selector_config()
+    await _save_world_selector_config(world_selector_config)
+    return world_selector_config
+
+
+async def _get_world_selector_config_for_update() -> WorldSelectorConfig:
+    world_selector_config = await get_world_selector_config()
+    return world_selector_config.model_copy(deep=True)
 
 
 async def _get_world_selector_config_from_path(path: str) -> WorldSelectorConfig:
@@ -174,6 +270,4 @@ def _get_default_world_selector_config(config: Config = CONFIG) -> WorldSelector
 
 
 async def _save_world_selector_config(data: WorldSelectorConfig) -> None:
-    os.makedirs("data", exist_ok=True)
-    async with aiofiles.open(WORLD_SELECTOR_CONFIG_FILE_PATH, "w", encoding="utf-8") as file:
-        await file.write(json.dumps(data.model_dump(), indent=4))
+    await _cache.save(WORLD_SELECTOR_CONFIG_FILE_PATH, data, json.dumps(data.model_dump(), indent=4))
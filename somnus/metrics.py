@@ -0,0 +1,205 @@
+import asyncio
+import math
+from typing import TypeVar
+
+from somnus.logger import log
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DURATION_BUCKETS = (1, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600, 1200)
+
+_LabelValues = tuple[str, ...]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+
+    def _get_label_values(self, labels: dict[str, object]) -> _LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric '{self.name}' needs the labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, label_values: _LabelValues, extra_labels: dict[str, str] | None = None) -> str:
+        labels = dict(zip(self.label_names, label_values))
+        labels.update(extra_labels or {})
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, description, label_names)
+        self._values: dict[_LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        label_values = self._get_label_values(labels)
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{self._format_labels(label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, description, label_names)
+        self._values: dict[_LabelValues, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._get_label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        label_values = self._get_label_values(labels)
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{self._format_labels(label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts: dict[_LabelValues, list[int]] = {}
+        self._sums: dict[_LabelValues, float] = {}
+        self._counts: dict[_LabelValues, int] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        label_values = self._get_label_values(labels)
+        bucket_counts = self._bucket_counts.setdefault(label_values, [0] * len(self.buckets))
+        for i, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                bucket_counts[i] += 1
+        self._sums[label_values] = self._sums.get(label_values, 0) + value
+        self._counts[label_values] = self._counts.get(label_values, 0) + 1
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, bucket_counts in self._bucket_counts.items():
+            for bucket, count in zip(self.buckets, bucket_counts):
+                labels = self._format_labels(label_values, {"le": _format_value(bucket)})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            count = self._counts[label_values]
+            lines.append(f"{self.name}_bucket{self._format_labels(label_values, {'le': '+Inf'})} {count}")
+            lines.append(
+                f"{self.name}_sum{self._format_labels(label_values)} {_format_value(self._sums[label_values])}"
+            )
+            lines.append(f"{self.name}_count{self._format_labels(label_values)} {count}")
+        return lines
+
+
+_MetricT = TypeVar("_MetricT", bound=_Metric)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, description, label_names))
+
+    def gauge(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, description, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text format.
+        """
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _MetricT) -> _MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+async def start_metrics_server(host: str, port: int, registry: MetricsRegistry | None = None) -> asyncio.Server:
+    """
+    Serves the metrics under `/metrics` over HTTP.
+    """
+
+    registry = registry or metrics
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip the headers, the request has no body
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":  # noqa: PLR2004
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (OSError, TimeoutError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    log.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from somnus.actions.console_log import (
+    ChatMessage,
+    PlayerJoined,
+    PlayerLeft,
+    PlayerList,
+    ScreenTerminated,
+    ServerCrashed,
+    ServerDone,
+    ServerStopping,
+    SpawnProgress,
+    StageReached,
+    parse_console_line,
+    read_console_events,
+)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (
+            "[12:00:00] [main/INFO]: ModLauncher running: args [--launchTarget, forgeserver]",
+            StageReached(stage="loading"),
+        ),
+        ("[12:00:01] [Server thread/INFO]: Starting minecraft server version 1.20.1", StageReached(stage="starting")),
+        ('[12:00:02] [Server thread/INFO]: Preparing level "world"', StageReached(stage="preparing_level")),
+        ("[12:00:03] [Worker-Main-4/INFO]: Preparing spawn area: 83%", SpawnProgress(percent=83)),
+        ('[12:00:04] [Server thread/INFO]: Done (12.345s)! For help, type "help"', ServerDone(startup_seconds=12.345)),
+        ("\x1b[32m[12:00:04] [Server thread/INFO]: Done (3,5s)!\x1b[0m", ServerDone(startup_seconds=3.5)),
+        ("bash: ./run.sh: command not found", ServerCrashed(line="bash: ./run.sh: command not found")),
+        ("[12:00:05] [Server thread/INFO]: Player joined the game", PlayerJoined(player_name="Player")),
+        ("[12:00:06 INFO]: Steve (formerly known as Bob) joined the game", PlayerJoined(player_name="Steve")),
+        (
+            "[18Oct2026 12:00:07.123] [Server thread/INFO] [minecraft/MinecraftServer]: .Alex left the game",
+            PlayerLeft(player_name=".Alex"),
+        ),
+        (
+            "[12:00:08] [Server thread/INFO]: [Not Secure] <Steve> Bob left the game",
+            ChatMessage(player_name="Steve", message="Bob left the game"),
+        ),
+        (
+            "[12:00:09] [Server thread/INFO]: <Steve> Done (1.0s)!",
+            ChatMessage(player_name="Steve", message="Done (1.0s)!"),
+        ),
+        (
+            "[12:00:10] [Server thread/INFO]: There are 2 of a max of 20 players online: Steve, Alex",
+            PlayerList(online=2, max=20, names=["Steve", "Alex"]),
+        ),
+        ("[12:00:11] [Server thread/INFO]: Stopping server", ServerStopping()),
+        ("[12:00:12] [Server thread/INFO]: Steve lost connection: Disconnected", None),
+        ("[screen is terminating]", ScreenTerminated()),
+        (
+            "[12:00:13] [Server thread/INFO]: <Steve> [screen is terminating]",
+            ChatMessage(player_name="Steve", message="[screen is terminating]"),
+        ),
+    ],
+)
+def test_parse_console_line(line: str, expected: object) -> None:
+    assert parse_console_line(line) == expected
+
+
+class FakeTransport:
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+
+    async def readline(self, timeout: float) -> str:  # noqa: ASYNC109
+        if not self.lines:
+            raise TimeoutError
+        return self.lines.pop(0)
+
+
+def test_read_console_events_skips_unknown_lines() -> None:
+    async def run() -> list[object]:
+        transport = FakeTransport(["noise", "Preparing level", "more noise", "Done (1.0s)!"])
+        events = []
+        async for event in read_console_events(transport, 1):  # type: ignore
+            events.append(event)
+            if isinstance(event, ServerDone):
+                break
+        return events
+
+    assert asyncio.run(run()) == [StageReached(stage="preparing_level"), ServerDone(startup_seconds=1.0)]
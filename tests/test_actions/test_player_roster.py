@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+from somnus.actions import player_roster, state_service
+from somnus.actions.console_log import PlayerJoined, PlayerLeft, PlayerList
+from somnus.actions.player_roster import PlayerRoster
+from somnus.actions.stats import PlayerStats, ServerState
+from somnus.config import Config
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+MAX_PLAYERS = 20
+PREFIX = "[12:00:00] [Server thread/INFO]: "
+
+
+class FakeTransport:
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+
+    async def readline(self, timeout: float) -> str:  # noqa: ASYNC109
+        if not self.lines:
+            raise EOFError
+        line = self.lines.pop(0)
+        if line == "quiet":
+            raise TimeoutError
+        return line
+
+
+class FakeSession(FakeTransport):
+    def __init__(self, lines: list[str]) -> None:
+        super().__init__(lines)
+        self.stopped_following = False
+
+    def is_alive(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def logins(monkeypatch: pytest.MonkeyPatch) -> list[FakeSession]:
+    sessions = []
+
+    async def fake_ssh_login(config: Config, attempts: int | None = None) -> FakeSession:
+        session = FakeSession([PREFIX + "There are 0 of a max of 20 players online:", PREFIX + "Stopping the server"])
+        sessions.append(session)
+        return session
+
+    async def fake_follow_screen_log(ssh: FakeSession) -> bool:
+        return True
+
+    async def fake_stop_following_screen_log(ssh: FakeSession) -> None:
+        ssh.stopped_following = True
+
+    monkeypatch.setattr(player_roster, "ssh_login", fake_ssh_login)
+    monkeypatch.setattr(player_roster, "follow_screen_log", fake_follow_screen_log)
+    monkeypatch.setattr(player_roster, "stop_following_screen_log", fake_stop_following_screen_log)
+    return sessions
+
+
+def _observe(roster: PlayerRoster, *mc_server_running: bool) -> None:
+    async def run() -> None:
+        for running in mc_server_running:
+            roster.observe(TEST_CONFIG, running)
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+
+def _follow(roster: PlayerRoster, lines: list[str]) -> None:
+    async def run() -> None:
+        await roster.follow(TEST_CONFIG, FakeTransport(lines))  # type: ignore
+
+    asyncio.run(run())
+
+
+def test_roster_is_known_after_list_and_publishes_joins_and_leaves() -> None:
+    roster = PlayerRoster()
+    events: list[tuple[PlayerJoined | PlayerLeft, list[str]]] = []
+    roster.subscribe(lambda config, event, players: events.append((event, players.names)))
+
+    with pytest.raises(EOFError):
+        _follow(
+            roster,
+            [
+                # Before the answer to `list` the roster is unknown and nothing is published
+                PREFIX + "Alex joined the game",
+                PREFIX + "There are 1 of a max of 20 players online: Steve",
+                "quiet",
+                PREFIX + "Alex joined the game",
+                PREFIX + "<Herobrine> hi",
+                PREFIX + "Steve left the game",
+                PREFIX + "Alex left the game",
+            ],
+        )
+
+    assert events == [
+        (PlayerJoined(player_name="Alex"), ["Steve", "Alex"]),
+        (PlayerJoined(player_name="Herobrine"), ["Steve", "Alex", "Herobrine"]),
+        (PlayerLeft(player_name="Steve"), ["Alex", "Herobrine"]),
+        (PlayerLeft(player_name="Alex"), ["Herobrine"]),
+    ]
+    assert roster.get_players(TEST_CONFIG) == PlayerStats(online=1, max=MAX_PLAYERS, names=["Herobrine"])
+
+
+def test_stopping_server_ends_following() -> None:
+    roster = PlayerRoster()
+    lines = [PREFIX + "There are 0 of a max of 20 players online:", PREFIX + "Stopping the server", "not read"]
+
+    _follow(roster, lines)
+
+    assert lines == ["not read"]
+
+
+def test_stopping_server_is_only_followed_again_after_it_stopped(logins: list[FakeSession]) -> None:
+    roster = PlayerRoster()
+
+    _observe(roster, True, True)
+    assert len(logins) == 1
+    assert logins[0].stopped_following
+
+    _observe(roster, False, True)
+    assert len(logins) == 2  # noqa: PLR2004
+
+
+def test_failed_following_is_retried_later(monkeypatch: pytest.MonkeyPatch) -> None:
+    logins = []
+
+    async def fake_ssh_login(config: Config, attempts: int | None = None) -> None:
+        logins.append(1)
+        raise ValueError("host key changed")
+
+    monkeypatch.setattr(player_roster, "ssh_login", fake_ssh_login)
+    roster = PlayerRoster()
+
+    _observe(roster, True, True)
+
+    assert len(logins) == 1
+
+
+def test_players_come_from_the_roster_without_probing(monkeypatch: pytest.MonkeyPatch) -> None:
+    probes = []
+
+    async def fake_get_server_state(config: Config) -> ServerState:
+        probes.append(1)
+        return ServerState(
+            host_server_running=True, mc_server_running=True, players=PlayerStats(online=1, max=MAX_PLAYERS, names=[])
+        )
+
+    monkeypatch.setattr(state_service, "get_server_state", fake_get_server_state)
+    roster = PlayerRoster()
+    monkeypatch.setattr(state_service, "player_roster", roster)
+    service = state_service.ServerStateService()
+
+    async def run() -> tuple[PlayerStats | None, PlayerStats | None]:
+        probed = await service.get_players(TEST_CONFIG)
+        roster.apply(TEST_CONFIG, PlayerJoined(player_name="Steve"))
+        roster.apply(TEST_CONFIG, PlayerList(online=1, max=MAX_PLAYERS, names=["Steve"]))
+        return probed, await service.get_players(TEST_CONFIG)
+
+    probed, followed = asyncio.run(run())
+
+    assert probed == PlayerStats(online=1, max=MAX_PLAYERS, names=[])
+    assert followed == PlayerStats(online=1, max=MAX_PLAYERS, names=["Steve"])
+    assert len(probes) == 1
@@ -0,0 +1,136 @@
+import asyncio
+import struct
+
+import pytest
+
+from somnus.actions.rcon import RconError, RconPool, parse_list_answer
+from somnus.actions.stop_mc import stop_mc_server_with_rcon
+from somnus.config import Config
+
+PASSWORD = "secret"  # noqa: S105
+LONG_ANSWER = "x" * 10000
+LOGIN_TYPE = 3
+COMMAND_TYPE = 2
+# Like the stop over the screen session
+STOP_STEPS = 5
+
+
+class FakeRconServer:
+    """
+    Answers like a vanilla server: long answers are split into packets of 4096 bytes and requests of an unknown type
+    are answered with a single packet.
+    """
+
+    def __init__(self) -> None:
+        self.logins = 0
+        self.writers: list[asyncio.StreamWriter] = []
+        self.server: asyncio.Server | None = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def drop_connections(self) -> None:
+        for writer in self.writers:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.append(writer)
+        try:
+            while True:
+                (length,) = struct.unpack("<i", await reader.readexactly(4))
+                body = await reader.readexactly(length)
+                request_id, packet_type = struct.unpack("<ii", body[:8])
+                payload = body[8:-2].decode()
+
+                if packet_type == LOGIN_TYPE:
+                    self.logins += 1
+                    _write_packet(writer, request_id if payload == PASSWORD else -1, 2, "")
+                elif packet_type == COMMAND_TYPE:
+                    answer = {"list": "There are 2 of a max of 20 players online: Steve, Alex", "long": LONG_ANSWER}
+                    text = answer.get(payload, "Stopping the server" if payload == "stop" else "")
+                    for i in range(0, max(len(text), 1), 4096):
+                        _write_packet(writer, request_id, 0, text[i : i + 4096])
+                    if payload == "stop":
+                        await writer.drain()
+                        await asyncio.sleep(0.1)
+                        writer.close()
+                        return
+                else:
+                    _write_packet(writer, request_id, 0, f"Unknown request {packet_type}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+def _write_packet(writer: asyncio.StreamWriter, request_id: int, packet_type: int, payload: str) -> None:
+    body = struct.pack("<ii", request_id, packet_type) + payload.encode() + b"\x00\x00"
+    writer.write(struct.pack("<i", len(body)) + body)
+
+
+def _get_config(port: int, password: str = PASSWORD) -> Config:
+    return Config(
+        MC_SERVER_START_CMD="",
+        DISCORD_TOKEN="a",  # noqa: S106
+        HOST_SERVER_HOST="127.0.0.1",
+        HOST_SERVER_PASSWORD="root",  # noqa: S106
+        HOST_SERVER_USER="root",
+        MC_SERVER_ADDRESS="127.0.0.1:25565",
+        MC_SERVER_RCON_PORT=port,
+        MC_SERVER_RCON_PASSWORD=password,
+    )
+
+
+def test_commands_share_one_connection_and_long_answers_are_joined() -> None:
+    async def run() -> None:
+        server = FakeRconServer()
+        config = _get_config(await server.start())
+        pool = RconPool()
+
+        assert parse_list_answer(await pool.command(config, "list")) == (2, 20, ["Steve", "Alex"])
+        assert await pool.command(config, "long") == LONG_ANSWER
+        assert server.logins == 1
+
+        # A connection that was closed while idle is replaced
+        server.drop_connections()
+        await asyncio.sleep(0.05)
+        assert await pool.command(config, "long") == LONG_ANSWER
+        assert server.logins == 2  # noqa: PLR2004
+        pool.close_all()
+
+    asyncio.run(run())
+
+
+def test_wrong_password_and_unreachable_server_raise() -> None:
+    async def run() -> None:
+        server = FakeRconServer()
+        port = await server.start()
+        pool = RconPool()
+
+        with pytest.raises(RconError, match="login failed"):
+            await pool.command(_get_config(port, "wrong"), "list")
+
+        server.server.close()  # type: ignore
+        await server.server.wait_closed()  # type: ignore
+        with pytest.raises(RconError):
+            await pool.command(_get_config(port), "list")
+
+    asyncio.run(run())
+
+
+def test_stop_waits_until_the_server_closes_the_connection() -> None:
+    async def run() -> int:
+        server = FakeRconServer()
+        config = _get_config(await server.start())
+        steps = 0
+        async for _ in stop_mc_server_with_rcon(config):
+            steps += 1
+        return steps
+
+    assert asyncio.run(run()) == STOP_STEPS
+
+
+def test_list_answers_of_different_servers_are_parsed() -> None:
+    assert parse_list_answer("There are 0 of a max of 20 players online: ") == (0, 20, [])
+    assert parse_list_answer("There are 1/10 players online:\nSteve") == (1, 10, ["Steve"])
+    assert parse_list_answer("Unknown command") is None
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from somnus.actions import ssh
+from somnus.actions.ssh_transport import SSHTransport
+from somnus.config import Config
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self) -> bool:
+        return self.alive and not self.closed
+
+    async def sendline(self, line: str) -> None:
+        pass
+
+    async def expect(self, pattern: str, timeout: float) -> int:  # noqa: ASYNC109
+        if not self.alive:
+            raise EOFError
+        return 0
+
+    async def prompt(self, timeout: float) -> bool:  # noqa: ASYNC109
+        return self.alive
+
+    async def logout(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def logins(monkeypatch: pytest.MonkeyPatch) -> list[FakeSession]:
+    sessions = []
+
+    async def fake_ssh_login(config: Config, attempts: int | None = None) -> FakeSession:
+        session = FakeSession()
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr(ssh, "ssh_login", fake_ssh_login)
+    return sessions
+
+
+async def _lease_once(pool: ssh.SSHSessionPool) -> SSHTransport:
+    async with pool.lease(TEST_CONFIG) as session:
+        return session
+
+
+def test_pool_reuses_healthy_session(logins: list[FakeSession]) -> None:
+    pool = ssh.SSHSessionPool()
+
+    first = asyncio.run(_lease_once(pool))
+    second = asyncio.run(_lease_once(pool))
+
+    assert first is second
+    assert len(logins) == 1
+
+
+def test_pool_reconnects_dead_session(logins: list[FakeSession]) -> None:
+    pool = ssh.SSHSessionPool()
+
+    first = asyncio.run(_lease_once(pool))
+    logins[0].alive = False
+    second = asyncio.run(_lease_once(pool))
+
+    assert logins[0].closed
+    assert logins == [first, second]
+
+
+def test_pool_drops_session_after_error(logins: list[FakeSession]) -> None:
+    pool = ssh.SSHSessionPool()
+
+    async def fail() -> None:
+        async with pool.lease(TEST_CONFIG):
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(fail())
+    session = asyncio.run(_lease_once(pool))
+
+    assert logins[0].closed
+    assert logins[1] is session
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from somnus.actions.ssh_transport import AsyncSSHTransport
+
+
+class FakeStdin:
+    def __init__(self) -> None:
+        self.written = ""
+
+    def write(self, data: str) -> None:
+        self.written += data
+
+
+class FakeStdout:
+    def __init__(self) -> None:
+        self.chunks: asyncio.Queue[str] = asyncio.Queue()
+
+    async def read(self, n: int) -> str:
+        return await self.chunks.get()
+
+
+class FakeProcess:
+    def __init__(self) -> None:
+        self.stdin = FakeStdin()
+        self.stdout = FakeStdout()
+
+    def close(self) -> None:
+        pass
+
+
+def test_expect_returns_earliest_match_and_before() -> None:
+    async def run() -> None:
+        process = FakeProcess()
+        transport = AsyncSSHTransport(None, process)  # type: ignore
+
+        process.stdout.chunks.put_nowait("[12:00:00] Starting minecraft")
+        process.stdout.chunks.put_nowait(" server\r\n[12:00:05] Done (5.0s)!")
+
+        assert await transport.expect(["Done", "Starting"], timeout=1) == 1
+        assert transport.before == "[12:00:00] "
+        assert await transport.expect(["Done", "Starting"], timeout=1) == 0
+        assert transport.before == " minecraft server\r\n[12:00:05] "
+
+        transport.close()
+
+    asyncio.run(run())
+
+
+def test_expect_times_out_and_detects_eof() -> None:
+    async def run() -> None:
+        process = FakeProcess()
+        transport = AsyncSSHTransport(None, process)  # type: ignore
+
+        with pytest.raises(TimeoutError):
+            await transport.expect("Done", timeout=0.05)
+        assert not await transport.prompt(timeout=0.05)
+
+        process.stdout.chunks.put_nowait("")
+        with pytest.raises(EOFError):
+            await transport.expect("Done", timeout=1)
+        assert not transport.is_alive()
+
+    asyncio.run(run())
+
+
+def test_sendline_and_sendcontrol() -> None:
+    async def run() -> None:
+        process = FakeProcess()
+        transport = AsyncSSHTransport(None, process)  # type: ignore
+
+        await transport.sendline("stop")
+        await transport.sendcontrol("a")
+
+        assert process.stdin.written == "stop\n\x01"
+        transport.close()
+
+    asyncio.run(run())
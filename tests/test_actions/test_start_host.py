@@ -0,0 +1,99 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from somnus.actions import start_host
+from somnus.actions.start_host import start_host_server
+from somnus.config import Config
+
+MAC = "aa:bb:cc:dd:ee:ff"
+BOOT_SECONDS = 0.3
+# Far below the first readiness probe of the fixed 50 second Wake On Lan schedule from before
+MAX_START_SECONDS = 2
+
+
+def _get_config(ssh_port: int) -> Config:
+    return Config(
+        MC_SERVER_START_CMD="",
+        DISCORD_TOKEN="a",  # noqa: S106
+        HOST_SERVER_HOST="127.0.0.1",
+        HOST_SERVER_SSH_PORT=ssh_port,
+        HOST_SERVER_PASSWORD="root",  # noqa: S106
+        HOST_SERVER_USER="root",
+        HOST_SERVER_MAC=MAC,
+        HOST_SERVER_WOL_BROADCASTS=["127.0.0.1"],
+        MC_SERVER_ADDRESS="127.0.0.1:25565",
+    )
+
+
+def test_start_finishes_when_the_ssh_server_answers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(start_host, "READINESS_PROBE_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(start_host, "WOL_SEND_INTERVALS_SECONDS", (0.05,))
+
+    async def run() -> tuple[int, float, list[bytes]]:
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.setblocking(False)
+        monkeypatch.setattr(start_host, "WOL_PORT", receiver.getsockname()[1])
+
+        # Reserves a free port for the SSH server, which only starts listening after the host "booted"
+        with socket.socket() as reserved:
+            reserved.bind(("127.0.0.1", 0))
+            ssh_port = reserved.getsockname()[1]
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            writer.write(b"SSH-2.0-OpenSSH_9.6\r\n")
+            await writer.drain()
+            writer.close()
+
+        async def boot() -> asyncio.Server:
+            await asyncio.sleep(BOOT_SECONDS)
+            return await asyncio.start_server(handle, "127.0.0.1", ssh_port)
+
+        start_time = time.monotonic()
+        boot_task = asyncio.create_task(boot())
+        steps = 0
+        async for _ in start_host_server(_get_config(ssh_port)):
+            steps += 1
+        seconds = time.monotonic() - start_time
+
+        server = await boot_task
+        server.close()
+        packets = []
+        while True:
+            try:
+                packets.append(receiver.recv(1024))
+            except BlockingIOError:
+                break
+        receiver.close()
+        return steps, seconds, packets
+
+    steps, seconds, packets = asyncio.run(run())
+
+    assert steps == 1 + start_host.WAIT_STEPS
+    assert BOOT_SECONDS <= seconds < MAX_START_SECONDS
+    # Packets are sent while the readiness is probed
+    assert len(packets) > 1
+    assert packets[0][6:12] == bytes.fromhex(MAC.replace(":", ""))
+
+
+def test_every_broadcast_is_used_on_every_interface() -> None:
+    config = _get_config(22).model_copy(
+        update={
+            "HOST_SERVER_WOL_BROADCASTS": ["192.168.1.255", "10.0.0.255"],
+            "HOST_SERVER_WOL_INTERFACES": ["192.168.1.2", "10.0.0.2"],
+        }
+    )
+
+    assert start_host.get_wol_targets(config) == [
+        ("192.168.1.255", "192.168.1.2"),
+        ("10.0.0.255", "192.168.1.2"),
+        ("192.168.1.255", "10.0.0.2"),
+        ("10.0.0.255", "10.0.0.2"),
+    ]
+    assert start_host.get_wol_targets(config.model_copy(update={"HOST_SERVER_WOL_BROADCASTS": []}))[0] == (
+        start_host.DEFAULT_WOL_BROADCAST,
+        "192.168.1.2",
+    )
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from somnus.actions import state_service
+from somnus.actions.stats import ServerState
+from somnus.config import Config
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+
+
+@pytest.fixture
+def probes(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    calls = []
+
+    async def fake_get_server_state(config: Config) -> ServerState:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ServerState(host_server_running=True, mc_server_running=len(calls) % 2 == 1)
+
+    monkeypatch.setattr(state_service, "get_server_state", fake_get_server_state)
+    return calls
+
+
+def test_concurrent_callers_share_one_probe(probes: list[int]) -> None:
+    service = state_service.ServerStateService()
+
+    async def run() -> list[ServerState]:
+        return await asyncio.gather(*(service.get_state(TEST_CONFIG) for _ in range(5)))
+
+    states = asyncio.run(run())
+
+    assert len(probes) == 1
+    assert all(state is states[0] for state in states)
+
+
+def test_cached_state_is_served_until_too_old(probes: list[int]) -> None:
+    service = state_service.ServerStateService()
+
+    async def run() -> tuple[ServerState, ServerState, ServerState]:
+        first = await service.get_state(TEST_CONFIG)
+        cached = await service.get_state(TEST_CONFIG, max_age_seconds=60)
+        fresh = await service.get_state(TEST_CONFIG, max_age_seconds=0)
+        return first, cached, fresh
+
+    first, cached, fresh = asyncio.run(run())
+
+    assert cached is first
+    assert fresh is not first
+    assert len(probes) == len({id(first), id(fresh)})
+
+
+def test_invalidate_forces_new_probe(probes: list[int]) -> None:
+    service = state_service.ServerStateService()
+
+    async def run() -> tuple[ServerState, ServerState]:
+        first = await service.get_state(TEST_CONFIG)
+        service.invalidate(TEST_CONFIG)
+        return first, await service.get_state(TEST_CONFIG)
+
+    first, second = asyncio.run(run())
+
+    assert first.mc_server_running
+    assert not second.mc_server_running
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from somnus.actions import stats
+from somnus.actions.stats import HostProbeLevel, probe_host
+from somnus.config import Config
+
+
+def _get_config(port: int) -> Config:
+    return Config(
+        MC_SERVER_START_CMD="",
+        DISCORD_TOKEN="a",  # noqa: S106
+        HOST_SERVER_HOST="127.0.0.1",
+        HOST_SERVER_SSH_PORT=port,
+        HOST_SERVER_PASSWORD="root",  # noqa: S106
+        HOST_SERVER_USER="root",
+        MC_SERVER_ADDRESS="127.0.0.1:25565",
+    )
+
+
+async def _probe_fake_sshd(banner: bytes, level: HostProbeLevel) -> bool:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(banner)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        return await probe_host(_get_config(port), level)
+
+
+def test_probe_host_tcp_and_banner() -> None:
+    assert asyncio.run(_probe_fake_sshd(b"SSH-2.0-OpenSSH_9.6\r\n", HostProbeLevel.TCP))
+    assert asyncio.run(_probe_fake_sshd(b"SSH-2.0-OpenSSH_9.6\r\n", HostProbeLevel.BANNER))
+    assert not asyncio.run(_probe_fake_sshd(b"HTTP/1.1 400 Bad Request\r\n", HostProbeLevel.BANNER))
+
+
+def test_probe_host_closed_port() -> None:
+    async def probe_closed_port() -> bool:
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        return await probe_host(_get_config(port))
+
+    assert not asyncio.run(probe_closed_port())
+
+
+def test_get_server_state_returns_partial_state_after_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fast_probe_host(config: Config, level: HostProbeLevel) -> bool:
+        return True
+
+    async def hanging_get_mcstatus(config: Config) -> None:
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(stats, "probe_host", fast_probe_host)
+    monkeypatch.setattr(stats, "get_mcstatus", hanging_get_mcstatus)
+
+    state = asyncio.run(stats.get_server_state(_get_config(22), deadline_seconds=0.1))
+
+    assert state.host_server_running
+    assert not state.mc_server_running
+    assert state.probes["host"].success
+    assert not state.probes["host"].timed_out
+    assert state.probes["status"].timed_out
+    assert state.probes["status"].latency_seconds is None
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from somnus.actions.stats import ServerState
+from somnus.config import Config
+from somnus.discord_provider import heartbeat
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+
+
+def test_hanging_job_does_not_block_other_jobs() -> None:
+    calls = []
+
+    async def hanging() -> None:
+        calls.append("hanging")
+        await asyncio.sleep(10)
+
+    async def fast() -> None:
+        calls.append("fast")
+
+    async def run() -> None:
+        scheduler = heartbeat.PeriodicJobScheduler()
+        scheduler.add("hanging", hanging, 0.01, timeout_seconds=0.05)
+        scheduler.add("fast", fast, 0.01, timeout_seconds=1)
+        scheduler.start()
+        await asyncio.sleep(0.2)
+        scheduler.stop()
+
+    asyncio.run(run())
+
+    assert 1 < calls.count("hanging") < calls.count("fast")
+
+
+@pytest.mark.parametrize(
+    "server_state, expected_interval",
+    [
+        (None, heartbeat.BUSY_PROBE_INTERVAL_SECONDS),
+        (ServerState(host_server_running=False, mc_server_running=False), heartbeat.OFFLINE_PROBE_INTERVAL_SECONDS),
+        (ServerState(host_server_running=True, mc_server_running=False), heartbeat.HOST_ONLY_PROBE_INTERVAL_SECONDS),
+        (ServerState(host_server_running=True, mc_server_running=True), heartbeat.ONLINE_PROBE_INTERVAL_SECONDS),
+    ],
+)
+def test_probe_interval_follows_server_state(
+    monkeypatch: pytest.MonkeyPatch, server_state: ServerState | None, expected_interval: float
+) -> None:
+    monkeypatch.setattr(heartbeat.server_state_service, "peek", lambda config: server_state)
+
+    assert heartbeat.get_probe_interval(TEST_CONFIG) == expected_interval
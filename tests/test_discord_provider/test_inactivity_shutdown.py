@@ -0,0 +1,142 @@
+import asyncio
+
+from somnus.actions.stats import PlayerStats, ServerState
+from somnus.config import Config
+from somnus.discord_provider.inactivity_shutdown import IdleTracker, PowerLadder, PowerStep
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+IDLE_SECONDS = 0.1
+EMPTY = ServerState(host_server_running=True, mc_server_running=True, players=PlayerStats(online=0, max=20, names=[]))
+PLAYING = ServerState(
+    host_server_running=True, mc_server_running=True, players=PlayerStats(online=1, max=20, names=["Steve"])
+)
+STOPPED = ServerState(host_server_running=True, mc_server_running=False)
+REMOTE_CONFIG = TEST_CONFIG.model_copy(update={"HOST_SERVER_HOST": "192.168.1.2"})
+STEP_SECONDS = 0.05
+
+
+def _get_tracker(calls: list[str]) -> IdleTracker:
+    async def on_deadline(config: Config) -> None:
+        calls.append(config.HOST_SERVER_NAME)
+
+    return IdleTracker(on_deadline, lambda: IDLE_SECONDS)
+
+
+def test_deadline_fires_once_after_the_idle_time_however_often_it_is_probed() -> None:
+    calls = []
+
+    async def run() -> None:
+        tracker = _get_tracker(calls)
+        for _ in range(5):
+            tracker.observe(TEST_CONFIG, EMPTY)
+            await asyncio.sleep(IDLE_SECONDS / 10)
+        assert calls == []
+        await asyncio.sleep(IDLE_SECONDS)
+        assert calls == [TEST_CONFIG.HOST_SERVER_NAME]
+
+        # Stopped by the shutdown, the server is forgotten
+        tracker.observe(TEST_CONFIG, STOPPED)
+        await asyncio.sleep(IDLE_SECONDS * 2)
+
+    asyncio.run(run())
+
+    assert calls == [TEST_CONFIG.HOST_SERVER_NAME]
+
+
+def test_player_seen_cancels_and_reset_restarts_the_idle_time() -> None:
+    calls = []
+
+    async def run() -> None:
+        tracker = _get_tracker(calls)
+        tracker.observe(TEST_CONFIG, EMPTY)
+        await asyncio.sleep(IDLE_SECONDS / 2)
+        tracker.observe(TEST_CONFIG, PLAYING)
+        await asyncio.sleep(IDLE_SECONDS)
+        assert calls == []
+        assert tracker.get_deadline(TEST_CONFIG.HOST_SERVER_NAME) is None
+
+        tracker.observe(TEST_CONFIG, EMPTY)
+        first_deadline = tracker.get_deadline(TEST_CONFIG.HOST_SERVER_NAME)
+        await asyncio.sleep(IDLE_SECONDS / 2)
+        tracker.reset(TEST_CONFIG)
+        assert tracker.get_deadline(TEST_CONFIG.HOST_SERVER_NAME) > first_deadline  # type: ignore
+        await asyncio.sleep(IDLE_SECONDS * 0.7)
+        assert calls == []
+        await asyncio.sleep(IDLE_SECONDS * 0.5)
+        assert calls == [TEST_CONFIG.HOST_SERVER_NAME]
+
+    asyncio.run(run())
+
+
+def _get_ladder(
+    calls: list[tuple[PowerStep, bool]], step_seconds: dict[PowerStep, float], fail: bool = False
+) -> PowerLadder:
+    async def on_step(config: Config, step: PowerStep, suspended: bool) -> bool:
+        calls.append((step, suspended))
+        if fail and step == "suspend":
+            raise OSError("suspend is not supported")
+        return True
+
+    return PowerLadder(on_step, lambda: step_seconds)
+
+
+def test_host_is_suspended_and_then_powered_off() -> None:
+    calls = []
+
+    async def run() -> None:
+        ladder = _get_ladder(calls, {"suspend": STEP_SECONDS, "power off": STEP_SECONDS * 2})
+        ladder.mc_stopped(REMOTE_CONFIG)
+        ladder.observe(REMOTE_CONFIG, STOPPED)
+        await asyncio.sleep(STEP_SECONDS * 1.5)
+        assert calls == [("suspend", False)]
+
+        # The suspended host server looks like a stopped one
+        ladder.observe(REMOTE_CONFIG, ServerState(host_server_running=False, mc_server_running=False))
+        await asyncio.sleep(STEP_SECONDS)
+        assert ladder.get_next_step(REMOTE_CONFIG.HOST_SERVER_NAME) is None
+
+    asyncio.run(run())
+
+    assert calls == [("suspend", False), ("power off", True)]
+
+
+def test_ladder_is_left_when_the_server_is_started_and_goes_on_after_a_failed_step() -> None:
+    calls = []
+
+    async def run() -> None:
+        ladder = _get_ladder(calls, {"suspend": STEP_SECONDS, "power off": STEP_SECONDS * 2}, fail=True)
+        # The host server of the bot itself is never powered down
+        ladder.mc_stopped(TEST_CONFIG)
+        assert ladder.get_next_step(TEST_CONFIG.HOST_SERVER_NAME) is None
+
+        ladder.mc_stopped(REMOTE_CONFIG)
+        ladder.observe(REMOTE_CONFIG, PLAYING)
+        await asyncio.sleep(STEP_SECONDS * 1.5)
+        assert calls == []
+
+        ladder.mc_stopped(REMOTE_CONFIG)
+        await asyncio.sleep(STEP_SECONDS * 3)
+
+    asyncio.run(run())
+
+    assert calls == [("suspend", False), ("power off", False)]
+
+
+def test_suspend_after_the_power_off_is_skipped() -> None:
+    calls = []
+
+    async def run() -> None:
+        ladder = _get_ladder(calls, {"suspend": STEP_SECONDS * 2, "power off": STEP_SECONDS})
+        ladder.mc_stopped(REMOTE_CONFIG)
+        await asyncio.sleep(STEP_SECONDS * 3)
+
+    asyncio.run(run())
+
+    assert calls == [("power off", False)]
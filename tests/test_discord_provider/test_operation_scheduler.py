@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from somnus.discord_provider.operation_scheduler import (
+    JobOutcome,
+    OperationCanceledError,
+    OperationScheduler,
+    QueueFullError,
+)
+
+
+def test_operations_run_in_order_and_see_the_previous_outcome() -> None:
+    scheduler = OperationScheduler()
+    calls = []
+
+    def operation(name: str, fail: bool = False):  # noqa: ANN202
+        async def run(previous_outcome: JobOutcome | None) -> None:
+            calls.append((name, previous_outcome.key if previous_outcome else None))
+            await asyncio.sleep(0.01)
+            if fail:
+                raise ValueError(name)
+
+        return run
+
+    async def run() -> tuple:
+        return await asyncio.gather(
+            scheduler.run("box1", "start", operation("start", fail=True)),
+            scheduler.run("box1", "stop", operation("stop")),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert calls == [("start", None), ("stop", "start")]
+    assert isinstance(results[0], ValueError)
+    assert results[1] is None
+    assert not scheduler.is_busy("box1")
+
+
+def test_duplicate_operations_are_merged() -> None:
+    scheduler = OperationScheduler()
+    calls = []
+
+    async def start(previous_outcome: JobOutcome | None) -> None:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        await asyncio.gather(*(scheduler.run("box1", "start", start) for _ in range(3)))
+
+    asyncio.run(run())
+
+    assert calls == [1]
+
+
+def test_targets_run_in_parallel_and_queue_position_is_reported() -> None:
+    scheduler = OperationScheduler()
+    positions = []
+    running = []
+
+    async def operation(previous_outcome: JobOutcome | None) -> None:
+        running.append(len(scheduler.get_busy_targets()))
+        await asyncio.sleep(0.01)
+
+    async def on_position(position: int) -> None:
+        positions.append(position)
+
+    async def run() -> None:
+        await asyncio.gather(
+            scheduler.run("box1", "start", operation),
+            scheduler.run("box2", "start", operation),
+            scheduler.run("box1", "stop", operation, on_position),
+        )
+
+    asyncio.run(run())
+
+    assert running[:2] == [2, 2]
+    assert positions == [1]
+
+
+def test_full_queue_and_cancel() -> None:
+    scheduler = OperationScheduler(max_queue_size=1)
+
+    async def stuck(previous_outcome: JobOutcome | None) -> None:
+        await asyncio.sleep(10)
+
+    async def run() -> None:
+        task = asyncio.create_task(scheduler.run("box1", "start", stuck))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError):
+            await scheduler.run("box1", "stop", stuck)
+
+        assert scheduler.cancel_running("box1")
+        with pytest.raises(OperationCanceledError):
+            await task
+
+    asyncio.run(run())
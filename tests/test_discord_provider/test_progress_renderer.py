@@ -0,0 +1,56 @@
+import asyncio
+
+from somnus.discord_provider.progress_renderer import ProgressRenderer
+
+
+def test_updates_are_coalesced() -> None:
+    edits = []
+
+    async def edit(content: str) -> None:
+        edits.append(content)
+
+    async def run() -> None:
+        progress = ProgressRenderer(edit, min_interval_seconds=0.2)
+        for i in range(20):
+            progress.update(str(i))
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.3)
+        await progress.finish("done")
+
+    asyncio.run(run())
+
+    assert edits == ["19", "done"]
+
+
+def test_latest_update_is_sent_without_finish() -> None:
+    edits = []
+
+    async def edit(content: str) -> None:
+        edits.append(content)
+
+    async def run() -> None:
+        progress = ProgressRenderer(edit, min_interval_seconds=0.01)
+        progress.update("1")
+        progress.update("2")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+
+    assert edits == ["2"]
+
+
+def test_unchanged_content_is_not_sent_again() -> None:
+    edits = []
+
+    async def edit(content: str) -> None:
+        edits.append(content)
+
+    async def run() -> None:
+        progress = ProgressRenderer(edit, min_interval_seconds=0)
+        progress.update("1")
+        await asyncio.sleep(0.01)
+        await progress.finish("1")
+
+    asyncio.run(run())
+
+    assert edits == ["1"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from somnus.actions.state_service import server_state_service
+from somnus.actions.stats import ServerState
+from somnus.config import Config
+from somnus.discord_provider import wake_on_connect
+from somnus.discord_provider.operation_scheduler import JobOutcome, OperationScheduler
+from somnus.logic.wake_listener import WakeState
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+RUNNING = ServerState(host_server_running=True, mc_server_running=True)
+
+
+@pytest.fixture
+def scheduler(monkeypatch: pytest.MonkeyPatch) -> OperationScheduler:
+    scheduler = OperationScheduler()
+    monkeypatch.setattr(wake_on_connect, "operation_scheduler", scheduler)
+    monkeypatch.setattr(server_state_service, "peek", lambda config: RUNNING)
+    return scheduler
+
+
+def _get_wake_state_while_running(scheduler: OperationScheduler, key: str) -> WakeState:
+    async def operation(previous_outcome: JobOutcome | None) -> None:
+        await asyncio.sleep(0.01)
+
+    async def run() -> WakeState:
+        task = asyncio.create_task(scheduler.run(TEST_CONFIG.HOST_SERVER_NAME, key, operation))
+        await asyncio.sleep(0)
+        state = wake_on_connect.get_wake_state(TEST_CONFIG)
+        await task
+        return state
+
+    return asyncio.run(run())
+
+
+def test_login_waits_for_a_start_and_queues_one_after_a_stop(scheduler: OperationScheduler) -> None:
+    assert _get_wake_state_while_running(scheduler, "start:Minecraft") == "starting"
+    assert _get_wake_state_while_running(scheduler, "restart") == "starting"
+    assert _get_wake_state_while_running(scheduler, "stop") == "sleeping"
+    assert wake_on_connect.get_wake_state(TEST_CONFIG) == "running"
+
+
+def test_unknown_state_is_sleeping(scheduler: OperationScheduler, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server_state_service, "peek", lambda config: None)
+
+    assert wake_on_connect.get_wake_state(TEST_CONFIG) == "sleeping"
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous for slow CI machines, the import took about 0.45 seconds when this was written
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+ACTION_ONLY_MODULES = ("asyncssh", "pexpect", "mcstatus", "wakeonlan", "asyncer")
+
+
+def test_bot_module_imports_fast_without_config() -> None:
+    # No config in the environment, importing must neither validate it nor exit
+    env = {"PATH": os.environ.get("PATH", "")}
+    code = (
+        "import sys, somnus.discord_provider.main; "
+        f"print(','.join(m for m in {ACTION_ONLY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative_microseconds = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.split("|")[-1].strip() == "somnus.discord_provider.main"
+    )
+    assert cumulative_microseconds / 1_000_000 < IMPORT_TIME_BUDGET_SECONDS
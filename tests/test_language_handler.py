@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from somnus.language_handler import LOCALE_FOLDER_PATH, TranslationError, Translator
+
+
+def _write_locales(path: Path, locales: dict[str, dict]) -> Path:
+    for name, data in locales.items():
+        (path / f"{name}.json").write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_shipped_locales_match() -> None:
+    Translator("de", LOCALE_FOLDER_PATH)
+
+
+def test_strings_are_rendered_in_the_default_or_given_locale(tmp_path: Path) -> None:
+    _write_locales(
+        tmp_path,
+        {
+            "en": {"greeting": {"plain": "Hello {{world}}", "name": "Hello {name}, {count} online"}},
+            "de": {"greeting": {"plain": "Hallo {{Welt}}", "name": "Hallo {name}, {count} online"}},
+        },
+    )
+    translator = Translator("de", tmp_path)
+
+    assert translator("greeting.plain") == "Hallo {Welt}"
+    assert translator("greeting.name", "en", {"name": "Steve", "count": 2}) == "Hello Steve, 2 online"
+    with pytest.raises(KeyError):
+        translator("greeting.name", args={"name": "Steve"})
+    with pytest.raises(KeyError):
+        translator("greeting.unknown")
+
+
+def test_locales_with_other_keys_or_placeholders_are_rejected(tmp_path: Path) -> None:
+    _write_locales(
+        tmp_path,
+        {
+            "en": {"a": "A {value}", "b": "B"},
+            "de": {"a": "A {wert}", "c": "C"},
+        },
+    )
+
+    with pytest.raises(TranslationError) as error:
+        Translator("en", tmp_path)
+
+    assert str(error.value).splitlines()[1:] == [
+        "'a' has other placeholders in locale 'de'",
+        "'b' is missing in locale 'de'",
+        "'c' is only in locale 'de'",
+    ]
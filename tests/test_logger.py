@@ -0,0 +1,38 @@
+import gzip
+import json
+import logging
+from pathlib import Path
+
+from somnus.logger import JsonFormatter, RotatingCompressedFileHandler, action_id, new_action_id
+
+
+def _create_record(message: str) -> logging.LogRecord:
+    record = logging.LogRecord("somnus", logging.INFO, __file__, 1, message, None, None)
+    record.action_id = action_id.get()
+    return record
+
+
+def test_full_files_are_rotated_compressed_and_deleted(tmp_path: Path) -> None:
+    # Every record fills a file
+    handler = RotatingCompressedFileHandler(tmp_path / "somnus.log", max_bytes=50, backup_count=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    for i in range(10):
+        handler.emit(_create_record(f"{i:02d}" * 20))
+    handler.close()
+
+    old_files = sorted(tmp_path.glob("somnus.log.*.gz"), key=lambda path: path.stat().st_mtime)
+    assert [gzip.decompress(path.read_bytes()).decode().strip() for path in old_files] == ["07" * 20, "08" * 20]
+    assert (tmp_path / "somnus.log").read_text().strip() == "09" * 20
+
+
+def test_json_lines_carry_the_action_id() -> None:
+    formatter = JsonFormatter()
+
+    with new_action_id() as current_action_id:
+        inside = json.loads(formatter.format(_create_record("inside")))
+    outside = json.loads(formatter.format(_create_record("outside")))
+
+    assert inside["action_id"] == current_action_id
+    assert inside["message"] == "inside"
+    assert outside["action_id"] is None
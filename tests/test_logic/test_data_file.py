@@ -0,0 +1,30 @@
+import asyncio
+import os
+from pathlib import Path
+
+from somnus.logic.data_file import DataFileCache
+
+
+def test_saved_value_is_cached_per_path(tmp_path: Path) -> None:
+    path = str(tmp_path / "data" / "file.json")
+    cache: DataFileCache[dict] = DataFileCache()
+    value = {"a": 1}
+
+    asyncio.run(cache.save(path, value, '{"a":1}'))
+
+    assert Path(path).read_text() == '{"a":1}'
+    assert not Path(f"{path}.tmp").exists()
+    assert cache.get(path) is value
+    assert cache.get(str(tmp_path / "other.json")) is None
+
+
+def test_watched_file_is_read_again_after_a_change(tmp_path: Path) -> None:
+    path = str(tmp_path / "file.json")
+    cache: DataFileCache[dict] = DataFileCache(watch_file=True)
+    asyncio.run(cache.save(path, {}, "{}"))
+    assert cache.get(path) == {}
+
+    Path(path).write_text('{"edited":true}')
+    os.utime(path, ns=(0, 0))
+
+    assert cache.get(path) is None
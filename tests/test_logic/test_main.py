@@ -41,33 +41,35 @@ def podman_setup() -> Generator:
     client.close()
 
 
-def test_main() -> None:
+@pytest.mark.parametrize("ssh_backend", ["asyncssh", "pexpect"])
+def test_main(ssh_backend: str) -> None:
+    config = TEST_CONFIG.model_copy(update={"SSH_BACKEND": ssh_backend})
     server = mcstatus.JavaServer("127.0.0.1", 25565)
 
     # Run 1
-    asyncio.run(start_server())
+    asyncio.run(start_server(config))
 
     server.ping()
 
-    asyncio.run(stop_server())
+    asyncio.run(stop_server(config))
     with pytest.raises(Exception):
         server.ping()
 
     # Run 2
-    asyncio.run(start_server())
+    asyncio.run(start_server(config))
 
     server.ping()
 
-    asyncio.run(stop_server())
+    asyncio.run(stop_server(config))
     with pytest.raises(Exception):
         server.ping()
 
 
-async def start_server() -> None:
-    async for _ in start.start_server(TEST_CONFIG):
+async def start_server(config: Config) -> None:
+    async for _ in start.start_server(config):
         pass
 
 
-async def stop_server() -> None:
-    async for _ in stop.stop_server(True, TEST_CONFIG):
+async def stop_server(config: Config) -> None:
+    async for _ in stop.stop_server(True, config):
         pass
@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from somnus.logic import player_activity
+from somnus.logic.data_file import DataFileCache
+
+DAY_SECONDS = 24 * 3600
+# Midnight, so every tier starts a new bucket at the first sample
+START_TIME = 1_700_006_400
+
+
+@pytest.fixture(autouse=True)
+def activity_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "data" / "player_activity.json"
+    monkeypatch.setattr(player_activity, "PLAYER_ACTIVITY_FILE_PATH", str(path))
+    return path
+
+
+async def _record_hours(hours: int, online: int, start_time: float = START_TIME) -> float:
+    """
+    One sample every 30 seconds like the heartbeat while the server is online, returns the time after the last one.
+    """
+
+    now = start_time
+    for _ in range(hours * 120):
+        await player_activity.record_sample("default", online, 20, True, now)
+        now += 30
+    return now
+
+
+def test_samples_are_downsampled_into_hours() -> None:
+    async def run() -> list[player_activity.ActivitySample]:
+        now = await _record_hours(2, 4)
+        now = await _record_hours(1, 0, now)
+        return await player_activity.get_activity("default", START_TIME, 3600, now + 3 * DAY_SECONDS)
+
+    # Older than a day, so the hourly buckets are combined from the 5 minute buckets
+    hours = asyncio.run(run())
+    assert [(sample.peak_online, round(sample.average_online, 1)) for sample in hours] == [(4, 4), (4, 4), (0, 0)]
+    assert all(sample.uptime == 1 for sample in hours)
+
+
+def test_activity_survives_a_restart(activity_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def run() -> list[player_activity.ActivitySample]:
+        now = await _record_hours(1, 3)
+        await player_activity.record_sample("default", 0, 0, False, now + 600)
+
+        monkeypatch.setattr(player_activity, "_cache", DataFileCache())
+        return await player_activity.get_activity("default", START_TIME, 1800, now + 600)
+
+    half_hours = asyncio.run(run())
+    assert activity_path.exists()
+    assert [sample.peak_online for sample in half_hours] == [3, 3, 0]
+    assert half_hours[-1].uptime == 0
+
+
+def test_memory_is_bounded() -> None:
+    series = player_activity._ActivitySeries()  # noqa: SLF001
+
+    # Two years of hourly samples fill every tier
+    for i in range(0, 2 * 365 * DAY_SECONDS, 3600):
+        series.add(START_TIME + i, 1, 20, True)
+
+    assert all(ring.count == ring.capacity for ring in series.rings)
+    assert series.get_samples(START_TIME, START_TIME + 2 * 365 * DAY_SECONDS)[0].time > START_TIME
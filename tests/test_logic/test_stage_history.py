@@ -0,0 +1,67 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from somnus.logic import stage_history
+
+
+@pytest.fixture(autouse=True)
+def history_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "data" / "stage_history.json"
+    monkeypatch.setattr(stage_history, "STAGE_HISTORY_FILE_PATH", str(path))
+    return path
+
+
+def test_expected_stages_are_the_median_of_the_last_runs(history_path: Path) -> None:
+    async def run() -> list[float] | None:
+        await stage_history.record_run("Minecraft", "start", [1, 10, 100])
+        await stage_history.record_run("Minecraft", "start", [3, 30])
+        await stage_history.record_run("Minecraft", "start", [2, 20, 200])
+        return await stage_history.get_expected_stage_seconds("Minecraft", "start")
+
+    assert asyncio.run(run()) == [2, 20, 150]
+    assert json.loads(history_path.read_text())["worlds"]["Minecraft"]["start"][1] == [3, 30]
+
+
+def test_only_the_last_runs_are_kept(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(stage_history, "MAX_RUNS_PER_OPERATION", 2)
+
+    async def run() -> list[float] | None:
+        for seconds in (100, 1, 3):
+            await stage_history.record_run("Minecraft", "stop", [seconds])
+        return await stage_history.get_expected_stage_seconds("Minecraft", "stop")
+
+    assert asyncio.run(run()) == [2]
+
+
+def test_renamed_world_keeps_its_history() -> None:
+    async def run() -> None:
+        await stage_history.record_run("Minecraft", "start", [5])
+        await stage_history.rename_world("Minecraft", "Survival")
+
+        assert await stage_history.get_expected_stage_seconds("Minecraft", "start") is None
+        assert await stage_history.get_expected_stage_seconds("Survival", "start") == [5]
+
+    asyncio.run(run())
+
+
+def test_progress_is_interpolated_over_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 0.0
+    monkeypatch.setattr(stage_history.time, "monotonic", lambda: now)
+
+    timer = stage_history.StageTimer([10, 30])
+    now = 5
+    assert timer.get_progress() == (0.125, 35)
+
+    # A slow stage does not move the progress past its expected end
+    now = 20
+    assert timer.get_progress() == (0.25, 30)
+
+    timer.next_stage()
+    now = 35
+    assert timer.get_progress() == (0.625, 15)
+    assert timer.stage_seconds == [20]
+
+    assert stage_history.StageTimer(None).get_progress() is None
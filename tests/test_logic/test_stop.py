@@ -0,0 +1,125 @@
+import asyncio
+from typing import AsyncGenerator
+
+import pytest
+
+from somnus.actions import ssh
+from somnus.actions.start_mc import start_mc_server
+from somnus.actions.state_service import server_state_service
+from somnus.actions.stats import ServerState
+from somnus.config import Config
+from somnus.logic import stop
+
+SCREEN_NAME = "mc-server-control"
+START_CMD = "./start.sh"
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD=START_CMD,
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+    MC_SERVER_RCON_PORT=25575,
+    MC_SERVER_RCON_PASSWORD="secret",  # noqa: S106
+)
+
+
+class FakeHost:
+    def __init__(self) -> None:
+        self.screens: list[str] = []
+        self.commands: list[str] = []
+        self.mc_server_running = False
+
+    def stop_mc_server(self) -> None:
+        # The screen session only runs the MC server, so it ends with it
+        self.mc_server_running = False
+        self.screens.clear()
+
+
+class FakeShell:
+    """
+    Keeps the screen sessions like `screen`, which refuses to quit or resume a name that is used twice.
+    """
+
+    def __init__(self, host: FakeHost) -> None:
+        self.host = host
+        self.attached = False
+        self.output: list[str] = []
+
+    async def sendline(self, line: str = "") -> None:
+        self.host.commands.append(line)
+        if line == f"screen -S {SCREEN_NAME} sh -c {START_CMD}":
+            self.host.screens.append(SCREEN_NAME)
+            self.host.mc_server_running = True
+            self.attached = True
+            self.output.append('[12:00:00] [Server thread/INFO]: Done (1.000s)! For help, type "help"')
+        elif line == f"screen -X -S {SCREEN_NAME} quit" and self.host.screens.count(SCREEN_NAME) == 1:
+            self.host.screens.remove(SCREEN_NAME)
+
+    async def sendcontrol(self, char: str) -> None:
+        if char == "d":
+            self.attached = False
+
+    async def expect(self, patterns: str | list[str], timeout: float = 30) -> int:  # noqa: ASYNC109
+        return 0
+
+    async def prompt(self, timeout: float = 30) -> bool:  # noqa: ASYNC109
+        return True
+
+    async def readline(self, timeout: float = 30) -> str:  # noqa: ASYNC109
+        if not self.output:
+            raise TimeoutError
+        return self.output.pop(0)
+
+    def is_alive(self) -> bool:
+        return True
+
+    async def logout(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def host(monkeypatch: pytest.MonkeyPatch) -> FakeHost:
+    fake_host = FakeHost()
+
+    async def fake_ssh_login(config: Config, attempts: int | None = None) -> FakeShell:
+        return FakeShell(fake_host)
+
+    async def fake_get_state(config: Config, max_age_seconds: float = 0) -> ServerState:
+        return ServerState(host_server_running=True, mc_server_running=fake_host.mc_server_running)
+
+    async def fake_stop_mc_server_with_rcon(config: Config) -> AsyncGenerator:
+        fake_host.stop_mc_server()
+        for _ in range(5):
+            yield
+
+    monkeypatch.setattr(ssh, "ssh_login", fake_ssh_login)
+    monkeypatch.setattr(server_state_service, "get_state", fake_get_state)
+    monkeypatch.setattr(stop, "stop_mc_server_with_rcon", fake_stop_mc_server_with_rcon)
+    return fake_host
+
+
+def test_stop_over_rcon_needs_no_ssh_session_and_leaves_no_screen_session(host: FakeHost) -> None:
+    async def start() -> None:
+        async with ssh.ssh_pool.lease(TEST_CONFIG) as session:
+            async for _ in start_mc_server(session, TEST_CONFIG, START_CMD):
+                pass
+
+    async def run() -> None:
+        await start()
+        commands = len(host.commands)
+        async for _ in stop.stop_server(True, TEST_CONFIG):
+            pass
+        # Stopped without a SSH session
+        assert len(host.commands) == commands
+        assert host.screens == []
+
+        await start()
+        await ssh.ssh_pool.close_all()
+
+    asyncio.run(run())
+    assert host.screens == [SCREEN_NAME]
+    assert host.mc_server_running
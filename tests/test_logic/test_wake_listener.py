@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import struct
+from typing import Callable
+
+from somnus.actions.state_service import server_state_service
+
+from somnus.config import Config
+from somnus.logic.wake_listener import (
+    WakeListener,
+    WakeState,
+    decode_string,
+    decode_varint,
+    encode_packet,
+    encode_string,
+    encode_varint,
+    read_packet,
+)
+
+TEST_CONFIG = Config(
+    MC_SERVER_START_CMD="",
+    DISCORD_TOKEN="a",  # noqa: S106
+    HOST_SERVER_HOST="localhost",
+    HOST_SERVER_PASSWORD="root",  # noqa: S106
+    HOST_SERVER_USER="root",
+    MC_SERVER_ADDRESS="localhost:25565",
+)
+PROTOCOL_VERSION = 767
+PING_PAYLOAD = struct.pack(">q", 1234567890123)
+STATUS_STATE = 1
+LOGIN_STATE = 2
+BURST_SIZE = 10
+# Larger than the buffer of the proxy and the socket buffers
+PROXIED_PAYLOAD = os.urandom(4 * 1024 * 1024)
+
+
+def _handshake(port: int, next_state: int) -> bytes:
+    payload = encode_varint(PROTOCOL_VERSION) + encode_string("localhost") + struct.pack(">H", port)
+    return encode_packet(0x00, payload + encode_varint(next_state))
+
+
+async def _start_listener(state: WakeState, logins: list[str]) -> tuple[WakeListener, int]:
+    async def on_login(config: Config, player_name: str) -> None:
+        logins.append(player_name)
+
+    listener = WakeListener(TEST_CONFIG, lambda config: state, on_login)
+    await listener.start("127.0.0.1", 0)
+    return listener, listener.get_port()  # type: ignore
+
+
+def test_status_ping_is_answered_with_the_sleeping_motd() -> None:
+    async def run() -> tuple[dict, bytes]:
+        listener, port = await _start_listener("sleeping", [])
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(_handshake(port, STATUS_STATE) + encode_packet(0x00, b""))
+        _, payload = await read_packet(reader)
+        status = json.loads(decode_string(payload, 0)[0])
+
+        writer.write(encode_packet(0x01, PING_PAYLOAD))
+        _, pong = await read_packet(reader)
+        writer.close()
+        listener.close()
+        return status, pong
+
+    status, pong = asyncio.run(run())
+
+    assert status["version"]["protocol"] == PROTOCOL_VERSION
+    assert status["description"]["text"]
+    assert pong == PING_PAYLOAD
+
+
+def test_burst_of_logins_starts_the_server_once() -> None:
+    logins = []
+
+    async def login(port: int, player_name: str) -> dict:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(_handshake(port, LOGIN_STATE) + encode_packet(0x00, encode_string(player_name) + bytes(16)))
+        packet_id, payload = await read_packet(reader)
+        writer.close()
+        assert packet_id == 0x00
+        return json.loads(decode_string(payload, 0)[0])
+
+    async def run() -> list[dict]:
+        listener, port = await _start_listener("sleeping", logins)
+        messages = await asyncio.gather(*(login(port, f"Player{i}") for i in range(BURST_SIZE)))
+        await asyncio.sleep(0.05)
+        listener.close()
+        return messages
+
+    messages = asyncio.run(run())
+
+    assert len(logins) == 1
+    assert all(message["text"] for message in messages)
+
+
+def test_garbage_and_legacy_pings_are_dropped() -> None:
+    async def run() -> list[bytes]:
+        listener, port = await _start_listener("sleeping", [])
+        answers = []
+        for data in (b"\xfe\x01", b"\xff\xff\xff\xff\xff\xff", encode_packet(0x05, b"")):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(data)
+            answers.append(await reader.read())
+            writer.close()
+        listener.close()
+        return answers
+
+    assert asyncio.run(run()) == [b"", b"", b""]
+
+
+def test_varints_round_trip() -> None:
+    for value in (0, 1, 127, 128, 25565, 2**31 - 1, -1):
+        assert decode_varint(encode_varint(value), 0) == (value, len(encode_varint(value)))
+
+
+class EchoServer:
+    """
+    Stands in for the MC server and sends everything back.
+    """
+
+    def __init__(self) -> None:
+        self.server: asyncio.Server | None = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+
+async def _start_proxy(get_state: Callable[[Config], WakeState]) -> tuple[WakeListener, int]:
+    backend_port = await EchoServer().start()
+    config = TEST_CONFIG.model_copy(update={"MC_SERVER_ADDRESS": f"127.0.0.1:{backend_port}"})
+
+    async def on_login(config: Config, player_name: str) -> None:
+        pass
+
+    listener = WakeListener(config, get_state, on_login, proxy=True)
+    await listener.start("127.0.0.1", 0)
+    return listener, listener.get_port()  # type: ignore
+
+
+def _login_packets(port: int) -> bytes:
+    return _handshake(port, LOGIN_STATE) + encode_packet(0x00, encode_string("Steve") + bytes(16))
+
+
+def test_connections_to_the_running_server_are_forwarded() -> None:
+    async def run() -> tuple[bytes, bytes, bytes]:
+        listener, port = await _start_proxy(lambda config: "running")
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        sent = _login_packets(port)
+        writer.write(sent)
+        # The handshake and login start read by the listener are sent to the MC server again
+        received_login = await reader.readexactly(len(sent))
+
+        writer.write(PROXIED_PAYLOAD)
+        received = await reader.readexactly(len(PROXIED_PAYLOAD))
+        writer.close()
+        listener.close()
+        return sent, received_login, received
+
+    sent, received_login, received = asyncio.run(run())
+
+    assert received_login == sent
+    assert received == PROXIED_PAYLOAD
+
+
+def test_logins_are_held_while_starting_and_handed_over_when_done() -> None:
+    state: list[WakeState] = ["starting"]
+
+    async def run() -> tuple[bytes, bytes]:
+        listener, port = await _start_proxy(lambda config: state[0])
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        sent = _login_packets(port)
+        writer.write(sent)
+        await asyncio.sleep(0.1)
+
+        state[0] = "running"
+        server_state_service.mc_server_started(listener.config)
+        received = await asyncio.wait_for(reader.readexactly(len(sent)), 1)
+        writer.close()
+        listener.close()
+        return sent, received
+
+    sent, received = asyncio.run(run())
+
+    assert received == sent
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from somnus.config import Config, HostServer
+from somnus.logic import world_selector
+from somnus.logic.world_selector import WorldSelectorWorld
+
+
+@pytest.fixture(autouse=True)
+def config_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "data" / "world_selector_data.json"
+    monkeypatch.setattr(world_selector, "WORLD_SELECTOR_CONFIG_FILE_PATH", str(path))
+    return path
+
+
+def test_config_is_cached_until_the_file_changes(config_path: Path) -> None:
+    first = asyncio.run(world_selector.get_world_selector_config())
+    assert asyncio.run(world_selector.get_world_selector_config()) is first
+
+    data = json.loads(config_path.read_text())
+    data["worlds"].append({"display_name": "Creative", "start_cmd": "./creative.sh", "visible": True})
+    config_path.write_text(json.dumps(data))
+    os.utime(config_path, ns=(0, 0))
+
+    changed = asyncio.run(world_selector.get_world_selector_config())
+    world = asyncio.run(world_selector.get_world_by_name("Creative", changed))
+
+    assert changed is not first
+    assert world.start_cmd == "./creative.sh"
+
+
+def test_changes_do_not_touch_the_shared_config() -> None:
+    async def run() -> None:
+        before = await world_selector.get_world_selector_config()
+        await world_selector.create_new_world("Creative", "./creative.sh", visible=True)
+        after = await world_selector.get_world_selector_config()
+
+        assert [world.display_name for world in before.worlds] == ["Minecraft"]
+        assert [world.display_name for world in after.worlds] == ["Minecraft", "Creative"]
+        with pytest.raises(world_selector.UserInputError):
+            await world_selector.create_new_world("Creative", "./other.sh", visible=True)
+
+    asyncio.run(run())
+
+
+def test_save_replaces_the_file_atomically(config_path: Path) -> None:
+    async def run() -> None:
+        await world_selector.get_world_selector_config()
+        await world_selector.select_new_world("Other")
+
+    asyncio.run(run())
+
+    assert json.loads(config_path.read_text())["new_selected_world"] == "Other"
+    assert list(config_path.parent.iterdir()) == [config_path]
+
+
+def test_concurrent_changes_are_all_saved(config_path: Path) -> None:
+    async def run() -> None:
+        await world_selector.get_world_selector_config()
+        await asyncio.gather(
+            *(world_selector.create_new_world(name, f"./{name}.sh", visible=True) for name in ("A", "B", "C")),
+            world_selector.select_new_world("B"),
+        )
+
+    asyncio.run(run())
+
+    data = json.loads(config_path.read_text())
+    assert [world["display_name"] for world in data["worlds"]] == ["Minecraft", "A", "B", "C"]
+    assert data["new_selected_world"] == "B"
+
+
+def test_unreadable_file_is_reset_to_default(config_path: Path) -> None:
+    config_path.parent.mkdir(parents=True)
+    config_path.write_text('{"current_world": "Mine')
+
+    config = asyncio.run(world_selector.get_world_selector_config())
+
+    assert config.current_world == "Minecraft"
+    assert json.loads(config_path.read_text())["current_world"] == "Minecraft"
+
+
+def test_worlds_run_on_their_host_server() -> None:
+    config = Config(
+        MC_SERVER_START_CMD="",
+        DISCORD_TOKEN="a",  # noqa: S106
+        HOST_SERVER_HOST="localhost",
+        HOST_SERVER_PASSWORD="root",  # noqa: S106
+        HOST_SERVER_USER="root",
+        MC_SERVER_ADDRESS="localhost:25565",
+        HOST_SERVERS=[
+            HostServer(name="box2", host="10.0.0.2", user="mc", password="mc", mc_server_address="10.0.0.2")  # noqa: S106
+        ],
+    )
+
+    default_config = world_selector.get_host_config(
+        WorldSelectorWorld(display_name="a", start_cmd="", visible=True), config
+    )
+    box2_config = world_selector.get_host_config(
+        WorldSelectorWorld(display_name="b", start_cmd="", visible=True, host="box2"), config
+    )
+
+    assert (default_config.HOST_SERVER_NAME, default_config.HOST_SERVER_HOST) == ("default", "localhost")
+    assert (box2_config.HOST_SERVER_NAME, box2_config.HOST_SERVER_HOST, box2_config.MC_SERVER_ADDRESS) == (
+        "box2",
+        "10.0.0.2",
+        "10.0.0.2",
+    )
+    with pytest.raises(world_selector.UserInputError):
+        world_selector.get_host_config(
+            WorldSelectorWorld(display_name="c", start_cmd="", visible=True, host="x"), config
+        )
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from somnus.metrics import MetricsRegistry, start_metrics_server
+
+
+def test_render_prometheus_text_format() -> None:
+    registry = MetricsRegistry()
+    logins = registry.counter("logins_total", "Logins", ("host",))
+    queued = registry.gauge("queued", "Queued operations")
+    latency = registry.histogram("latency_seconds", "Latency", ("probe",), buckets=(0.1, 1))
+
+    logins.inc(host='box "1"')
+    logins.inc(2, host='box "1"')
+    queued.set(3)
+    latency.observe(0.05, probe="host")
+    latency.observe(0.5, probe="host")
+
+    assert registry.render().splitlines() == [
+        "# HELP logins_total Logins",
+        "# TYPE logins_total counter",
+        'logins_total{host="box \\"1\\""} 3',
+        "# HELP queued Queued operations",
+        "# TYPE queued gauge",
+        "queued 3",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{probe="host",le="0.1"} 1',
+        'latency_seconds_bucket{probe="host",le="1"} 2',
+        'latency_seconds_bucket{probe="host",le="+Inf"} 2',
+        'latency_seconds_sum{probe="host"} 0.55',
+        'latency_seconds_count{probe="host"} 2',
+    ]
+
+
+def test_labels_must_match() -> None:
+    registry = MetricsRegistry()
+    logins = registry.counter("logins_total", "Logins", ("host",))
+
+    with pytest.raises(ValueError):
+        logins.inc(probe="host")
+    with pytest.raises(ValueError):
+        registry.counter("logins_total", "Logins")
+
+
+def test_metrics_are_served_over_http() -> None:
+    registry = MetricsRegistry()
+    registry.counter("logins_total", "Logins").inc()
+
+    async def request(path: str) -> bytes:
+        server = await start_metrics_server("127.0.0.1", 0, registry)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+
+    response = asyncio.run(request("/metrics"))
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert response.endswith(b"logins_total 1\n")
+    assert asyncio.run(request("/")).startswith(b"HTTP/1.1 404")